@@ -0,0 +1,108 @@
+# 中英文别名索引（游戏名/别名 → appid）
+# 收集 appdetails 返回的官方简体中文名、英文名以及 ITAD 英文标题，持久化保存。
+# 中文查询命中后可直接得到 appid，不再经过大模型翻译和 ITAD 搜索。
+import json
+import os
+
+from astrbot.api import logger
+
+from .app_index import normalize_title
+from .data_path import DebouncedJsonFile
+
+# appdetails 的语言参数 → 别名索引中的语言
+LANG_MAP = {"schinese": "zh", "english": "en", "en": "en"}
+
+
+class AliasIndex:
+    def __init__(self, path=None, save_delay=5.0):
+        """
+        path: 持久化 JSON 文件路径，为空时只保存在内存
+        save_delay: 新增名称后延迟多久（秒）写文件，期间的多次新增合并为一次写入
+        """
+        self.path = path
+        # appid(str) -> {"zh": 中文名, "en": 英文名, "aliases": [其他别名]}
+        self._apps = {}
+        # 规范化别名 -> appid
+        self._by_norm = {}
+        self._file = DebouncedJsonFile(path, lambda: self._apps, delay=save_delay, label="别名索引")
+        self._load()
+
+    def __len__(self):
+        return len(self._apps)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._apps = json.load(f)
+        except Exception as e:
+            logger.error(f"[别名索引] 读取失败，将重新建立: {e}")
+            self._apps = {}
+        for appid, entry in self._apps.items():
+            for name in self._names(entry):
+                self._index(name, appid)
+
+    def save(self):
+        """立即写入未保存的名称（插件卸载时调用）"""
+        self._file.flush()
+
+    @staticmethod
+    def _names(entry):
+        return [n for n in (entry.get("zh"), entry.get("en"), *entry.get("aliases", [])) if n]
+
+    def _index(self, name, appid):
+        norm = normalize_title(name)
+        if norm:
+            # 同名时保留 appid 较小者（通常为本体）
+            old = self._by_norm.get(norm)
+            if old is None or int(appid) < int(old):
+                self._by_norm[norm] = appid
+
+    def record(self, appid, name, lang):
+        """记录某个 appid 在某语言下的官方名称，lang 为 appdetails 的语言参数或 zh/en"""
+        lang = LANG_MAP.get(lang, lang)
+        if not name or lang not in ("zh", "en"):
+            return
+        appid = str(appid)
+        entry = self._apps.setdefault(appid, {})
+        if entry.get(lang) == name:
+            return
+        entry[lang] = name
+        self._index(name, appid)
+        self._file.mark_dirty()
+
+    def names(self, appid):
+        return self._apps.get(str(appid), {})
+
+    def lookup(self, query):
+        """精确/规范化匹配，返回 appid 或 None"""
+        return self._by_norm.get(normalize_title(query))
+
+    def search(self, query, limit=5):
+        """
+        部分匹配：别名包含查询词（或查询词包含别名）的条目，
+        按覆盖比例从高到低排序，返回 [(appid, 名称, 覆盖比例)]
+        """
+        norm = normalize_title(query)
+        if len(norm) < 2:
+            return []
+        hits = {}
+        for alias, appid in self._by_norm.items():
+            if norm in alias or alias in norm:
+                ratio = min(len(norm), len(alias)) / max(len(norm), len(alias))
+                if ratio > hits.get(appid, 0):
+                    hits[appid] = ratio
+        ranked = sorted(hits.items(), key=lambda kv: (-kv[1], int(kv[0])))[:limit]
+        result = []
+        for appid, ratio in ranked:
+            entry = self._apps.get(appid, {})
+            result.append((appid, entry.get("zh") or entry.get("en") or "", round(ratio, 4)))
+        return result
+
+    def resolve(self, query):
+        """
+        只按精确/规范化匹配自动解析为 appid。
+        部分匹配容易把“Portal”解析成 Portal 2 这类续作，只能用 search() 作为候选提示。
+        """
+        return self.lookup(query)
@@ -0,0 +1,300 @@
+# 本地 Steam 应用名索引（名称 → appid）
+# 从 GetAppList 格式的 JSON 导出文件加载，支持：
+# - 规范化名称精确查找（哈希 + 二分）
+# - 前缀查找与三元组（trigram）模糊查找，按相似度排序
+# - 基于 IStoreService/GetAppList 的增量刷新
+# 约 20 万条目录使用 array 紧凑存储，常驻内存约几十 MB
+import asyncio
+import json
+import os
+import re
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from astrbot.api import logger
+
+STORE_APPLIST_URL = "https://api.steampowered.com/IStoreService/GetAppList/v1/"
+# 增量条目超过该数量时合并进主索引
+COMPACT_THRESHOLD = 2000
+# 出现在过多名称中的三元组区分度很低，模糊查找时跳过
+MAX_POSTING = 20000
+
+
+def normalize_title(name):
+    """规范化游戏名：全半角统一、去商标符号与标点空白、转小写"""
+    # 商标符号要在 NFKC 之前去掉，否则 ™ 会被转换成 tm
+    s = unicodedata.normalize("NFKC", re.sub(r"[™®©]", "", name or "")).lower()
+    return re.sub(r"[^0-9a-z\u3040-\u30ff\u4e00-\u9fff\uac00-\ud7af]+", "", s)
+
+
+def trigrams(norm):
+    if not norm:
+        return set()
+    padded = f"^{norm}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def parse_applist(data):
+    """兼容 ISteamApps/GetAppList、IStoreService/GetAppList 以及纯列表三种格式，返回 [(appid, name)]"""
+    if isinstance(data, dict):
+        apps = (data.get("applist") or data.get("response") or {}).get("apps", [])
+    else:
+        apps = data or []
+    result = []
+    for app in apps:
+        appid, name = app.get("appid"), (app.get("name") or "").strip()
+        if appid and name:
+            result.append((int(appid), name))
+    return result
+
+
+class _Segment:
+    """不可变的紧凑索引段"""
+
+    def __init__(self, apps):
+        apps = sorted(apps)
+        self.appids = array("I", (a for a, _ in apps))
+        # 原名与规范化名各拼接为一个大字符串，用偏移量数组定位
+        self._names, self._name_off = self._pack(n for _, n in apps)
+        self._norms, self._norm_off = self._pack(normalize_title(n) for _, n in apps)
+        size = len(self.appids)
+        # 精确查找：按规范化名哈希排序
+        pairs = sorted((hash(self.norm(i)), i) for i in range(size) if self.norm(i))
+        self._hashes = array("q", (h for h, _ in pairs))
+        self._hash_idx = array("I", (i for _, i in pairs))
+        # 前缀查找：按规范化名排序的下标
+        self._prefix = array("I", sorted((i for i in range(size) if self.norm(i)), key=self.norm))
+        # 模糊查找：三元组倒排表
+        postings = {}
+        for i in range(size):
+            for g in trigrams(self.norm(i)):
+                postings.setdefault(g, []).append(i)
+        self._postings = {g: array("I", ids) for g, ids in postings.items()}
+
+    @staticmethod
+    def _pack(strings):
+        parts, offsets, pos = [], array("I", [0]), 0
+        for s in strings:
+            parts.append(s)
+            pos += len(s)
+            offsets.append(pos)
+        return "".join(parts), offsets
+
+    def __len__(self):
+        return len(self.appids)
+
+    def name(self, i):
+        return self._names[self._name_off[i]:self._name_off[i + 1]]
+
+    def norm(self, i):
+        return self._norms[self._norm_off[i]:self._norm_off[i + 1]]
+
+    def exact(self, norm):
+        h = hash(norm)
+        pos = bisect_left(self._hashes, h)
+        hits = []
+        while pos < len(self._hashes) and self._hashes[pos] == h:
+            i = self._hash_idx[pos]
+            if self.norm(i) == norm:
+                hits.append(i)
+            pos += 1
+        return hits
+
+    def prefix(self, norm, limit):
+        pos = bisect_left(self._prefix, norm, key=self.norm)
+        hits = []
+        while pos < len(self._prefix) and len(hits) < limit:
+            i = self._prefix[pos]
+            if not self.norm(i).startswith(norm):
+                break
+            hits.append(i)
+            pos += 1
+        return hits
+
+    def fuzzy_counts(self, grams):
+        counts = Counter()
+        for g in grams:
+            ids = self._postings.get(g)
+            if ids is not None and len(ids) <= MAX_POSTING:
+                counts.update(ids)
+        return counts
+
+
+class SteamAppIndex:
+    def __init__(self, path=None):
+        """path: GetAppList 格式的 JSON 文件路径（刷新后也会写回该文件）"""
+        self.path = path
+        self._segment = None
+        # 增量刷新得到的新条目：appid -> name，超过阈值后合并进主索引
+        self._delta = {}
+        self.last_modified = 0
+        self.last_appid = 0
+        self.ready = False
+
+    def __len__(self):
+        return (len(self._segment) if self._segment else 0) + len(self._delta)
+
+    async def load(self):
+        """在线程中加载并建立索引，不阻塞事件循环"""
+        if not self.path or not os.path.exists(self.path):
+            logger.info("[应用索引] 未找到 Steam 应用列表文件，跳过本地索引")
+            return
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._load_file)
+            self.ready = True
+            logger.info(f"[应用索引] 已加载 {len(self)} 个应用，用时 {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.error(f"[应用索引] 加载失败: {e}")
+
+    def _load_file(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        meta = data.get("meta", {}) if isinstance(data, dict) else {}
+        self.last_modified = int(meta.get("last_modified", 0))
+        self.last_appid = int(meta.get("last_appid", 0))
+        self._segment = _Segment(parse_applist(data))
+        self._delta = {}
+
+    def _all_apps(self, segment=None, delta=None):
+        segment = self._segment if segment is None else segment
+        apps = {}
+        if segment:
+            for i in range(len(segment)):
+                apps[segment.appids[i]] = segment.name(i)
+        apps.update(self._delta if delta is None else delta)
+        return apps
+
+    def _save_file(self, apps):
+        data = {
+            "applist": {"apps": [{"appid": a, "name": n} for a, n in sorted(apps.items())]},
+            "meta": {"last_modified": self.last_modified, "last_appid": self.last_appid},
+        }
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def merge(self, apps):
+        """合并新增/改名的应用（[(appid, name)]）并写回文件，增量过多时在调用方线程内重建主索引"""
+        self._segment, self._delta = self._merged(apps)
+
+    def compact(self):
+        self._segment, self._delta = self._merged([], compact=True)
+
+    def _merged(self, apps, compact=False):
+        """
+        在当前索引基础上合并 apps，返回新的 (主索引, 增量)，不修改 self：
+        可以在工作线程中执行，事件循环上的查找继续使用旧索引，完成后由调用方替换引用
+        """
+        segment, delta = self._segment, dict(self._delta)
+        for appid, name in apps:
+            delta[int(appid)] = name
+        if compact or len(delta) > COMPACT_THRESHOLD:
+            all_apps = self._all_apps(segment, delta)
+            segment, delta = _Segment(all_apps.items()), {}
+        else:
+            all_apps = None
+        # 未触发重建时也要把元数据和增量写回文件
+        if self.path and (all_apps is not None or delta):
+            self._save_file(all_apps if all_apps is not None else self._all_apps(segment, delta))
+        return segment, delta
+
+    async def refresh(self, http, steam_key, max_results=50000):
+        """
+        通过 IStoreService/GetAppList 增量刷新：只拉取上次刷新后变更的应用。
+        需要 Steam Web API Key。
+        """
+        if not steam_key:
+            return 0
+        since = self.last_modified
+        last_appid = 0
+        started = int(time.time())
+        fetched = []
+        while True:
+            params = {
+                "key": steam_key,
+                "max_results": max_results,
+                "last_appid": last_appid,
+                "include_games": 1,
+                "include_dlc": 1,
+            }
+            if since:
+                params["if_modified_since"] = since
+            resp = await http.get(STORE_APPLIST_URL, params=params, timeout=60)
+            resp.raise_for_status()
+            body = resp.json().get("response", {})
+            fetched.extend(parse_applist({"response": body}))
+            if not body.get("have_more_results"):
+                break
+            last_appid = body.get("last_appid", 0)
+        self.last_modified = started
+        if fetched:
+            self.last_appid = max(self.last_appid, max(a for a, _ in fetched))
+        # 新索引在线程中建好后再在事件循环上替换，查找过程中不会看到正在修改的索引
+        self._segment, self._delta = await asyncio.to_thread(self._merged, fetched)
+        self.ready = len(self) > 0
+        logger.info(f"[应用索引] 增量刷新完成，新增/更新 {len(fetched)} 个应用")
+        return len(fetched)
+
+    def search(self, query, limit=5):
+        """
+        查找游戏，返回 [(appid, name, score)]，按相似度从高到低排序。
+        精确匹配得分 1.0，前缀匹配 0.9 起，其余按三元组 Jaccard 相似度计分。
+        """
+        norm = normalize_title(query)
+        if not norm:
+            return []
+        scored = {}
+
+        def add(appid, name, score):
+            if score > scored.get(appid, (None, -1))[1]:
+                scored[appid] = (name, score)
+
+        seg = self._segment
+        if seg:
+            for i in seg.exact(norm):
+                add(seg.appids[i], seg.name(i), 1.0)
+            for i in seg.prefix(norm, limit * 4):
+                add(seg.appids[i], seg.name(i), 0.9 * len(norm) / len(seg.norm(i)) + 0.05)
+        grams = trigrams(norm)
+        if seg and grams:
+            # 倒排表只用于粗筛候选，得分按完整三元组集合重新计算
+            for i, _ in seg.fuzzy_counts(grams).most_common(limit * 20):
+                cg = trigrams(seg.norm(i))
+                add(seg.appids[i], seg.name(i), 0.9 * len(grams & cg) / len(grams | cg))
+        for appid, name in self._delta.items():
+            cand = normalize_title(name)
+            if cand == norm:
+                add(appid, name, 1.0)
+            elif cand.startswith(norm):
+                add(appid, name, 0.9 * len(norm) / len(cand) + 0.05)
+            elif grams:
+                cg = trigrams(cand)
+                inter = len(grams & cg)
+                if inter:
+                    add(appid, name, 0.9 * inter / len(grams | cg))
+        # 同分时名称更短、appid 更小（通常是本体而非 DLC/原声）优先
+        ranked = sorted(scored.items(), key=lambda kv: (-kv[1][1], len(kv[1][0]), kv[0]))
+        return [(appid, name, round(score, 4)) for appid, (name, score) in ranked[:limit]]
+
+    def resolve(self, query, min_score=0.85):
+        """
+        返回最匹配的 appid；没有足够可信的结果时返回 None。
+        规范化名精确命中时直接返回（同名取 appid 最小者），不做模糊查找。
+        """
+        norm = normalize_title(query)
+        if not norm:
+            return None
+        exact = [appid for appid, name in self._delta.items() if normalize_title(name) == norm]
+        if self._segment:
+            exact += [self._segment.appids[i] for i in self._segment.exact(norm)]
+        if exact:
+            return min(exact)
+        hits = self.search(query, limit=1)
+        if hits and hits[0][2] >= min_score:
+            return hits[0][0]
+        return None
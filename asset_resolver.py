@@ -0,0 +1,139 @@
+# 封面图地址解析
+# 价格回复的封面优先用小尺寸的 capsule（184x69），不存在时退回 header_image。
+# - 每个 appid 选定的封面地址持久化到 SQLite，按 TTL 过期；header 地址变化（游戏换了封面）时重新检查
+# - 新地址用 HEAD 探测（上游不支持 HEAD 时改用只取 1 字节的 Range 请求），不下载整张图片
+# - 可选 inline_bytes：探测时直接下载选定的封面并缓存字节，回复以 base64 发送，
+#   聊天适配器不必再按 URL 下载一次，每张图片只经过一次网络
+# 用法: assets = AssetResolver(http, path, ttl=7 * 86400, inline_bytes=True)
+#       url = await assets.resolve(appid, header_url)
+#       data = assets.cached_bytes(url)   # 未开启 inline_bytes 或未缓存时为 None
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+
+from astrbot.api import logger
+
+from .concurrency import SingleFlight
+
+
+def capsule_url(header_url):
+    """header 图对应的 184x69 capsule 地址，新旧两种命名（.../header.jpg 和 ..._header.jpg）都支持"""
+    return re.sub(r"([/_])header\.jpg", r"\1capsule_184x69.jpg", header_url, count=1)
+
+
+class AssetResolver:
+    def __init__(self, http, path=None, ttl=7 * 86400, inline_bytes=False, max_bytes=4 * 1024 * 1024):
+        """
+        http: HttpClientManager
+        path: SQLite 文件路径，为空时只保存在内存
+        ttl: 已选定地址的有效期（秒），过期后重新探测
+        inline_bytes: 是否下载并缓存封面字节，供回复直接发送
+        max_bytes: 封面字节缓存上限（字节），按最近最少使用淘汰
+        """
+        self.http = http
+        self.ttl = ttl
+        self.inline_bytes = inline_bytes
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path or ":memory:", timeout=5, check_same_thread=False, isolation_level=None)
+        if path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS assets ("
+            "appid TEXT PRIMARY KEY, header TEXT NOT NULL, url TEXT NOT NULL, checked REAL NOT NULL)"
+        )
+        self._bytes = OrderedDict()
+        self._bytes_size = 0
+        self._singleflight = SingleFlight()
+        self.hits = 0
+        self.probes = 0
+
+    def _get(self, appid, header_url):
+        row = self._db.execute("SELECT header, url, checked FROM assets WHERE appid = ?", (str(appid),)).fetchone()
+        if not row or row[0] != header_url or time.time() - row[2] > self.ttl:
+            return None
+        return row[1]
+
+    def _put(self, appid, header_url, url):
+        self._db.execute(
+            "INSERT OR REPLACE INTO assets (appid, header, url, checked) VALUES (?, ?, ?, ?)",
+            (str(appid), header_url, url, time.time())
+        )
+
+    def cached_bytes(self, url):
+        data = self._bytes.get(url) if url else None
+        if data is not None:
+            self._bytes.move_to_end(url)
+        return data
+
+    def _store_bytes(self, url, data):
+        if not data or len(data) > self.max_bytes:
+            return
+        old = self._bytes.pop(url, None)
+        if old is not None:
+            self._bytes_size -= len(old)
+        self._bytes[url] = data
+        self._bytes_size += len(data)
+        while self._bytes_size > self.max_bytes and self._bytes:
+            _, evicted = self._bytes.popitem(last=False)
+            self._bytes_size -= len(evicted)
+
+    async def resolve(self, appid, header_url, priority=0):
+        """返回 appid 应使用的封面地址（capsule 或 header），header_url 为空时返回 None"""
+        if not header_url:
+            return None
+        return await self._singleflight.do(
+            (str(appid), header_url), lambda: self._resolve(appid, header_url, priority)
+        )
+
+    async def _resolve(self, appid, header_url, priority):
+        url = self._get(appid, header_url)
+        if url is not None:
+            self.hits += 1
+            if self.inline_bytes and self.cached_bytes(url) is None:
+                try:
+                    await self._download(url, priority)
+                except Exception as e:
+                    # 下载失败不影响地址本身，回复改由适配器按 URL 获取
+                    logger.error(f"[封面] 下载 {appid} 的封面失败: {e}")
+            return url
+        self.probes += 1
+        capsule = capsule_url(header_url)
+        try:
+            if capsule != header_url and await self._exists(capsule, priority):
+                url = capsule
+            else:
+                url = header_url
+                if self.inline_bytes:
+                    await self._download(url, priority)
+        except Exception as e:
+            # 探测失败不记录，下次查询重试；本次先用 header
+            logger.error(f"[封面] 检查 {appid} 的封面失败: {e}")
+            return header_url
+        self._put(appid, header_url, url)
+        return url
+
+    async def _exists(self, url, priority):
+        """地址是否存在；开启 inline_bytes 时直接下载，内容一并缓存"""
+        if self.inline_bytes:
+            return await self._download(url, priority)
+        resp = await self.http.request("HEAD", url, priority=priority)
+        if resp.status_code in (405, 501):
+            # 不支持 HEAD，改为只取第一个字节
+            resp = await self.http.get(url, headers={"Range": "bytes=0-0"}, priority=priority)
+        return resp.status_code in (200, 206)
+
+    async def _download(self, url, priority):
+        resp = await self.http.get(url, priority=priority)
+        if resp.status_code != 200:
+            return False
+        if resp.headers.get("content-type", "image/").startswith("image/"):
+            self._store_bytes(url, resp.content)
+        return True
+
+    def close(self):
+        try:
+            self._db.close()
+        except Exception:
+            pass
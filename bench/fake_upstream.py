@@ -0,0 +1,263 @@
+# 基准测试用的本地模拟上游
+# 一个 asyncio HTTP/1.1 服务同时扮演 ITAD、Steam 商店和图片 CDN：
+# 插件的请求经 RedirectTransport 转发到本服务，原始主机放在 X-Upstream-Host 头中，
+# 响应按 fixtures.json 生成，格式与真实接口一致；可按上游注入延迟和错误率，并统计请求数
+import asyncio
+import datetime
+import io
+import json
+import random
+import re
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+UPSTREAM_HOSTS = {
+    "api.isthereanydeal.com": "itad",
+    "store.steampowered.com": "steam",
+}
+REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def _placeholder_jpeg():
+    try:
+        from PIL import Image
+    except ImportError:
+        return b""
+    buf = io.BytesIO()
+    Image.new("RGB", (460, 215), (27, 40, 56)).save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+
+def _norm(s):
+    return re.sub(r"[^0-9a-z]+", "", (s or "").lower())
+
+
+class RedirectTransport(httpx.AsyncBaseTransport):
+    """把所有请求改发到本地模拟服务，原主机名放在 X-Upstream-Host 头中"""
+
+    def __init__(self, port, **kwargs):
+        self.port = port
+        self._inner = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request):
+        request.headers["X-Upstream-Host"] = request.url.host
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        return await self._inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+class FakeUpstream:
+    def __init__(self, fixtures, latency=None, jitter=0.3, error_rate=0.0, seed=None):
+        """
+        fixtures: fixtures.json 的内容
+        latency: {上游: 平均延迟秒数}，上游为 itad / steam / cdn
+        jitter: 延迟的对数正态抖动系数，0 表示固定延迟
+        error_rate: 每个请求返回 503/429 的概率
+        """
+        self.games = fixtures["games"]
+        self.by_appid = {str(g["appid"]): g for g in self.games}
+        self.by_gid = {g["gid"]: g for g in self.games}
+        self.latency = {"itad": 0.08, "steam": 0.15, "cdn": 0.03, **(latency or {})}
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.image = _placeholder_jpeg()
+        self.counts = Counter()
+        self.errors = Counter()
+        self.port = None
+        self._server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def transport(self, **kwargs):
+        return RedirectTransport(self.port, **kwargs)
+
+    def reset_counts(self):
+        self.counts.clear()
+        self.errors.clear()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, v = h.decode("latin-1").split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+                status, payload, ctype = await self._dispatch(method, target, headers, body)
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+                    f"Content-Type: {ctype}\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode() + (payload if method != "HEAD" else b"")
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body):
+        host = headers.get("x-upstream-host", "")
+        upstream = UPSTREAM_HOSTS.get(host, "cdn")
+        url = urlsplit(target)
+        self.counts[(upstream, url.path if upstream != "cdn" else "image")] += 1
+        delay = self.latency.get(upstream, 0)
+        if delay > 0:
+            await asyncio.sleep(delay * (self.random.lognormvariate(0, self.jitter) if self.jitter else 1))
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors[upstream] += 1
+            return self.random.choice((503, 429)), b"{}", "application/json"
+        if upstream == "cdn":
+            return 200, self.image, "image/jpeg"
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        data = json.loads(body) if body else None
+        handler = getattr(self, f"_{upstream}_{re.sub(r'[^0-9a-z]+', '_', url.path.lower()).strip('_')}", None)
+        if handler is None:
+            return 404, b"{}", "application/json"
+        result = handler(query, data)
+        return 200, json.dumps(result, ensure_ascii=False).encode(), "application/json"
+
+    # ---- ITAD ----
+
+    def _itad_summary(self, g):
+        return {"id": g["gid"], "slug": g["slug"], "title": g["title"], "type": "game", "mature": False}
+
+    def _itad_games_search_v1(self, query, _):
+        q = _norm(query.get("title"))
+        limit = int(query.get("limit", 20))
+        ranked = sorted(self.games, key=lambda g: (q not in _norm(g["title"]), _norm(g["title"]) != q))
+        result = []
+        for g in ranked[:limit]:
+            item = self._itad_summary(g)
+            item["assets"] = {
+                k: f"https://assets.isthereanydeal.com/{g['gid']}/{k}.jpg?t=1700000000"
+                for k in ("boxart", "banner145", "banner300", "banner400", "banner600")
+            }
+            result.append(item)
+        return result
+
+    def _itad_games_lookup_v1(self, query, _):
+        g = self.by_appid.get(str(query.get("appid")))
+        return {"found": True, "game": self._itad_summary(g)} if g else {"found": False}
+
+    def _itad_lookup_id_shop_61_v1(self, _, data):
+        return {key: (self.by_appid[key[4:]]["gid"] if key[4:] in self.by_appid else None) for key in data or []}
+
+    def _itad_games_info_v2(self, query, _):
+        g = self.by_gid.get(query.get("id"))
+        if not g:
+            return {}
+        return {
+            **self._itad_summary(g),
+            "appid": g["appid"],
+            "tags": g["tags"],
+            "releaseDate": g["release"],
+            "developers": [{"id": i, "name": n} for i, n in enumerate(g["developers"])],
+            "publishers": [],
+            "reviews": [{"score": g["review"], "source": "Steam", "count": 100000,
+                         "url": f"https://store.steampowered.com/app/{g['appid']}/"}],
+            "urls": {"game": f"https://isthereanydeal.com/game/{g['slug']}/info/"},
+        }
+
+    @staticmethod
+    def _amount(value, currency):
+        return {"amount": value, "amountInt": int(round(value * 100)), "currency": currency}
+
+    def _itad_games_prices_v3(self, query, data):
+        result = []
+        for gid in data or []:
+            g = self.by_gid.get(gid)
+            if not g:
+                continue
+            p = g["itad"]
+            cur = p["currency"]
+            result.append({
+                "id": gid,
+                "historyLow": {k: self._amount(v, cur) for k, v in p["low"].items()},
+                "deals": [{
+                    "shop": {"id": 61, "name": "Steam"},
+                    "price": self._amount(p["price"], cur),
+                    "regular": self._amount(p["regular"], cur),
+                    "cut": p["cut"],
+                    "url": f"https://store.steampowered.com/app/{g['appid']}/",
+                }],
+            })
+        return result
+
+    def _itad_games_history_v2(self, query, _):
+        # 按 fixtures 生成最近一年的价格历史：原价与当前价交替，其间有一次史低，最新的记录在前
+        g = self.by_gid.get(query.get("id"))
+        if not g:
+            return []
+        p = g["itad"]
+        cur = p["currency"]
+        low = min(p["low"].values()) if p["low"] else p["price"]
+        now = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        since = datetime.datetime.fromisoformat(query["since"]) if query.get("since") else now - datetime.timedelta(days=90)
+        points = [
+            (300, p["regular"], 0),
+            (200, low, round((1 - low / p["regular"]) * 100) if p["regular"] else 0),
+            (190, p["regular"], 0),
+            (30, p["price"], p["cut"]),
+        ]
+        result = []
+        for days, price, cut in reversed(points):
+            ts = now - datetime.timedelta(days=days)
+            if ts < since:
+                continue
+            result.append({
+                "timestamp": ts.isoformat(),
+                "shop": {"id": 61, "name": "Steam"},
+                "deal": {"price": self._amount(price, cur), "regular": self._amount(p["regular"], cur), "cut": cut},
+            })
+        return result
+
+    # ---- Steam ----
+
+    def _steam_api_appdetails(self, query, _):
+        cc = query.get("cc", "us").lower()
+        lang = query.get("l", "english")
+        filters = set(filter(None, query.get("filters", "").split(",")))
+        result = {}
+        for appid in query.get("appids", "").split(","):
+            g = self.by_appid.get(appid)
+            if not g:
+                result[appid] = {"success": False}
+                continue
+            app = {}
+            price = g["steam"].get(cc)
+            if price and (not filters or "price_overview" in filters):
+                final, currency, discount = price
+                initial = round(final / (1 - discount / 100)) if discount else final
+                app["price_overview"] = {
+                    "currency": currency, "initial": initial, "final": final, "discount_percent": discount,
+                    "initial_formatted": "", "final_formatted": f"{final / 100:.2f} {currency}",
+                }
+            if not filters or "basic" in filters:
+                app.update({
+                    "type": "game",
+                    "name": g["zh"] if lang == "schinese" else g["title"],
+                    "steam_appid": g["appid"],
+                    "header_image": f"https://shared.akamai.steamstatic.com/store_item_assets/steam/apps/{appid}/header.jpg",
+                })
+            result[appid] = {"success": True, "data": app}
+        return result
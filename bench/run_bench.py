@@ -0,0 +1,316 @@
+# 插件基准测试
+# 在本地模拟上游（fake_upstream.py）和模拟大模型上运行真实的 SteamPricePlugin.shidi / search_game，
+# 统计 p50/p95/p99 延迟、每次查询的上游请求数和 N 个并发用户下的吞吐量，可与基线比较并在退化时失败。
+# 默认关闭插件的上游限速（RATE_LIMIT_STEAM/ITAD/CDN=0），测量的是插件本身而不是限速等待；
+# 需要把限速计入时用 --set 覆盖，如 --set RATE_LIMIT_STEAM=0.6
+# 需要在装有 AstrBot 的环境中运行，例如:
+#   python bench/run_bench.py --users 8 --queries 200 --scenario mixed
+#   python bench/run_bench.py --save-baseline bench_baseline.json
+#   python bench/run_bench.py --baseline bench_baseline.json --max-regression 0.2   # 退化超过 20% 时退出码为 1
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+PLUGIN_PACKAGE = "astrbot_plugins_steam_shop_price"
+sys.path.insert(0, BENCH_DIR)
+
+from fake_upstream import FakeUpstream  # noqa: E402
+
+SCENARIOS = ("url", "name", "search", "mixed")
+
+
+def load_plugin_module():
+    """以包的形式导入插件（插件内使用相对导入），目录名不要求与插件名一致"""
+    if PLUGIN_PACKAGE not in sys.modules:
+        pkg = types.ModuleType(PLUGIN_PACKAGE)
+        pkg.__path__ = [PLUGIN_DIR]
+        sys.modules[PLUGIN_PACKAGE] = pkg
+    return importlib.import_module(f"{PLUGIN_PACKAGE}.main")
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.completion_text = text
+
+
+class StubProvider:
+    """模拟大模型：按 fixtures 中的中文名/别名返回英文名，支持批量翻译的编号格式"""
+
+    def __init__(self, games, latency=0.5):
+        self.names = {}
+        for g in games:
+            for zh in [g["zh"], *g.get("aliases", [])]:
+                self.names[zh] = g["title"]
+        self.latency = latency
+        self.calls = 0
+        self.busy = 0.0
+
+    def _translate(self, text):
+        for zh in sorted(self.names, key=len, reverse=True):
+            if zh in text:
+                return self.names[zh]
+        return text.strip()
+
+    async def text_chat(self, prompt, **kwargs):
+        self.calls += 1
+        started = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        self.busy += time.perf_counter() - started
+        numbered = re.findall(r"^\s*(\d+)\s*[.、]\s*(.+?)\s*$", prompt, flags=re.M)
+        if len(numbered) > 1:
+            return StubResponse("\n".join(f"{i}. {self._translate(name)}" for i, name in numbered))
+        # 单个翻译：去掉提示词前缀，剩下的就是游戏名（游戏名本身可能含有冒号，如“黑神话：悟空”）
+        prefix = importlib.import_module(f"{PLUGIN_PACKAGE}.translate").SINGLE_PROMPT.split("{name}")[0]
+        return StubResponse(self._translate(prompt.removeprefix(prefix)))
+
+
+class StubContext:
+    def __init__(self, provider):
+        self.provider = provider
+        self.sent = []
+
+    def get_using_provider(self):
+        return self.provider
+
+    async def send_message(self, session, chain):
+        self.sent.append(session)
+        return True
+
+
+class BenchEvent:
+    def __init__(self, message, group="bench"):
+        self.message_str = message
+        self.unified_msg_origin = f"bench:GroupMessage:{group}"
+
+    def plain_result(self, text):
+        return ("plain", text)
+
+    def chain_result(self, chain):
+        return ("chain", chain)
+
+
+def build_queries(games, scenario, count, seed):
+    rnd = random.Random(seed)
+    kinds = ("url", "name", "search") if scenario == "mixed" else (scenario,)
+    queries = []
+    for _ in range(count):
+        kind = rnd.choice(kinds)
+        g = rnd.choice(games)
+        if kind == "url":
+            queries.append((kind, f"/史低 https://store.steampowered.com/app/{g['appid']}"))
+        elif kind == "name":
+            queries.append((kind, f"/史低 {rnd.choice([g['zh'], *g.get('aliases', [])])}"))
+        else:
+            queries.append((kind, f"/搜索游戏 {g['zh']}"))
+    return queries
+
+
+async def run_query(plugin, kind, message, group="bench"):
+    event = BenchEvent(message, group)
+    if kind == "search":
+        gen = plugin.search_game(event, message.split(" ", 1)[1])
+    else:
+        gen = plugin.shidi(event, message.split(" ", 1)[1])
+    replies = []
+    async for reply in gen:
+        replies.append(reply)
+    return replies
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+async def run_bench(args):
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    games = fixtures["games"]
+    server = await FakeUpstream(
+        fixtures, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    ).start()
+    data_dir = tempfile.mkdtemp(prefix="steam_price_bench_")
+    main = load_plugin_module()
+    # 插件数据（翻译缓存、别名索引、订阅等）写到临时目录，不影响正式数据
+    main.plugin_data_path = lambda *parts: os.path.join(data_dir, *parts) if parts else data_dir
+    os.makedirs(os.path.join(data_dir, "thumbs"), exist_ok=True)
+    config = {
+        "ITAD_API_KEY": "bench",
+        "STEAM_COMPARE_REGIONS": ["UA", "US"],
+        "WATCH_ENABLED": False,
+        "RATE_LIMIT_STEAM": 0,
+        "RATE_LIMIT_ITAD": 0,
+        "RATE_LIMIT_CDN": 0,
+        **args.config,
+    }
+    provider = StubProvider(games, latency=args.llm_latency)
+    plugin = main.SteamPricePlugin(StubContext(provider), config)
+    plugin.http.transport_factory = lambda: server.transport(limits=plugin.http.limits)
+
+    queries = build_queries(games, args.scenario, args.queries, args.seed)
+    # 预热：正式计时前先执行 --warmup 次查询（默认 0，即从冷缓存开始）
+    for kind, message in build_queries(games, args.scenario, args.warmup, args.seed + 1):
+        await run_query(plugin, kind, message)
+    server.reset_counts()
+    provider.calls = 0
+    provider.busy = 0.0
+
+    latencies = {kind: [] for kind in ("url", "name", "search")}
+    failures = 0
+    queue = asyncio.Queue()
+    for q in queries:
+        queue.put_nowait(q)
+
+    # 每个模拟用户在各自的群里查询，与插件的按会话排队一致
+    async def user(index):
+        nonlocal failures
+        while not queue.empty():
+            kind, message = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(run_query(plugin, kind, message, f"group{index}"), args.timeout)
+            except Exception as e:
+                failures += 1
+                logging.getLogger("bench").warning(f"查询失败: {message}: {e!r}")
+            latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    await plugin.terminate()
+    await server.stop()
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    upstream = {}
+    for (name, path), n in sorted(server.counts.items()):
+        upstream.setdefault(name, 0)
+        upstream[name] += n
+    total_requests = sum(server.counts.values())
+    return {
+        "scenario": args.scenario,
+        "users": args.users,
+        "queries": len(queries),
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_qps": round(len(queries) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(all_latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(all_latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(all_latencies, 99) * 1000, 1),
+        "by_kind": {
+            kind: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+            }
+            for kind, values in latencies.items() if values
+        },
+        "upstream_requests_per_query": round(total_requests / len(queries), 3) if queries else 0.0,
+        "upstream_requests": upstream,
+        "upstream_endpoints": {f"{name}:{path}": n for (name, path), n in sorted(server.counts.items())},
+        "injected_errors": dict(server.errors),
+        "llm_calls": provider.calls,
+        "llm_busy_s": round(provider.busy, 3),
+    }
+
+
+# 与基线比较的指标：(指标, 越大越差)
+REGRESSION_METRICS = (
+    ("p50_ms", True),
+    ("p95_ms", True),
+    ("p99_ms", True),
+    ("upstream_requests_per_query", True),
+    ("throughput_qps", False),
+)
+
+
+def compare(result, baseline, tolerance):
+    """返回退化的指标说明列表，为空表示没有退化"""
+    problems = []
+    for metric, higher_is_worse in REGRESSION_METRICS:
+        old, new = baseline.get(metric), result.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (higher_is_worse and change > tolerance) or (not higher_is_worse and -change > tolerance):
+            problems.append(f"{metric}: {old} -> {new} ({change:+.1%})")
+    return problems
+
+
+def parse_latency(value):
+    result = {}
+    for part in filter(None, value.split(",")):
+        name, seconds = part.split("=")
+        result[name.strip()] = float(seconds)
+    return result
+
+
+def parse_config(values):
+    config = {}
+    for item in values or []:
+        key, value = item.split("=", 1)
+        try:
+            config[key] = json.loads(value)
+        except ValueError:
+            config[key] = value
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Steam价格插件基准测试")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--users", type=int, default=8, help="并发用户数")
+    parser.add_argument("--queries", type=int, default=200, help="总查询次数")
+    parser.add_argument("--warmup", type=int, default=0, help="正式计时前的预热查询次数")
+    parser.add_argument("--latency", type=parse_latency, default={}, help="上游延迟，如 itad=0.08,steam=0.15,cdn=0.03")
+    parser.add_argument("--jitter", type=float, default=0.3, help="延迟抖动（对数正态分布的 sigma）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="上游返回 503/429 的概率")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟大模型的响应时间（秒）")
+    parser.add_argument("--timeout", type=float, default=60, help="单次查询超时（秒）")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fixtures", default=os.path.join(BENCH_DIR, "fixtures.json"))
+    parser.add_argument("--set", dest="config", action="append", type=str, metavar="KEY=VALUE",
+                        help="覆盖插件配置，值按 JSON 解析，如 --set RATE_LIMIT_STEAM=0.6")
+    parser.add_argument("--baseline", help="基线结果 JSON，指标退化超过 --max-regression 时退出码为 1")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    args = parser.parse_args()
+    args.config = parse_config(args.config)
+    if not args.verbose:
+        for name in ("astrbot", "httpx"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    result = asyncio.run(run_bench(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.max_regression)
+        if problems:
+            print("性能退化:\n" + "\n".join(problems), file=sys.stderr)
+            sys.exit(1)
+        print("与基线相比无明显退化")
+    if result["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
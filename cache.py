@@ -0,0 +1,219 @@
+# 上游响应缓存
+# 内存 LRU（按条目数/字节数限制）+ 可选 SQLite 持久化，支持按接口设置不同的 TTL
+# SQLite 使用 WAL 模式，同一台机器上的多个 bot 进程可以共享同一个缓存文件
+# 过期条目在宽限期内仍会保留，上游出错或熔断时可以返回过期数据兜底
+# 可选 stale-while-revalidate：刚过期不久的条目直接返回，同时在后台刷新，下一次查询拿到新数据
+# 用法: cache = ResponseCache(max_entries=2048, sqlite_path="cache.db")
+#       data = await cache.get_or_fetch("itad:lookup:730", 86400, fetch)
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+from astrbot.api import logger
+
+from .concurrency import SingleFlight
+
+# 各接口默认 TTL（秒）：appid→gid 映射和游戏信息几乎不变，价格变化较慢
+DEFAULT_TTLS = {
+    "lookup": 7 * 86400,
+    "info": 86400,
+    "prices": 1800,
+    "appdetails": 1800,
+    "search": 86400,
+}
+# 过期条目的保留时间（秒），期间可作为兜底数据
+STALE_GRACE = 7 * 86400
+
+
+class ResponseCache:
+    def __init__(self, max_entries=2048, max_bytes=0, sqlite_path=None, stale_while_revalidate=0):
+        """
+        max_entries: 内存中最多保存的条目数（0 表示不限制）
+        max_bytes: 内存中最多占用的字节数（按 JSON 长度估算，0 表示不限制）
+        sqlite_path: SQLite 文件路径，为空时只使用内存缓存
+        stale_while_revalidate: 条目过期后多少秒内仍直接返回并在后台刷新（0 表示不启用）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_while_revalidate = stale_while_revalidate
+        # key -> 后台刷新任务，同一 key 同时只刷新一次
+        self._refreshing = {}
+        # 同一 key 的并发未命中只请求一次上游
+        self._singleflight = SingleFlight()
+        self.revalidated = 0
+        # key -> (expires_at, value, size)
+        self._mem = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        self.stale_served = 0
+        self._db = None
+        if sqlite_path:
+            try:
+                self._db = sqlite3.connect(sqlite_path, timeout=5, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._db.execute("DELETE FROM cache WHERE expires_at < ?", (time.time() - STALE_GRACE,))
+            except Exception as e:
+                logger.error(f"[缓存] 打开SQLite缓存失败，仅使用内存缓存: {e}")
+                self._db = None
+
+    def _mem_put(self, key, value, expires_at, size):
+        old = self._mem.pop(key, None)
+        if old:
+            self._bytes -= old[2]
+        self._mem[key] = (expires_at, value, size)
+        self._bytes += size
+        while self._mem and (
+            (self.max_entries and len(self._mem) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, (_, _, evicted_size) = self._mem.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def get(self, key):
+        """取未过期的缓存值，不存在时返回 None"""
+        now = time.time()
+        entry = self._mem.get(key)
+        if entry and entry[0] > now:
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if self._db is not None:
+            try:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            except Exception as e:
+                logger.error(f"[缓存] 读取SQLite失败: {e}")
+                row = None
+            if row:
+                value = json.loads(row[0])
+                self._mem_put(key, value, row[1], len(row[0]))
+                self.hits += 1
+                self.db_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def get_stale(self, key):
+        """取缓存值，不论是否过期（宽限期内），不存在时返回 None"""
+        return self._get_with_expiry(key)[0]
+
+    def _get_with_expiry(self, key):
+        """返回 (value, expires_at)，不存在时为 (None, 0)"""
+        entry = self._mem.get(key)
+        if entry:
+            return entry[1], entry[0]
+        if self._db is not None:
+            try:
+                row = self._db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            except Exception as e:
+                logger.error(f"[缓存] 读取SQLite失败: {e}")
+                row = None
+            if row:
+                return json.loads(row[0]), row[1]
+        return None, 0
+
+    def set(self, key, value, ttl):
+        """写入缓存，value 需可 JSON 序列化"""
+        if value is None or ttl <= 0:
+            return
+        raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        expires_at = time.time() + ttl
+        self._mem_put(key, value, expires_at, len(raw))
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, raw, expires_at)
+                )
+            except Exception as e:
+                logger.error(f"[缓存] 写入SQLite失败: {e}")
+
+    async def get_or_fetch(self, key, ttl, fetch, stale_on_error=True):
+        """
+        命中缓存直接返回；否则 await fetch() 获取并写入缓存。
+        fetch 返回 None 视为失败，不写缓存。
+        fetch 抛出异常（上游出错/熔断）时，若有过期数据则返回过期数据，否则继续抛出。
+        同一 key 同时未命中时只执行一次 fetch，其他调用方共享结果。
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        stale = self.get_revalidating(key)
+        if stale is not None:
+            async def refresh():
+                self.set(key, await fetch(), ttl)
+            self.refresh(key, refresh)
+            return stale
+        try:
+            return await self._singleflight.do(key, lambda: self._fetch_and_set(key, ttl, fetch))
+        except Exception as e:
+            stale = self.get_stale(key) if stale_on_error else None
+            if stale is None:
+                raise
+            self.stale_served += 1
+            logger.info(f"[缓存] 上游请求失败，返回过期数据: {key}（{e}）")
+            return stale
+
+    async def _fetch_and_set(self, key, ttl, fetch):
+        value = await fetch()
+        self.set(key, value, ttl)
+        return value
+
+    def get_revalidating(self, key):
+        """
+        stale-while-revalidate：条目刚过期（在设定的时间窗口内）时返回旧值，否则返回 None。
+        调用方拿到旧值后应调用 refresh() 在后台刷新。
+        """
+        if self.stale_while_revalidate <= 0:
+            return None
+        value, expires_at = self._get_with_expiry(key)
+        if value is None or time.time() - expires_at > self.stale_while_revalidate:
+            return None
+        self.revalidated += 1
+        return value
+
+    def refresh(self, key, refresh):
+        """在后台执行 await refresh()（由其自行写入缓存），同一 key 同时只刷新一次，失败时保留旧值"""
+        if key in self._refreshing:
+            return
+
+        async def run():
+            try:
+                await refresh()
+            except Exception as e:
+                logger.info(f"[缓存] 后台刷新失败: {key}（{e}）")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.ensure_future(run())
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "db_hits": self.db_hits,
+            "stale_served": self.stale_served,
+            "revalidated": self.revalidated,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._mem),
+            "bytes": self._bytes,
+        }
+
+    def close(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self._db is not None:
+            try:
+                self._db.close()
+            except Exception:
+                pass
+            self._db = None
@@ -0,0 +1,50 @@
+# 并发工具
+import asyncio
+
+from astrbot.api import logger
+
+
+async def bounded_map(func, items, limit=4, timeout=None):
+    """
+    并发执行 func(item)，同时最多运行 limit 个，每项最多等待 timeout 秒。
+    结果与 items 顺序一致；超时或出错的项返回 None，不影响其他项。
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def run(item):
+        async with sem:
+            try:
+                if timeout:
+                    return await asyncio.wait_for(func(item), timeout)
+                return await func(item)
+            except asyncio.TimeoutError:
+                logger.info(f"[并发] 单项处理超时（>{timeout}s），已跳过")
+            except Exception as e:
+                logger.error(f"[并发] 单项处理失败: {e}")
+            return None
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+class SingleFlight:
+    """
+    并发请求合并：同一 key 同时只执行一次，其他调用方等待并共享同一结果。
+    计算完成后立即移除，之后的调用会重新执行（结果缓存由调用方自行处理）。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key, func):
+        task = self._calls.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._calls.pop(key, None) if self._calls.get(key) is t else None)
+        else:
+            self.shared += 1
+        # shield：某个调用方被取消时不影响其他等待者
+        return await asyncio.shield(task)
@@ -0,0 +1,86 @@
+# 插件数据目录
+# 缓存、索引等持久化文件统一放在 AstrBot 的 data/plugin_data/<插件名>/ 下
+# DebouncedJsonFile: 频繁修改的 JSON 文件延迟合并写入，不在事件循环上做文件 I/O
+import asyncio
+import json
+import os
+
+from astrbot.api import logger
+
+PLUGIN_NAME = "astrbot_plugins_steam_shop_price"
+
+
+def plugin_data_path(*parts):
+    """
+    返回插件数据目录下的路径，目录不存在时自动创建。
+    传入绝对路径时原样返回（用于用户在配置中自定义位置）。
+    """
+    if parts and os.path.isabs(parts[0]):
+        path = os.path.join(*parts)
+    else:
+        try:
+            from astrbot.api.star import StarTools
+            base = str(StarTools.get_data_dir(PLUGIN_NAME))
+        except Exception:
+            base = os.path.join("data", "plugin_data", PLUGIN_NAME)
+        path = os.path.join(base, *parts)
+    os.makedirs(os.path.dirname(path) if parts else path, exist_ok=True)
+    return path
+
+
+class DebouncedJsonFile:
+    def __init__(self, path, dump, delay=5.0, label="保存"):
+        """
+        path: JSON 文件路径，为空时不写入
+        dump: 返回要写入的对象的函数
+        delay: 修改后等待多久（秒）写入，期间的多次修改合并为一次
+        label: 日志前缀
+        """
+        self.path = path
+        self.dump = dump
+        self.delay = delay
+        self.label = label
+        self._dirty = False
+        self._task = None
+
+    def mark_dirty(self):
+        """标记有未保存的修改，delay 秒后在工作线程中写入；没有运行中的事件循环时直接写入"""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        self._task = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        # 序列化在事件循环上完成，不会与修改并发；只有写文件放到工作线程
+        raw = json.dumps(self.dump(), ensure_ascii=False)
+        await asyncio.to_thread(self._write, raw)
+
+    def flush(self):
+        """立即写入未保存的修改并取消待执行的延迟写入（插件卸载时调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._dirty:
+            self._dirty = False
+            self._write(json.dumps(self.dump(), ensure_ascii=False))
+
+    def _write(self, raw):
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(raw)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.error(f"[{self.label}] 保存失败: {e}")
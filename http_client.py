@@ -0,0 +1,261 @@
+# 插件级共享 HTTP 客户端
+# 按目标主机维护独立连接池并保持长连接，避免每次请求都重新进行 TCP/TLS 握手
+# 每个上游（Steam 商店 / ITAD / 图片CDN）有独立的令牌桶限流和熔断器，429/5xx 按指数退避重试
+# 可选对冲请求：请求耗时超过该上游近期耗时的指定百分位时，再发一个相同请求，取先返回的结果
+# 用法: self.http = HttpClientManager(timeout=20)
+#       resp = await self.http.get(url, params=...)
+#       await self.http.aclose()  # 插件卸载时调用
+import asyncio
+import importlib.util
+import random
+from urllib.parse import urlsplit
+
+import httpx
+from astrbot.api import logger
+
+from .metrics import metrics
+from .rate_limit import CircuitOpenError, Upstream
+
+# 主机 → 上游名称，未列出的主机归入 cdn
+UPSTREAM_HOSTS = {
+    "store.steampowered.com": "steam",
+    "api.isthereanydeal.com": "itad",
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 允许对冲的上游：用到的 Steam/ITAD 接口（包括 POST 的批量查询）都是只读的，重复请求无副作用
+HEDGE_UPSTREAMS = {"steam", "itad"}
+
+
+def default_upstreams(config=None):
+    """按配置创建各上游的限流/熔断策略"""
+    config = config or {}
+    threshold = int(config.get("CIRCUIT_FAILURE_THRESHOLD", 5) or 5)
+    reset = float(config.get("CIRCUIT_RESET_SECONDS", 30) or 30)
+    probe = float(config.get("CIRCUIT_PROBE_TIMEOUT", 10) or 10)
+    return {
+        # Steam 商店 appdetails 约每 5 分钟 200 次
+        "steam": Upstream("steam", rate=float(config.get("RATE_LIMIT_STEAM", 0.6) or 0), burst=10,
+                          failure_threshold=threshold, reset_timeout=reset, empty_is_error=True, probe_timeout=probe),
+        "itad": Upstream("itad", rate=float(config.get("RATE_LIMIT_ITAD", 5) or 0), burst=10,
+                         failure_threshold=threshold, reset_timeout=reset, probe_timeout=probe),
+        "cdn": Upstream("cdn", rate=float(config.get("RATE_LIMIT_CDN", 20) or 0), burst=20,
+                        failure_threshold=threshold, reset_timeout=reset, probe_timeout=probe),
+    }
+
+
+class HttpClientManager:
+    def __init__(self, timeout=20, max_connections=20, max_keepalive=10, keepalive_expiry=30, http2=False,
+                 upstreams=None, hosts=None, max_retries=2, backoff_base=0.5, backoff_max=8,
+                 hedge_percentile=0, transport_factory=None):
+        """
+        timeout: 默认超时（秒），单次请求可通过 timeout= 覆盖
+        max_connections: 每个主机的最大连接数
+        max_keepalive: 每个主机保持的空闲长连接数
+        keepalive_expiry: 空闲长连接的保持时间（秒）
+        http2: 是否启用 HTTP/2（需要安装 h2，未安装时自动回退到 HTTP/1.1）
+        upstreams: {上游名称: Upstream}，为空时不限流、不熔断
+        hosts: {主机: 上游名称}，默认 UPSTREAM_HOSTS，未列出的主机使用名为 cdn 的上游
+        max_retries: 429/5xx/网络错误的最大重试次数
+        backoff_base / backoff_max: 指数退避的初始与最大等待时间（秒），实际等待带随机抖动
+        hedge_percentile: 对冲请求的触发百分位（如 95），0 表示不发对冲请求
+        transport_factory: 可选，创建连接池时调用以获得 httpx 传输层（基准测试用它把请求转到本地模拟服务）
+        """
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("[HTTP] 未安装 h2，HTTP/2 已回退为 HTTP/1.1（可执行 pip install httpx[http2]）")
+            http2 = False
+        self.http2 = http2
+        self.upstreams = upstreams or {}
+        self.hosts = UPSTREAM_HOSTS if hosts is None else hosts
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.transport_factory = transport_factory
+        self._clients = {}
+        self._closed = False
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            timeout=float(config.get("HTTP_TIMEOUT", 20) or 20),
+            max_connections=int(config.get("HTTP_MAX_CONNECTIONS", 20) or 20),
+            max_keepalive=int(config.get("HTTP_MAX_KEEPALIVE", 10) or 10),
+            keepalive_expiry=float(config.get("HTTP_KEEPALIVE_EXPIRY", 30) or 30),
+            http2=bool(config.get("HTTP2_ENABLED", False)),
+            upstreams=default_upstreams(config),
+            max_retries=int(config.get("HTTP_MAX_RETRIES", 2) or 0),
+            hedge_percentile=float(config.get("HEDGE_PERCENTILE", 0) or 0) if config.get("HEDGE_ENABLED", False) else 0,
+        )
+
+    def client_for(self, url):
+        """按 scheme://host 取对应的连接池，不存在时创建"""
+        if self._closed:
+            raise RuntimeError("HttpClientManager 已关闭")
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self.transport_factory() if self.transport_factory else None,
+            )
+            self._clients[key] = client
+        return client
+
+    @staticmethod
+    def endpoint_for(url, up):
+        """指标中使用的接口名：API 上游为 上游:路径，图片等其他上游只按上游汇总"""
+        if up is None:
+            return "-"
+        if up.name in HEDGE_UPSTREAMS:
+            return f"{up.name}:{urlsplit(url).path}"
+        return up.name
+
+    def upstream_for(self, url):
+        host = urlsplit(url).hostname or ""
+        return self.upstreams.get(self.hosts.get(host, "cdn"))
+
+    @staticmethod
+    def _is_empty(resp):
+        return resp.status_code == 200 and resp.content.strip() in (b"", b"null")
+
+    def _backoff(self, attempt, resp):
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def request(self, method, url, priority=0, **kwargs):
+        """
+        发送请求：先经过上游熔断检查和令牌桶限流，429/5xx/网络错误按指数退避重试。
+        priority: 限流排队优先级，数值越小越优先（用户查询 0，后台任务更大）
+        上游熔断时抛出 CircuitOpenError；重试耗尽后返回最后一次响应或抛出最后一次网络错误。
+        """
+        up = self.upstream_for(url)
+        client = self.client_for(url)
+        endpoint = self.endpoint_for(url, up)
+        attempt = 0
+        while True:
+            probe = False
+            if up is not None:
+                if not up.breaker.allow():
+                    up.rejected += 1
+                    metrics.inc("upstream_errors_total", endpoint=endpoint, kind="circuit_open")
+                    raise CircuitOpenError(up.name, up.breaker.retry_in())
+                probe = up.breaker.probing
+            try:
+                resp, error = await self._attempt(up, client, method, url, kwargs, priority, endpoint, probe)
+            finally:
+                # 试探请求被取消时（未记录成功或失败）释放试探名额，否则熔断器会一直拒绝请求
+                if probe and up.breaker.probing:
+                    up.breaker.cancel_probe()
+            if error is None and not (resp.status_code in RETRY_STATUS or (
+                up is not None and up.empty_is_error and self._is_empty(resp)
+            )):
+                if up is not None:
+                    up.breaker.record_success()
+                return resp
+            if up is not None:
+                up.failures += 1
+                up.breaker.record_failure()
+            reason = error or f"HTTP {resp.status_code}" + ("（空响应）" if self._is_empty(resp) else "")
+            if attempt >= self.max_retries or (up is not None and up.breaker.state == "open"):
+                logger.info(f"[HTTP][{up.name if up else '-'}] 请求失败且不再重试: {reason}")
+                if error is not None:
+                    raise error
+                return resp
+            delay = self._backoff(attempt, resp)
+            attempt += 1
+            metrics.inc("upstream_retries_total", endpoint=endpoint)
+            if up is not None:
+                up.retries += 1
+            logger.info(f"[HTTP][{up.name if up else '-'}] {reason}，{delay:.1f}s 后第{attempt}次重试")
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, up, client, method, url, kwargs, priority, endpoint, probe):
+        """限流后发出一次请求并记录指标，返回 (响应, 网络错误)；熔断试探请求有单独的超时"""
+        if up is not None:
+            await up.bucket.acquire(priority)
+            up.requests += 1
+        resp = error = None
+        started = asyncio.get_running_loop().time()
+        try:
+            if probe:
+                try:
+                    resp = await asyncio.wait_for(
+                        self._send(up, client, method, url, kwargs), up.breaker.probe_timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise httpx.TimeoutException(f"熔断试探请求超过 {up.breaker.probe_timeout}s 未返回")
+            else:
+                resp = await self._send(up, client, method, url, kwargs)
+        except httpx.TransportError as e:
+            error = e
+            kind = "timeout" if isinstance(e, httpx.TimeoutException) else "transport"
+            metrics.inc("upstream_errors_total", endpoint=endpoint, kind=kind)
+        else:
+            metrics.inc("upstream_requests_total", endpoint=endpoint, status=resp.status_code)
+            if resp.status_code >= 400:
+                metrics.inc("upstream_errors_total", endpoint=endpoint, kind="status")
+        metrics.observe("upstream_request_seconds", asyncio.get_running_loop().time() - started, endpoint=endpoint)
+        return resp, error
+
+    async def _send(self, up, client, method, url, kwargs):
+        """发出一次请求（不含重试），开启对冲时按近期耗时决定是否补发一个相同请求"""
+        started = asyncio.get_running_loop().time()
+        delay = None
+        if self.hedge_percentile and up is not None and up.name in HEDGE_UPSTREAMS:
+            delay = up.hedge_delay(self.hedge_percentile)
+        if delay is None:
+            resp = await client.request(method, url, **kwargs)
+        else:
+            resp = await self._hedged(up, client, method, url, kwargs, delay)
+        if up is not None and resp.status_code < 400:
+            up.latencies.append(asyncio.get_running_loop().time() - started)
+        return resp
+
+    async def _hedged(self, up, client, method, url, kwargs, delay):
+        first = asyncio.ensure_future(client.request(method, url, **kwargs))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        # 对冲请求同样占用限流令牌；没有空闲令牌时不补发，避免放大上游压力
+        if done or not up.bucket.try_acquire():
+            return await first
+        up.hedged += 1
+        up.requests += 1
+        second = asyncio.ensure_future(client.request(method, url, **kwargs))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                ok = [task for task in done if task.exception() is None]
+                # 一个失败时等另一个，两个都失败时抛出最后的错误
+                if ok or not pending:
+                    return (ok or list(done))[0].result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        self._closed = True
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"[HTTP] 关闭连接池失败: {e}")
@@ -0,0 +1,181 @@
+# 封面图片处理
+# - 解码、缩放、JPEG 编码在线程池/进程池中执行，不阻塞事件循环
+# - 缩略图按 (来源URL, 尺寸) 内容寻址缓存，内存和磁盘分别按字节数上限淘汰
+# - 可将多张缩略图拼成一张总览图，一次发送
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from astrbot.api import logger
+
+
+def make_thumbnail(data, size):
+    """解码图片并缩放到 size 以内，返回 JPEG 字节（在工作线程/进程中执行）"""
+    from PIL import Image as PILImage
+    with io.BytesIO(data) as f:
+        with PILImage.open(f) as pil_img:
+            pil_img = pil_img.convert("RGB")
+            pil_img.thumbnail(size)
+            buf = io.BytesIO()
+            pil_img.save(buf, format="JPEG", quality=85)
+            return buf.getvalue()
+
+
+def make_contact_sheet(images, cell, columns):
+    """
+    把多张 JPEG 拼成一张总览图，每格左上角标注序号（从1开始）。
+    images 中为 None 的位置留空。
+    """
+    from PIL import Image as PILImage, ImageDraw
+    count = len(images)
+    columns = max(1, min(columns, count))
+    rows = (count + columns - 1) // columns
+    pad = 6
+    sheet = PILImage.new("RGB", (columns * (cell[0] + pad) + pad, rows * (cell[1] + pad) + pad), "white")
+    draw = ImageDraw.Draw(sheet)
+    for i, data in enumerate(images):
+        x = pad + (i % columns) * (cell[0] + pad)
+        y = pad + (i // columns) * (cell[1] + pad)
+        if data:
+            with PILImage.open(io.BytesIO(data)) as img:
+                img = img.convert("RGB")
+                img.thumbnail(cell)
+                sheet.paste(img, (x + (cell[0] - img.width) // 2, y + (cell[1] - img.height) // 2))
+        draw.rectangle((x, y, x + 18, y + 14), fill="black")
+        draw.text((x + 3, y + 1), str(i + 1), fill="white")
+    buf = io.BytesIO()
+    sheet.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+class ImagePipeline:
+    def __init__(self, http, max_bytes=8 * 1024 * 1024, workers=2, use_process=False, disk_dir=None, disk_max_bytes=64 * 1024 * 1024):
+        """
+        http: HttpClientManager，用于下载原图
+        max_bytes: 内存缩略图缓存上限（字节）
+        workers: 图片处理工作线程/进程数
+        use_process: True 时使用进程池（CPU 密集时不受 GIL 限制）
+        disk_dir: 磁盘缓存目录，为空时只缓存在内存
+        disk_max_bytes: 磁盘缓存上限（字节）
+        """
+        self.http = http
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        executor_cls = ProcessPoolExecutor if use_process else ThreadPoolExecutor
+        self._pool = executor_cls(max_workers=max(1, workers))
+        self._mem = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = None
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(url, size):
+        return hashlib.sha1(f"{url}|{size[0]}x{size[1]}".encode("utf-8")).hexdigest()
+
+    def _mem_get(self, key):
+        data = self._mem.get(key)
+        if data is not None:
+            self._mem.move_to_end(key)
+        return data
+
+    def _mem_put(self, key, data):
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._mem[key] = data
+        self._bytes += len(data)
+        while self._mem and self._bytes > self.max_bytes:
+            _, evicted = self._mem.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".jpg")
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _disk_put(self, key, data):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+        else:
+            self._disk_bytes += len(data)
+        if self._disk_bytes > self.disk_max_bytes:
+            # 按最近访问时间淘汰，直到降到上限的 80%
+            files = sorted(self._disk_files(), key=lambda x: x[2])
+            self._disk_bytes = sum(size for _, size, _ in files)
+            for p, size, _ in files:
+                if self._disk_bytes <= self.disk_max_bytes * 0.8:
+                    break
+                try:
+                    os.remove(p)
+                    self._disk_bytes -= size
+                except OSError:
+                    pass
+
+    def _disk_files(self):
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                p = os.path.join(root, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                yield p, st.st_size, st.st_mtime
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    async def thumbnail(self, url, size=(200, 200), timeout=8):
+        """下载并生成缩略图（JPEG 字节），同一 URL+尺寸 只处理一次"""
+        key = self.cache_key(url, size)
+        data = self._mem_get(key)
+        if data is None and self.disk_dir:
+            data = await asyncio.to_thread(self._disk_get, key)
+            if data is not None:
+                self._mem_put(key, data)
+        if data is not None:
+            self.hits += 1
+            return data
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._build(key, url, size, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, key, url, size, timeout):
+        resp = await self.http.get(url, timeout=timeout)
+        resp.raise_for_status()
+        data = await self._run(make_thumbnail, resp.content, size)
+        self._mem_put(key, data)
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._disk_put, key, data)
+            except Exception as e:
+                logger.error(f"[图片缓存] 写入磁盘失败: {e}")
+        return data
+
+    async def contact_sheet(self, images, cell=(200, 200), columns=4):
+        """把多张缩略图拼成一张总览图（JPEG 字节）"""
+        return await self._run(make_contact_sheet, list(images), cell, columns)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
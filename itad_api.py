@@ -0,0 +1,182 @@
+# ITAD（isthereanydeal.com）接口封装
+# games/prices/v3、lookup/id/shop 支持一次 POST 多个 gid/appid，列表类查询只需一次请求
+import traceback
+
+from astrbot.api import logger
+
+ITAD_API_BASE = "https://api.isthereanydeal.com"
+STEAM_SHOP_ID = 61
+# 单次 POST 的最大 gid 数
+PRICES_CHUNK = 200
+
+
+def parse_price_entry(entry):
+    """
+    解析 prices/v3 中单个游戏的数据。
+    返回 {"price", "regular", "currency", "cut", "lowest", "history_low"}，字段取不到时为 None
+    lowest 依次取近3个月/近1年/全部时间的史低（与原有展示一致），history_low 为全部时间史低
+    """
+    result = {"price": None, "regular": None, "currency": None, "cut": 0, "lowest": None, "history_low": None}
+    if not entry:
+        return result
+    # 取Steam的当前价和原价
+    for d in entry.get("deals") or []:
+        if d.get("shop", {}).get("name", "").lower() == "steam":
+            result["price"] = d.get("price", {}).get("amount")
+            result["currency"] = d.get("price", {}).get("currency")
+            if d.get("regular") and "amount" in d["regular"]:
+                result["regular"] = d["regular"]["amount"]
+            result["cut"] = d.get("cut", 0) or 0
+            break
+    # 取史低价
+    history_low = entry.get("historyLow") or {}
+    if history_low.get("all") and "amount" in history_low["all"]:
+        result["history_low"] = history_low["all"]["amount"]
+    for k in ["m3", "y1", "all"]:
+        if history_low.get(k) and "amount" in history_low[k]:
+            result["lowest"] = history_low[k]["amount"]
+            if result["currency"] is None:
+                result["currency"] = history_low[k].get("currency")
+            break
+    return result
+
+
+async def fetch_prices(http, api_key, gids, country, cache=None, ttl=0, priority=0):
+    """
+    批量获取多个游戏在指定区的 Steam 当前价、原价和史低。
+    已缓存的 gid 不再请求，其余 gid 合并为一次（超过 PRICES_CHUNK 时分块）POST。
+    priority: 限流排队优先级，后台任务传入较大的值，让用户查询优先
+    返回 {gid: parse_price_entry(...)}，请求失败的 gid 不在结果中
+    """
+    gids = list(dict.fromkeys(g for g in gids if g))
+    raw = {}
+    missing = []
+    revalidate = []
+    for gid in gids:
+        key = f"itad:price:{country}:{gid}"
+        cached = cache.get(key) if cache is not None and ttl > 0 else None
+        if cached is None and cache is not None and ttl > 0:
+            # 刚过期的条目先返回旧值，后台再刷新
+            cached = cache.get_revalidating(key)
+            if cached is not None:
+                revalidate.append(gid)
+        if cached is not None:
+            raw[gid] = cached
+        else:
+            missing.append(gid)
+    if revalidate:
+        cache.refresh(
+            f"itad:prices:{country}:{','.join(revalidate)}",
+            lambda: _refresh_prices(http, api_key, revalidate, country, cache, ttl, priority)
+        )
+    for i in range(0, len(missing), PRICES_CHUNK):
+        chunk = missing[i:i + PRICES_CHUNK]
+        try:
+            fetched = await _request_prices(http, api_key, chunk, country, priority)
+        except Exception as e:
+            logger.error(f"[ITAD][prices][{country}] 批量获取价格失败: {e}\n{traceback.format_exc()}")
+            # 上游出错/熔断时使用过期缓存兜底
+            if cache is not None:
+                for gid in chunk:
+                    stale = cache.get_stale(f"itad:price:{country}:{gid}")
+                    if stale is not None:
+                        raw[gid] = stale
+            continue
+        raw.update(fetched)
+        if cache is not None and ttl > 0:
+            for gid, entry in fetched.items():
+                cache.set(f"itad:price:{country}:{gid}", entry, ttl)
+    return {gid: parse_price_entry(entry) for gid, entry in raw.items()}
+
+
+async def _request_prices(http, api_key, gids, country, priority=0):
+    """一次 prices/v3 POST，返回 {gid: 原始条目}；没有返回的 gid 记为空条目，避免短时间内反复请求"""
+    resp = await http.post(
+        f"{ITAD_API_BASE}/games/prices/v3",
+        params={"key": api_key, "country": country, "shops": STEAM_SHOP_ID},
+        json=gids,
+        priority=priority
+    )
+    resp.raise_for_status()
+    data = resp.json()
+    logger.info(f"[ITAD][prices][{country}] 成功获取{len(gids)}个游戏的价格和史低信息")
+    found = {entry.get("id"): entry for entry in data if isinstance(entry, dict)} if isinstance(data, list) else {}
+    return {gid: found.get(gid, {"id": gid, "deals": [], "historyLow": {}}) for gid in gids}
+
+
+async def _refresh_prices(http, api_key, gids, country, cache, ttl, priority):
+    """后台刷新刚过期的价格条目，结果写回缓存"""
+    for i in range(0, len(gids), PRICES_CHUNK):
+        fetched = await _request_prices(http, api_key, gids[i:i + PRICES_CHUNK], country, priority)
+        for gid, entry in fetched.items():
+            cache.set(f"itad:price:{country}:{gid}", entry, ttl)
+
+
+async def lookup_gids(http, api_key, appids, cache=None, ttl=0, priority=0):
+    """
+    批量把 Steam appid 转换为 ITAD gid（lookup/id/shop/61/v1 一次 POST 多个 appid）。
+    与单个 games/lookup/v1 查询共用缓存；上游出错/熔断时使用过期缓存兜底。
+    返回 {appid: gid 或 None}，请求失败且没有缓存的 appid 不在结果中
+    """
+    appids = list(dict.fromkeys(str(a) for a in appids if a))
+    result = {}
+    missing = []
+    revalidate = []
+    for appid in appids:
+        key = f"itad:lookup:{appid}"
+        cached = cache.get(key) if cache is not None and ttl > 0 else None
+        if cached is None and cache is not None and ttl > 0:
+            # 刚过期的条目先返回旧值，后台再刷新
+            cached = cache.get_revalidating(key)
+            if cached is not None:
+                revalidate.append(appid)
+        if cached is not None:
+            result[appid] = cached["game"]["id"] if cached.get("found") else None
+        else:
+            missing.append(appid)
+    if revalidate:
+        cache.refresh(
+            f"itad:lookups:{','.join(revalidate)}",
+            lambda: _refresh_gids(http, api_key, revalidate, cache, ttl, priority)
+        )
+    if not missing:
+        return result
+    try:
+        gids = await _request_gids(http, api_key, missing, priority)
+    except Exception as e:
+        logger.error(f"[ITAD][lookup] 批量查询 gid 失败: {e}\n{traceback.format_exc()}")
+        # 上游出错/熔断时使用过期缓存兜底
+        if cache is not None:
+            for appid in missing:
+                stale = cache.get_stale(f"itad:lookup:{appid}")
+                if stale is not None:
+                    result[appid] = stale["game"]["id"] if stale.get("found") else None
+        return result
+    result.update(gids)
+    if cache is not None and ttl > 0:
+        _cache_gids(cache, gids, ttl)
+    return result
+
+
+async def _request_gids(http, api_key, appids, priority=0):
+    """一次 lookup/id/shop POST，返回 {appid: gid 或 None}"""
+    resp = await http.post(
+        f"{ITAD_API_BASE}/lookup/id/shop/{STEAM_SHOP_ID}/v1",
+        params={"key": api_key},
+        json=[f"app/{appid}" for appid in appids],
+        priority=priority
+    )
+    resp.raise_for_status()
+    data = resp.json() or {}
+    return {appid: data.get(f"app/{appid}") for appid in appids}
+
+
+def _cache_gids(cache, gids, ttl):
+    for appid, gid in gids.items():
+        # 与 games/lookup/v1 的返回格式保持一致
+        cache.set(f"itad:lookup:{appid}", {"found": bool(gid), "game": {"id": gid} if gid else None}, ttl)
+
+
+async def _refresh_gids(http, api_key, appids, cache, ttl, priority):
+    """后台刷新刚过期的 gid 映射，结果写回缓存"""
+    _cache_gids(cache, await _request_gids(http, api_key, appids, priority), ttl)
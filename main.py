@@ -1,17 +1,41 @@
+import os
 import re
-import httpx
+import base64
 import traceback
 import asyncio  # 补充导入
 import datetime
-from astrbot.api.event import filter, AstrMessageEvent
+import time
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger
 import astrbot.api.message_components as Comp
-from .price_convert import to_cny
+from .price_convert import RateService, JsonFileRateProvider, HttpRateProvider
+from .http_client import HttpClientManager
+from .cache import ResponseCache, DEFAULT_TTLS
+from .data_path import plugin_data_path
+from .translate import GameNameTranslator
+from .app_index import SteamAppIndex, normalize_title
+from .alias_index import AliasIndex
+from .itad_api import ITAD_API_BASE, fetch_prices, lookup_gids, parse_price_entry
+from .concurrency import bounded_map, SingleFlight
+from .image_utils import ImagePipeline
+from .asset_resolver import AssetResolver
+from .scheduler import AdmissionScheduler, SchedulerBusy
+from .warmup import QueryStats, CacheWarmer
+from .price_history import HistoryStore, PriceHistory
+from .task_graph import TaskGraph
+from .price_watch import WatchStore, PriceWatcher, make_snapshot
+from .price_store import PriceSnapshotStore, SnapshotIngestor
+from .metrics import metrics, set_payload_sample_rate, log_payload
+from .steam_api import AppDetailsResolver, parse_price_overview, fetch_price_overviews, appdetails_cache_key, BASIC_FILTERS, PRICE_FILTERS
 
-ITAD_API_BASE = "https://api.isthereanydeal.com"
 STEAMWEBAPI_PRICES = "https://api.steamwebapi.com/steam/prices"
 
+
+def fmt_price(price, currency):
+    return f"￥{price:.2f}" if currency == "CNY" else f"{currency} {price:.2f}"
+
+
 @register("astrbot_plugins_steam_shop_price", "Maoer", "查询Steam游戏价格及史低", "1.0.0", "https://github.com/Maoer233/astrbot_plugins_steam_shop_price")
 class SteamPricePlugin(Star):
     def __init__(self, context: Context, config=None):
@@ -20,113 +44,426 @@ class SteamPricePlugin(Star):
         self.itad_api_key = self.config.get("ITAD_API_KEY", "")
         self.steamwebapi_key = self.config.get("STEAMWEBAPI_KEY", "")
         self.compare_region = self.config.get("STEAM_COMPARE_REGION", "UA")
+        # 对比区列表：优先使用 STEAM_COMPARE_REGIONS，未配置时沿用单个 STEAM_COMPARE_REGION
+        self.compare_regions = self._parse_regions(self.config.get("STEAM_COMPARE_REGIONS")) \
+            or self._parse_regions(self.compare_region)
+        # 插件生命周期内共享的连接池，按主机复用长连接
+        self.http = HttpClientManager.from_config(self.config)
+        # 上游响应缓存：内存LRU + 可选SQLite持久化
+        self.cache_enabled = self.config.get("CACHE_ENABLED", True)
+        sqlite_path = self.config.get("CACHE_SQLITE_PATH", "")
+        self.cache = ResponseCache(
+            max_entries=int(self.config.get("CACHE_MAX_ENTRIES", 2048) or 0),
+            max_bytes=int(self.config.get("CACHE_MAX_BYTES", 16 * 1024 * 1024) or 0),
+            sqlite_path=plugin_data_path(sqlite_path) if self.cache_enabled and sqlite_path else None,
+            stale_while_revalidate=float(self.config.get("CACHE_STALE_WHILE_REVALIDATE", 0) or 0),
+        )
+        # 汇率：优先使用汇率接口，其次插件数据目录下的汇率文件，都没有时使用内置汇率
+        self.rates = RateService(self._rate_provider(), ttl=float(self.config.get("EXCHANGE_RATE_TTL_HOURS", 12) or 12) * 3600)
+        # 单次 /史低 查询的整体截止时间（秒），0 表示一直等到所有请求完成
+        self.query_deadline = float(self.config.get("QUERY_DEADLINE", 8) or 0)
+        self.cache_ttls = {
+            kind: int(self.config.get(f"CACHE_TTL_{kind.upper()}", ttl))
+            for kind, ttl in DEFAULT_TTLS.items()
+        }
+
+        # 搜索结果的并发处理：同时处理的候选项数和单项超时
+        self.search_concurrency = int(self.config.get("SEARCH_CONCURRENCY", 4) or 4)
+        self.search_item_timeout = float(self.config.get("SEARCH_ITEM_TIMEOUT", 6) or 6)
+        # 批量查询单次最多处理的游戏数
+        self.batch_max_games = int(self.config.get("BATCH_MAX_GAMES", 10) or 10)
+        self.search_contact_sheet = bool(self.config.get("SEARCH_CONTACT_SHEET", False))
+        # 封面缩略图：工作线程/进程中处理，按字节数上限缓存
+        self.images = ImagePipeline(
+            self.http,
+            max_bytes=int(self.config.get("IMAGE_CACHE_MAX_BYTES", 8 * 1024 * 1024) or 0),
+            workers=int(self.config.get("IMAGE_WORKERS", 2) or 2),
+            use_process=bool(self.config.get("IMAGE_USE_PROCESS_POOL", False)),
+            disk_dir=plugin_data_path("thumbs") if self.config.get("IMAGE_DISK_CACHE", True) else None,
+            disk_max_bytes=int(self.config.get("IMAGE_DISK_CACHE_MAX_BYTES", 64 * 1024 * 1024) or 0),
+        )
+        # 价格回复的封面地址（capsule/header）按 appid 持久化，新地址用 HEAD 探测，可选直接发送已下载的图片
+        self.assets = AssetResolver(
+            self.http, plugin_data_path("assets.db"),
+            ttl=float(self.config.get("ASSET_CACHE_TTL_HOURS", 168) or 168) * 3600,
+            inline_bytes=bool(self.config.get("ASSET_INLINE_BYTES", False)),
+        )
+        # 游戏名翻译：持久化翻译缓存 + 可选微批处理
+        self.translator = GameNameTranslator(
+            self.context,
+            store_path=plugin_data_path("translations.json"),
+            batch_window=float(self.config.get("TRANSLATE_BATCH_WINDOW", 0) or 0),
+            max_batch=int(self.config.get("TRANSLATE_MAX_BATCH", 8) or 8),
+        )
+
+        # 本地 Steam 应用名索引，后台加载，加载完成前照常走ITAD搜索
+        self.app_index = SteamAppIndex(plugin_data_path(self.config.get("APP_INDEX_PATH", "") or "steam_applist.json"))
+        # 中英文别名索引（官方中文名/英文名 → appid）
+        self.alias_index = AliasIndex(plugin_data_path("aliases.json"))
+        # 并发的相同查询（同一 appid / 同一游戏名）合并为一次计算
+        self.singleflight = SingleFlight()
+        # 查询准入：限制同时执行的查询数，超出的按会话轮流排队，队列满时直接回复繁忙
+        self.scheduler = AdmissionScheduler(
+            max_concurrent=int(self.config.get("QUERY_MAX_CONCURRENT", 6) or 0),
+            max_queue=int(self.config.get("QUERY_MAX_QUEUE", 30) or 0),
+            max_queue_per_group=int(self.config.get("QUERY_MAX_QUEUE_PER_GROUP", 5) or 0),
+        )
+        self._tasks = set()
+        self._background(self._app_index_loop())
+        self._background(self._rates_loop())
+        # 降价订阅：订阅和价格快照持久化到SQLite，后台按周期分批轮询
+        self.watch_max_per_group = int(self.config.get("WATCH_MAX_PER_GROUP", 50) or 0)
+        self.watch_store = WatchStore(plugin_data_path("watches.db"))
+        self.watcher = PriceWatcher(
+            self.watch_store, self.http, self.itad_api_key,
+            interval=float(self.config.get("WATCH_INTERVAL_MINUTES", 60) or 60) * 60,
+            batch_size=int(self.config.get("WATCH_BATCH_SIZE", 200) or 200),
+            notify=self._send_watch_notice,
+        )
+        if self.config.get("WATCH_ENABLED", True) and self.itad_api_key:
+            self._background(self.watcher.run())
+        # 热门游戏价格快照：后台定期批量刷新，/史低 命中新鲜快照时不请求上游
+        self.price_store = None
+        if self.config.get("PRICE_SNAPSHOT_ENABLED", False) and self.itad_api_key:
+            self.snapshot_max_age = float(self.config.get("PRICE_SNAPSHOT_MAX_AGE_MINUTES", 120) or 0) * 60
+            self.price_store = PriceSnapshotStore(plugin_data_path("prices.db"))
+            self.ingestor = SnapshotIngestor(
+                self.price_store, self.http, self.itad_api_key, self.compare_regions,
+                cache=self.cache, lookup_ttl=self._ttl("lookup"), on_details=self._record_names, assets=self.assets,
+            )
+            self._background(self._snapshot_loop())
+        # 价格走势图：历史数据按 gid 增量拉取并持久化，PNG 按天缓存
+        self.history = None
+        if self.config.get("PRICE_CHART_ENABLED", False) and self.itad_api_key:
+            self.history = PriceHistory(
+                HistoryStore(plugin_data_path("history.db")), self.http, self.itad_api_key, plugin_data_path("charts"),
+                days=int(self.config.get("PRICE_CHART_DAYS", 365) or 365),
+                refresh_interval=float(self.config.get("PRICE_HISTORY_REFRESH_HOURS", 12) or 12) * 3600,
+            )
+        # 启动预热：按配置列表和历史查询次数，后台预取常查游戏的数据到缓存
+        self.query_stats = QueryStats(plugin_data_path("query_stats.json"))
+        if self.config.get("WARMUP_ENABLED", False) and self.itad_api_key:
+            self._background(self._warmup())
+        # 运行指标：/史低状态 查看，配置了 METRICS_PROMETHEUS_FILE 时定期导出 Prometheus 文本
+        set_payload_sample_rate(self.config.get("DEBUG_PAYLOAD_SAMPLE_RATE", 0))
+        self._register_metrics()
+        metrics_file = self.config.get("METRICS_PROMETHEUS_FILE", "")
+        if metrics_file:
+            self._background(self._metrics_dump_loop(
+                plugin_data_path(metrics_file), max(5.0, float(self.config.get("METRICS_DUMP_INTERVAL", 60) or 60))
+            ))
+
+    @staticmethod
+    def _parse_regions(value):
+        '''解析区服配置（列表或逗号分隔字符串），去重并去掉 NONE 和国区'''
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = re.split(r"[,，\s]+", value)
+        regions = []
+        for r in value:
+            r = str(r).strip().upper()
+            if r and r not in ("NONE", "CN") and r not in regions:
+                regions.append(r)
+        return regions
+
+    def _record_names(self, appid, lang, data):
+        '''appdetails 回调：把官方名称记录到别名索引'''
+        if data.get("name"):
+            self.alias_index.record(appid, data["name"], lang)
+
+    def _background(self, coro):
+        '''启动后台任务（或接管已启动的任务），插件卸载时统一取消'''
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _rate_provider(self):
+        '''按配置选择汇率来源，未配置时返回 None（使用内置汇率）'''
+        url = self.config.get("EXCHANGE_RATE_URL", "")
+        if url:
+            return HttpRateProvider(self.http, url)
+        path = plugin_data_path(self.config.get("EXCHANGE_RATE_FILE", "") or "exchange_rates.json")
+        if os.path.exists(path):
+            return JsonFileRateProvider(path)
+        return None
+
+    async def _rates_loop(self):
+        '''启动时加载汇率，之后按 TTL 定期刷新'''
+        while True:
+            await self.rates.refresh(force=True)
+            await asyncio.sleep(self.rates.ttl)
+
+    async def _app_index_loop(self):
+        '''加载本地应用索引，并按配置定期增量刷新'''
+        await self.app_index.load()
+        hours = float(self.config.get("APP_INDEX_REFRESH_HOURS", 0) or 0)
+        if hours <= 0 or not self.steamwebapi_key:
+            return
+        while True:
+            try:
+                await self.app_index.refresh(self.http, self.steamwebapi_key)
+            except Exception as e:
+                logger.error(f"[应用索引] 增量刷新失败: {e}")
+            await asyncio.sleep(hours * 3600)
+
+    async def _snapshot_loop(self):
+        '''按周期刷新热门游戏的价格快照，并清理超过保留期的历史快照'''
+        interval = max(1.0, float(self.config.get("PRICE_SNAPSHOT_INTERVAL_MINUTES", 30) or 30)) * 60
+        keep_days = float(self.config.get("PRICE_SNAPSHOT_KEEP_DAYS", 30) or 30)
+        appids = self._parse_appids(self.config.get("PRICE_SNAPSHOT_APPIDS"))
+        if not appids:
+            logger.info("[价格快照] 未配置热门游戏列表，跳过")
+            return
+        while True:
+            try:
+                await self.ingestor.ingest(appids)
+                await asyncio.to_thread(self.price_store.prune, keep_days * 86400)
+            except Exception as e:
+                logger.error(f"[价格快照] 刷新失败: {e}\n{traceback.format_exc()}")
+            await asyncio.sleep(interval)
+
+    async def _warmup(self):
+        '''插件加载后延迟一段时间再预热，不影响启动和第一批查询'''
+        if not self.cache_enabled:
+            logger.info("[预热] 缓存未开启，跳过")
+            return
+        await asyncio.sleep(float(self.config.get("WARMUP_DELAY_SECONDS", 30) or 0))
+        appids = self._parse_appids(self.config.get("WARMUP_APPIDS"))
+        appids += self.query_stats.top(int(self.config.get("WARMUP_TOP_QUERIED", 50) or 0))
+        if not appids:
+            logger.info("[预热] 没有需要预热的游戏")
+            return
+        warmer = CacheWarmer(
+            self.http, self.itad_api_key, self.cache, {kind: self._ttl(kind) for kind in DEFAULT_TTLS},
+            self.compare_regions, assets=self.assets, on_details=self._record_names,
+        )
+        await warmer.warm(appids)
+
+    def _register_metrics(self):
+        '''注册导出时才计算的指标：各级缓存命中率、请求合并次数、上游熔断与排队状态'''
+        def cache_hit_ratio():
+            translator_total = self.translator.cache_hits + self.translator.llm_calls
+            image_total = self.images.hits + self.images.misses
+            asset_total = self.assets.hits + self.assets.probes
+            return [
+                ({"cache": "response"}, self.cache.stats()["hit_ratio"]),
+                ({"cache": "thumbnail"}, round(self.images.hits / image_total, 4) if image_total else 0.0),
+                ({"cache": "translation"}, round(self.translator.cache_hits / translator_total, 4) if translator_total else 0.0),
+                ({"cache": "asset"}, round(self.assets.hits / asset_total, 4) if asset_total else 0.0),
+            ]
+        metrics.register_collector("cache_hit_ratio", cache_hit_ratio)
+        metrics.register_collector("singleflight_shared", lambda: [({}, self.singleflight.shared)])
+        metrics.register_collector("queries_running", lambda: [({}, self.scheduler.running)])
+        metrics.register_collector("queries_queued", lambda: [({}, self.scheduler.queued)])
+        metrics.register_collector("upstream_circuit_open", lambda: [
+            ({"upstream": name}, int(up.breaker.state != "closed")) for name, up in self.http.upstreams.items()
+        ])
+        metrics.register_collector("upstream_queued", lambda: [
+            ({"upstream": name}, up.bucket.queued) for name, up in self.http.upstreams.items()
+        ])
+        metrics.register_collector("upstream_hedged", lambda: [
+            ({"upstream": name}, up.hedged) for name, up in self.http.upstreams.items()
+        ])
+
+    async def _metrics_dump_loop(self, path, interval):
+        '''定期把指标写成 Prometheus 文本文件（先写临时文件再替换，读取方不会看到半个文件）'''
+        def write(text):
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        while True:
+            try:
+                await asyncio.to_thread(write, metrics.render_prometheus())
+            except Exception as e:
+                logger.error(f"[指标] 导出失败: {e}")
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def _parse_appids(value):
+        '''解析 appid 列表配置（列表或逗号分隔字符串，可以是商店链接）'''
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = re.split(r"[,，\s]+", value)
+        appids = []
+        for v in value:
+            m = re.search(r"(\d+)", str(v))
+            if m and m.group(1) not in appids:
+                appids.append(m.group(1))
+        return appids
+
+    async def terminate(self):
+        '''插件卸载/停用时取消后台任务并关闭连接池'''
+        for task in list(self._tasks):
+            task.cancel()
+        await self.http.aclose()
+        self.cache.close()
+        self.images.close()
+        self.watch_store.close()
+        self.assets.close()
+        self.query_stats.save()
+        self.alias_index.save()
+        self.translator.close()
+        if self.history is not None:
+            self.history.store.close()
+        if self.price_store is not None:
+            self.price_store.close()
+
+    def _ttl(self, kind):
+        '''取某类接口的缓存时间，关闭缓存时为0（不写入）'''
+        return self.cache_ttls.get(kind, 0) if self.cache_enabled else 0
+
+    async def _cached_json(self, key, kind, url, params=None, json=None, **kwargs):
+        '''带缓存的 GET/POST（传 json 时为 POST），返回解析后的 JSON'''
+        async def fetch():
+            if json is None:
+                resp = await self.http.get(url, params=params, **kwargs)
+            else:
+                resp = await self.http.post(url, params=params, json=json, **kwargs)
+            resp.raise_for_status()
+            return resp.json()
+        return await self.cache.get_or_fetch(key, self._ttl(kind), fetch)
+
+    async def _admitted(self, event, gen):
+        '''经准入调度后再执行查询；排队已满时直接回复繁忙，不执行查询'''
+        try:
+            await self.scheduler.acquire(event.unified_msg_origin)
+        except SchedulerBusy:
+            await gen.aclose()
+            yield event.plain_result("查询的人太多啦，主人过一会再试喵~")
+            return
+        try:
+            async for result in gen:
+                yield result
+        finally:
+            self.scheduler.release()
 
     @filter.command("史低")
     async def shidi(self, event: AstrMessageEvent, url: str, last_gid=None):
         '''查询Steam游戏价格及史低信息，格式：/史低 <steam商店链接/游戏名>'''
+        async for result in self._admitted(event, self._shidi(event)):
+            yield result
+
+    async def _shidi(self, event):
         # 新增：自动识别链接或游戏名
         # 修复参数丢失问题，直接用 event.message_str 去除指令前缀，保留全部参数内容
         raw_msg = event.message_str
         prefix_pattern = r"^[\.／/]*(史低|价格)\s*"
         param_str = re.sub(prefix_pattern, "", raw_msg, count=1, flags=re.IGNORECASE)
         # param_str 现在包含所有参数（包括空格和数字）
+        # 多个商店链接，或多个游戏名（中文逗号、顿号或换行分隔）时进入批量查询；
+        # 英文逗号等不拆分，避免把 "Papers, Please" 这类游戏名拆开
+        batch_items = self._split_batch(param_str)
+        if len(batch_items) > 1:
+            yield event.plain_result(f"正在为主人批量查询{len(batch_items)}个游戏，主人等一小会喵...")
+            with metrics.time("query_seconds", kind="batch"):
+                replies = await self._batch_replies(batch_items)
+            for reply in replies:
+                yield self._to_result(event, reply)
+            return
         if not param_str.lower().startswith("http"):
+            # 中英文别名索引命中时直接得到appid，跳过大模型翻译和ITAD搜索
+            alias_appid = self.alias_index.resolve(param_str)
+            if alias_appid:
+                names = self.alias_index.names(alias_appid)
+                logger.info(f"[别名索引] 命中: {param_str} -> {alias_appid}")
+                yield event.plain_result(f"正在为主人搜索《{names.get('zh') or names.get('en') or param_str}》，主人等一小会喵...")
+                async for result in self._query_by_url(event, f"https://store.steampowered.com/app/{alias_appid}"):
+                    yield result
+                return
             game_en_name = param_str
             if not re.search(r'[\u4e00-\u9fff]', game_en_name):
                 logger.info(f"[史低] 检测到无中文，直接使用原始输入: {game_en_name}")
                 yield event.plain_result(f"正在为主人搜索《{game_en_name}》，主人等一小会喵...")
             else:
                 try:
-                    prompt = f"请将以下游戏名翻译为steam页面的英文官方名称，仅输出英文名，不要输出其他内容：{param_str}"
-                    llm_response = await self.context.get_using_provider().text_chat(
-                        prompt=prompt,
-                        contexts=[],
-                        image_urls=[],
-                        func_tool=None,
-                        system_prompt=""
-                    )
-                    game_en_name = llm_response.completion_text.strip()
+                    game_en_name = await self.translator.translate(param_str)
                     logger.info(f"[LLM][翻译游戏名] 输出: {game_en_name}")
                     yield event.plain_result(f"正在为主人搜索《{game_en_name}》，主人等一小会喵...")
                 except Exception as e:
                     logger.error(f"LLM翻译游戏名失败: {e}")
                     yield event.plain_result("游戏名翻译失败，请重试或直接输入Steam商店链接。")
                     return
+            # 优先用本地应用索引解析appid，命中时不再请求ITAD搜索
+            local_appid = self.app_index.resolve(game_en_name) if self.app_index.ready else None
+            if local_appid:
+                logger.info(f"[应用索引] 命中: {game_en_name} -> {local_appid}")
+                self.translator.report(param_str, True)
+                candidate_names = [n for a, n, _ in self.app_index.search(game_en_name, limit=6) if a != local_appid][:5]
+                yield event.plain_result(
+                    "为主人查询史低信息喵~稍等稍等...\n"
+                    + ("猜你想搜：\n" + "\n".join(candidate_names) if candidate_names else "")
+                )
+                async for result in self._query_by_url(event, f"https://store.steampowered.com/app/{local_appid}"):
+                    yield result
+                return
             # ...后续逻辑保持不变...
             try:
-                async with httpx.AsyncClient(timeout=20) as client:
-                    resp = await client.get(
-                        f"{ITAD_API_BASE}/games/search/v1",
-                        params={"key": self.itad_api_key, "title": game_en_name, "limit": 5}
+                data = await self._itad_search(game_en_name, 5)
+                logger.info(f"[ITAD][search] 成功获取候选项，共{len(data) if isinstance(data, list) else 0}个")
+                if not data or not isinstance(data, list):
+                    self.translator.report(param_str, False)
+                    # 别名索引的部分匹配只作为候选提示，不自动选用
+                    suggestions = [name for _, name, _ in self.alias_index.search(param_str) if name]
+                    yield event.plain_result(
+                        "未找到该游戏，请检查名称或输入Steam商店链接。"
+                        + ("\n猜你想搜：\n" + "\n".join(suggestions) if suggestions else "")
                     )
-                    data = resp.json()
-                    logger.info(f"[ITAD][search] 成功获取候选项，共{len(data) if isinstance(data, list) else 0}个")
-                    if not data or not isinstance(data, list):
-                        yield event.plain_result("未找到该游戏，请检查名称或输入Steam商店链接。")
-                        return
-                    def norm(s):
-                        return s.lower().replace(" ", "") if s else ""
-                    norm_en = norm(game_en_name)
-                    candidates = [g for g in data if g.get("type") == "game"]
-                    if not candidates:
-                        candidates = data
-                    best = None
+                    return
+                def norm(s):
+                    return s.lower().replace(" ", "") if s else ""
+                norm_en = norm(game_en_name)
+                candidates = [g for g in data if g.get("type") == "game"]
+                if not candidates:
+                    candidates = data
+                best = None
+                for g in candidates:
+                    title = g.get("title", "")
+                    if norm(title) == norm_en:
+                        best = g
+                        break
+                if not best:
                     for g in candidates:
                         title = g.get("title", "")
-                        if norm(title) == norm_en:
+                        if norm_en in norm(title) or norm(title) in norm_en:
                             best = g
                             break
-                    if not best:
-                        for g in candidates:
-                            title = g.get("title", "")
-                            if norm_en in norm(title) or norm(title) in norm_en:
-                                best = g
-                                break
-                    # 总是展示“猜你想搜”候选项（不论是否全字匹配）
-                    candidate_names = [g.get("title", "未知") for g in candidates[1:6]]
-                    yield event.plain_result(
-                        "为主人查询史低信息喵~稍等稍等...\n"
-                        + (f"猜你想搜：\n" + "\n".join(candidate_names) if candidate_names else "")
-                    )
-                    # 如果没有完全匹配，依然继续查第一个候选项（即 best = candidates[0]），否则流程会中断
-                    if not best:
-                        if candidates:
-                            best = candidates[0]
-                        else:
-                            # 没有候选项，直接返回
-                            return
-                    game = best
-                    steam_url = ""
-                    for url_item in game.get("urls", []):
-                        if "store.steampowered.com/app" in url_item:
-                            steam_url = url_item
-                            break
-                    # 这里加超时保护，防止ITAD接口长时间无响应导致流程卡死
-                    try:
-                        if not steam_url and game.get("id"):
-                            async with httpx.AsyncClient(timeout=20) as client2:
-                                resp2 = await asyncio.wait_for(
-                                    client2.get(
-                                        f"{ITAD_API_BASE}/games/info/v2",
-                                        params={"key": self.itad_api_key, "id": game["id"]}
-                                    ),
-                                    timeout=12
-                                )
-                                info2 = resp2.json()
-                                appid = info2.get("appid")
-                                if appid:
-                                    steam_url = f"https://store.steampowered.com/app/{appid}"
-                    except Exception as e:
-                        logger.error(f"通过ITAD gid查appid失败: {e}\n{traceback.format_exc()}")
-                    # 修正：查到 steam_url 后只查一次，不递归自身，避免无限循环
-                    if steam_url:
-                        # 直接进入链接查询流程
-                        async for result in self._query_by_url(event, steam_url):
-                            yield result
-                        return
+                # 总是展示“猜你想搜”候选项（不论是否全字匹配）
+                candidate_names = [g.get("title", "未知") for g in candidates[1:6]]
+                yield event.plain_result(
+                    "为主人查询史低信息喵~稍等稍等...\n"
+                    + ("猜你想搜：\n" + "\n".join(candidate_names) if candidate_names else "")
+                )
+                # 如果没有完全匹配，依然继续查第一个候选项（即 best = candidates[0]），否则流程会中断
+                if not best:
+                    if candidates:
+                        best = candidates[0]
                     else:
-                        yield event.plain_result("未找到该游戏的Steam商店链接，或链接格式异常。请尝试更换游戏名称或直接输入Steam商店链接。")
+                        # 没有候选项，直接返回
                         return
+                game = best
+                steam_url = ""
+                # 这里加超时保护，防止ITAD接口长时间无响应导致流程卡死
+                try:
+                    appid = await asyncio.wait_for(self._itad_game_appid(game), timeout=12)
+                    if appid:
+                        steam_url = f"https://store.steampowered.com/app/{appid}"
+                except Exception as e:
+                    logger.error(f"通过ITAD gid查appid失败: {e}\n{traceback.format_exc()}")
+                # 记录翻译是否在ITAD上查到（非中文输入没有翻译记录，会被忽略）
+                self.translator.report(param_str, bool(steam_url))
+                # 修正：查到 steam_url 后只查一次，不递归自身，避免无限循环
+                if steam_url:
+                    # 直接进入链接查询流程
+                    async for result in self._query_by_url(event, steam_url):
+                        yield result
+                    return
+                else:
+                    yield event.plain_result("未找到该游戏的Steam商店链接，或链接格式异常。请尝试更换游戏名称或直接输入Steam商店链接。")
+                    return
             except Exception as e:
                 logger.error(f"ITAD搜索失败: {e}\n{traceback.format_exc()}")
                 yield event.plain_result("游戏搜索失败，请重试或直接输入Steam商店链接。")
@@ -145,172 +482,236 @@ class SteamPricePlugin(Star):
             yield event.plain_result("请提供正确的Steam商店链接！")
             return
         appid = m.group(1)
-        # ...后续逻辑保持不变...
+        self.query_stats.record(appid)
+        # 热门游戏有新鲜的本地快照时直接回复，不请求上游
+        started = time.perf_counter()
+        replies = await self._snapshot_replies(appid)
+        if replies:
+            metrics.observe("query_seconds", time.perf_counter() - started, kind="snapshot")
+            for reply in replies:
+                yield self._to_result(event, reply)
+            return
+        # 同一 appid 的并发查询只执行一次，所有请求者共享结果
+        with metrics.time("query_seconds", kind="price"):
+            replies = await self.singleflight.do(("appid", appid), lambda: self._price_replies(appid))
+        for reply in replies:
+            yield self._to_result(event, reply)
+
+    @staticmethod
+    def _to_result(event, reply):
+        '''把共享的回复内容（文本或消息段列表）转换为当前事件的消息结果'''
+        if isinstance(reply, str):
+            return event.plain_result(reply)
+        return event.chain_result(list(reply))
+
+    async def _snapshot_replies(self, appid):
+        '''用本地价格快照组装回复；未开启、没有快照或快照过旧时返回 None'''
+        if self.price_store is None:
+            return None
+        try:
+            snap = await asyncio.to_thread(self.price_store.latest, appid, ["CN", *self.compare_regions])
+        except Exception as e:
+            logger.error(f"[价格快照] 读取失败: {e}")
+            return None
+        if not snap:
+            return None
+        age = time.time() - snap["ts"]
+        if self.snapshot_max_age and age > self.snapshot_max_age:
+            return None
+        cn = snap["regions"]["CN"]
+        meta = snap["meta"]
+        region_prices = [
+            (r, snap["regions"][r]["price"], snap["regions"][r]["currency"], snap["regions"][r]["discount"])
+            for r in self.compare_regions
+        ]
+        logger.info(f"[价格快照] 命中: {appid}（{age / 60:.0f}分钟前）")
+        # 快照回复不请求上游，走势图只用当天已绘制好的
+        chart = None
+        if self.history is not None and meta["gid"]:
+            chart = await asyncio.to_thread(self.history.cached_chart, meta["gid"], "CN")
+        return self._render_price(
+            appid, meta["name"], meta["image"], meta["review"],
+            cn["price"], cn["currency"], cn["discount"], cn["lowest"], cn["regular"], region_prices,
+            note=f"（价格数据更新于{round(age / 60)}分钟前）" if age >= 60 else "（价格数据刚刚更新）",
+            chart=chart
+        )
+
+    async def _price_replies(self, appid):
+        '''查询单个游戏的价格与史低，返回回复列表（与具体消息事件无关，可被并发请求共享）'''
         # --- 并发请求国区Steam信息、ITAD信息、对比区Steam价格 ---
+        # 单次查询内共享 appdetails 结果，同一 (appid, 区服, 语言) 只请求一次
+        details = AppDetailsResolver(self.http, self.cache, self._ttl("appdetails"), on_details=self._record_names)
+        # 国区中文名、头图、当前价和折扣都来自这一次请求
+        cn_details = details.get(appid, "cn", "schinese", BASIC_FILTERS)
+
         async def fetch_steam_cn():
             try:
-                async with httpx.AsyncClient(timeout=20) as client:
-                    resp = await client.get(
-                        f"https://store.steampowered.com/api/appdetails?appids={appid}&l=schinese"
-                    )
-                    data = resp.json()
-                    app_data = data.get(appid, {}).get("data", {})
-                    steam_name = app_data.get("name")
-                    header_img = app_data.get("header_image")
-                    steam_image = None
-                    if header_img:
-                        small_img = header_img.replace("_header.jpg", "_capsule_184x69.jpg")
-                        img_resp = await client.get(small_img)
-                        if img_resp.status_code == 200:
-                            steam_image = small_img
-                        else:
-                            steam_image = header_img
-                    return steam_name, steam_image
+                app_data = await cn_details or {}
+                steam_name = app_data.get("name")
+                # 优先用小尺寸 capsule，已检查过的 appid 不再请求图片
+                steam_image = await self.assets.resolve(appid, app_data.get("header_image"))
+                return steam_name, steam_image, app_data
             except Exception as e:
                 logger.error(f"获取Steam国区游戏信息失败: {e}\n{traceback.format_exc()}")
-                return None, None
+                return None, None, None
 
         async def fetch_itad_lookup():
             try:
-                async with httpx.AsyncClient(timeout=20) as client:
-                    resp = await client.get(
-                        f"{ITAD_API_BASE}/games/lookup/v1",
-                        params={"key": self.itad_api_key, "appid": appid}
-                    )
-                    data = resp.json()
-                    gid = data["game"]["id"] if data.get("found") else None
-                    logger.info(f"[ITAD][lookup] 成功获取 ITAD gid: {gid}")
-                    if not data.get("found"):
-                        return None
-                    return gid
+                data = await self._cached_json(
+                    f"itad:lookup:{appid}", "lookup",
+                    f"{ITAD_API_BASE}/games/lookup/v1",
+                    params={"key": self.itad_api_key, "appid": appid}
+                )
+                gid = data["game"]["id"] if data.get("found") else None
+                logger.info(f"[ITAD][lookup] 成功获取 ITAD gid: {gid}")
+                if not data.get("found"):
+                    return None
+                return gid
             except Exception as e:
                 logger.error(f"获取ITAD gid失败: {e}\n{traceback.format_exc()}")
                 return None
 
-        async def fetch_compare_price():
-            if self.compare_region.upper() == "NONE":
-                return None, None, 0
-            region = self.compare_region.upper()
-            try:
-                async with httpx.AsyncClient(timeout=20) as client:
-                    resp = await client.get(
-                        "https://store.steampowered.com/api/appdetails",
-                        params={"appids": appid, "cc": region.lower(), "l": "en"}
-                    )
-                    data = resp.json()
-                    app_data = data.get(appid, {})
-                    if app_data.get("success") and app_data.get("data"):
-                        price_overview = app_data["data"].get("price_overview")
-                        if price_overview and "final" in price_overview and "currency" in price_overview:
-                            price = price_overview["final"] / 100
-                            currency = price_overview["currency"]
-                            logger.info(f"[STEAM][{region}] 成功获取价格: {price} {currency}")
-                            return price, currency, price_overview.get("discount_percent", 0)
-                    logger.info(f"[STEAM][{region}] 未获取到价格信息")
-                    return None, None, 0
-            except Exception as e:
-                logger.error(f"获取{region}区实时价格失败: {e}\n{traceback.format_exc()}")
-                return None, None, 0
-
-        # 并发执行
-        results = await asyncio.gather(
-            fetch_steam_cn(),
-            fetch_itad_lookup(),
-            fetch_compare_price()
-        )
-        steam_name, steam_image = results[0]
-        gid = results[1]
-        compare_price, compare_currency, compare_discount_percent = results[2]
-
-        # steam_name, steam_image = ...; gid = ...; compare_price, compare_currency, compare_discount_percent = ...
-        # 兼容 yield event.plain_result
-        if gid is None:
-            yield event.plain_result("未找到该游戏的 isthereanydeal id \n（试一下换个名称搜索一下）。")
-            return
+        async def fetch_region_price(region):
+            # 对比区价格只需 price_overview，各区并发请求，结果按区服分别缓存
+            app_data = await details.get(appid, region, "english", PRICE_FILTERS)
+            price, currency, discount_percent = parse_price_overview(app_data)
+            if price is not None:
+                logger.info(f"[STEAM][{region}] 成功获取价格: {price} {currency}")
+            else:
+                logger.info(f"[STEAM][{region}] 未获取到价格信息")
+            return price, currency, discount_percent
 
-        # ITAD游戏基本信息
-        try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                resp = await client.get(
+        async def fetch_itad_info(gid):
+            # ITAD游戏基本信息
+            if gid is None:
+                return None
+            try:
+                info = await self._cached_json(
+                    f"itad:info:{gid}", "info",
                     f"{ITAD_API_BASE}/games/info/v2",
                     params={"key": self.itad_api_key, "id": gid}
                 )
-                info = resp.json()
                 logger.info(f"[ITAD][info] 成功获取游戏信息: {info.get('title', '未知游戏')}")
-                name = info.get("title", "未知游戏")
-                tags = ", ".join(info.get("tags", []))
-                release = info.get("releaseDate", "")
-                devs = ", ".join([d["name"] for d in info.get("developers", [])]) if info.get("developers") else ""
-                itad_url = info.get("urls", {}).get("game", "")
-                steam_review = ""
-                for r in info.get("reviews", []):
-                    if r.get("source") == "Steam":
-                        steam_review = f"{r.get('score', '')}%"
-                        break
-        except Exception as e:
-            logger.error(f"获取ITAD游戏信息失败: {e}\n{traceback.format_exc()}")
-            name = tags = release = devs = itad_url = steam_review = ""
+                self.alias_index.record(appid, info.get("title"), "en")
+                return info
+            except Exception as e:
+                logger.error(f"获取ITAD游戏信息失败: {e}\n{traceback.format_exc()}")
+                return None
 
-        # 国区价格和史低（ITAD）
-        try:
-            cn_price, cn_lowest, cn_currency, regular = await self._get_price_and_lowest(gid, "CN")
-        except Exception as e:
-            logger.error(f"获取ITAD价格失败: {e}\n{traceback.format_exc()}")
-            cn_price = cn_lowest = cn_currency = regular = None
+        async def fetch_cn_price(gid):
+            # 国区价格和史低（ITAD）
+            if gid is None:
+                return None, None, None, None
+            try:
+                return await self._get_price_and_lowest(gid, "CN")
+            except Exception as e:
+                logger.error(f"获取ITAD价格失败: {e}\n{traceback.format_exc()}")
+                return None, None, None, None
 
-        # 如果ITAD没有国区价格，则用Steam官方API补充当前国区价格
-        if cn_price is None:
+        async def fetch_chart(gid):
+            # 国区价格走势图（可选），失败时不影响价格回复
+            if gid is None:
+                return None
             try:
-                async with httpx.AsyncClient(timeout=20) as client:
-                    resp = await client.get(
-                        "https://store.steampowered.com/api/appdetails",
-                        params={"appids": appid, "cc": "cn", "l": "zh"}
-                    )
-                    data = resp.json()
-                    app_data = data.get(appid, {})
-                    if app_data.get("success") and app_data.get("data"):
-                        price_overview = app_data["data"].get("price_overview")
-                        if price_overview and "final" in price_overview and "currency" in price_overview:
-                            cn_price = price_overview["final"] / 100
-                            cn_currency = price_overview["currency"]
-                        # 只补充当前价，不补充史低，史低始终以ITAD为准
+                return await self.history.chart(gid, "CN")
             except Exception as e:
-                logger.error(f"补充获取Steam国区实时价格失败: {e}\n{traceback.format_exc()}")
+                logger.error(f"生成价格走势图失败: {e}\n{traceback.format_exc()}")
+                return None
 
-        # 获取乌克兰区实时价格（Steam官方API）
-        ua_price = ua_currency = None
-        try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                resp = await client.get(
-                    "https://store.steampowered.com/api/appdetails",
-                    params={"appids": appid, "cc": "ua", "l": "en"}
-                )
-                data = resp.json()
-                app_data = data.get(appid, {})
-                if app_data.get("success") and app_data.get("data"):
-                    price_overview = app_data["data"].get("price_overview")
-                    if price_overview and "final" in price_overview and "currency" in price_overview:
-                        ua_price = price_overview["final"] / 100
-                        ua_currency = price_overview["currency"]
-                        logger.info(f"[STEAM][UA] 成功获取价格: {ua_price} {ua_currency}")
-                    else:
-                        logger.info(f"[STEAM][UA] 未获取到价格信息")
-                        ua_price = ua_currency = None
-                else:
-                    logger.info(f"[STEAM][UA] 未获取到价格信息")
-                    ua_price = ua_currency = None
-        except Exception as e:
-            logger.error(f"获取乌克兰区实时价格失败: {e}\n{traceback.format_exc()}")
-            ua_price = ua_currency = None
+        # 截止时间到达时各阶段的替代结果：取缓存中的数据（包括已过期的），没有时为空
+        stale = self.cache.get_stale
+
+        def stale_steam_cn():
+            app_data = stale(appdetails_cache_key(appid, "cn", "schinese", BASIC_FILTERS)) or {}
+            return app_data.get("name"), app_data.get("header_image"), app_data
+
+        def stale_lookup():
+            data = stale(f"itad:lookup:{appid}") or {}
+            return data["game"]["id"] if data.get("found") else None
+
+        def stale_region_price(region):
+            return parse_price_overview(stale(appdetails_cache_key(appid, region, "english", PRICE_FILTERS)))
+
+        def stale_cn_price(gid):
+            p = parse_price_entry(stale(f"itad:price:CN:{gid}")) if gid else {}
+            if p.get("price") is None:
+                return None, None, None, None
+            return p["price"], p["lowest"], p["currency"], p["regular"]
+
+        # 按依赖关系调度：每个请求在所需的 appid/gid 就绪后立即发出
+        graph = TaskGraph(f"史低 {appid}")
+        graph.add("steam_cn", fetch_steam_cn, fallback=stale_steam_cn)
+        graph.add("lookup", fetch_itad_lookup, fallback=stale_lookup)
+        for region in self.compare_regions:
+            graph.add(f"region:{region}", lambda region=region: fetch_region_price(region),
+                      fallback=lambda region=region: stale_region_price(region))
+        graph.add("info", fetch_itad_info, "lookup", fallback=lambda gid: stale(f"itad:info:{gid}") if gid else None)
+        graph.add("cn_price", fetch_cn_price, "lookup", fallback=stale_cn_price)
+        if self.history is not None:
+            graph.add("chart", fetch_chart, "lookup")
+        # 整体截止时间：到时仍未返回的请求改用缓存数据回复，请求本身继续在后台完成并写入缓存
+        results = await graph.run(deadline=self.query_deadline)
+        graph.log()
+        for stage, (ready, end) in graph.timings.items():
+            metrics.observe("stage_seconds", (end - ready) / 1000, stage=stage.split(":")[0])
+        for stage in graph.degraded:
+            metrics.inc("stage_degraded_total", stage=stage.split(":")[0])
+        for task in graph.pending:
+            self._background(task)
+        steam_name, steam_image, cn_data = results["steam_cn"]
+        gid = results["lookup"]
+        # 各对比区价格：[(区服, 价格, 货币, 折扣)]
+        region_prices = [(r, *results[f"region:{r}"]) for r in self.compare_regions]
+
+        if gid is None:
+            if "lookup" in graph.degraded:
+                return ["ITAD 响应超时，暂时查不到这个游戏喵，请稍后再试。"]
+            return ["未找到该游戏的 isthereanydeal id \n（试一下换个名称搜索一下）。"]
+
+        info = results["info"]
+        if info is not None:
+            name = info.get("title", "未知游戏")
+            tags = ", ".join(info.get("tags", []))
+            release = info.get("releaseDate", "")
+            devs = ", ".join([d["name"] for d in info.get("developers", [])]) if info.get("developers") else ""
+            itad_url = info.get("urls", {}).get("game", "")
+            steam_review = ""
+            for r in info.get("reviews", []):
+                if r.get("source") == "Steam":
+                    steam_review = f"{r.get('score', '')}%"
+                    break
+        else:
+            name = tags = release = devs = itad_url = steam_review = ""
+
+        cn_price, cn_lowest, cn_currency, regular = results["cn_price"]
+        # 如果ITAD没有国区价格，则用Steam官方API补充当前国区价格（与国区名称同一请求，此时已完成）
+        if cn_price is None:
+            cn_price, cn_currency, _ = parse_price_overview(cn_data)
+            # 只补充当前价，不补充史低，史低始终以ITAD为准
+        _, _, cn_discount_percent = parse_price_overview(cn_data)
+        return self._render_price(
+            appid, steam_name or name, steam_image, steam_review,
+            cn_price, cn_currency, cn_discount_percent, cn_lowest, regular, region_prices,
+            note="（部分上游响应较慢，以上含缓存数据，可稍后再查）" if graph.degraded else "",
+            chart=results.get("chart")
+        )
 
-        # 5. 汇率（手动定义，不再请求第三方）
-        uah2cny = 0.1718  # 1UAH=0.1718人民币
-        usd2cny = 7.2     # 如有需要可手动调整
+    def _render_price(self, appid, display_name, steam_image, steam_review,
+                      cn_price, cn_currency, cn_discount_percent, cn_lowest, regular, region_prices, note="", chart=None):
+        '''组装价格回复；region_prices 为 [(区服, 价格, 货币, 折扣)]，note 追加在末尾（如快照时间），chart 为走势图 PNG'''
+        compare_price = compare_currency = None
+        compare_discount_percent = 0
+        if len(region_prices) == 1:
+            _, compare_price, compare_currency, compare_discount_percent = region_prices[0]
 
-        # 6. 货币转换
+        # 6. 货币转换（国区和各对比区一次换算）
         price_diff = ""
-        cn_cny = to_cny(cn_price, cn_currency)
-        compare_cny = to_cny(compare_price, compare_currency)
+        cn_cny, *region_cny = self.rates.convert_many(
+            [cn_price] + [price for _, price, _, _ in region_prices],
+            [cn_currency] + [currency for _, _, currency, _ in region_prices],
+            "CNY"
+        )
+        compare_cny = region_cny[0] if len(region_prices) == 1 else None
 
         # 7. 修正史低折扣百分比算法，优先用原价
         def percent_drop(now, low, regular=None):
@@ -331,8 +732,6 @@ class SteamPricePlugin(Star):
 
         # 8. 价格差（国区/对比区）
         price_diff = ""
-        cn_cny = to_cny(cn_price, cn_currency)
-        compare_cny = to_cny(compare_price, compare_currency)
         if cn_cny is not None and compare_cny is not None and compare_cny > 0:
             diff_val = cn_cny - compare_cny
             diff_percent = ((cn_cny - compare_cny) / compare_cny * 100)
@@ -352,27 +751,14 @@ class SteamPricePlugin(Star):
 
         # 国区当前折扣
         cn_discount = ""
-        try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                resp = await client.get(
-                    "https://store.steampowered.com/api/appdetails",
-                    params={"appids": appid, "cc": "cn", "l": "zh"}
-                )
-                data = resp.json()
-                app_data = data.get(appid, {})
-                if app_data.get("success") and app_data.get("data"):
-                    price_overview = app_data["data"].get("price_overview")
-                    if price_overview and "discount_percent" in price_overview and price_overview["discount_percent"] > 0:
-                        cn_discount = f"-{price_overview['discount_percent']}%"
-        except Exception as e:
-            logger.error(f"获取国区实时折扣失败: {e}\n{traceback.format_exc()}")
+        if cn_discount_percent and cn_discount_percent > 0:
+            cn_discount = f"-{cn_discount_percent}%"
 
         # 对比区当前折扣
         compare_discount = ""
         if compare_discount_percent and compare_discount_percent > 0:
             compare_discount = f"-{compare_discount_percent}%"
         # 对比区显示人民币对比
-        compare_cny = to_cny(compare_price, compare_currency)
         compare_price_str = fmt(compare_price, compare_currency)
         # 修正：只有 compare_cny 不为 None 且大于0 时才拼接人民币价格
         if compare_cny is not None and compare_cny > 0:
@@ -386,7 +772,7 @@ class SteamPricePlugin(Star):
             cn_price_str += f" {cn_discount}"
 
         # 价格差（严格只显示百分比，前面加提示文字）
-        if self.compare_region.upper() == "NONE":
+        if len(region_prices) != 1:
             compare_price_str = "(未进行对比)"
             price_diff = ""
         else:
@@ -394,7 +780,6 @@ class SteamPricePlugin(Star):
             if compare_discount_percent and compare_discount_percent > 0:
                 compare_discount = f"-{compare_discount_percent}%"
                 compare_price_str += f" {compare_discount}"
-            compare_cny = to_cny(compare_price, compare_currency)
             if compare_cny is not None and compare_cny > 0:
                 compare_price_str += f" （￥{compare_cny:.2f}）"
             if cn_cny is not None and compare_cny is not None and compare_cny > 0:
@@ -410,24 +795,55 @@ class SteamPricePlugin(Star):
         # 构建精简消息链
         chain = []
         if steam_image:
-            chain.append(Comp.Image.fromURL(steam_image))
-        # 优先用国区中文名
-        display_name = steam_name if steam_name else name
+            # 已下载过的封面直接发送，不让适配器再下载一次
+            image_bytes = self.assets.cached_bytes(steam_image)
+            if image_bytes:
+                chain.append(Comp.Image.fromBase64(base64.b64encode(image_bytes).decode("utf-8")))
+            else:
+                chain.append(Comp.Image.fromURL(steam_image))
 
         # 优化输出格式：不对比时不显示“区价格: (未进行对比)”和多余换行
-        if self.compare_region.upper() == "NONE":
+        if not region_prices:
             msg = (
                 f"{display_name}\n"
                 f"国区价格: {cn_price_str}\n"
                 f"史低: {fmt(cn_lowest, cn_currency)} {shidi_percent}\n"
             )
+        elif len(region_prices) > 1:
+            # 多区对比：国区与各对比区按人民币价格从低到高排列
+            rows = [("国区", cn_price_str, cn_cny)]
+            for (region, price, currency, discount_percent), price_cny in zip(region_prices, region_cny):
+                price_str = fmt(price, currency)
+                if discount_percent and discount_percent > 0:
+                    price_str += f" -{discount_percent}%"
+                if price_cny is not None and price_cny > 0:
+                    price_str += f" （￥{price_cny:.2f}）"
+                rows.append((f"{region}区", price_str, price_cny))
+            rows.sort(key=lambda row: (row[2] is None, row[2] or 0))
+            table = "\n".join(f"{label}: {price_str}" for label, price_str, _ in rows)
+            cheapest = rows[0]
+            if cn_cny is None or cheapest[2] is None:
+                price_diff = "无法获取当前价差"
+            elif cheapest[0] == "国区":
+                price_diff = "国区最便宜喵！"
+            else:
+                price_diff = f"{cheapest[0]}最便宜喵，比国区便宜{cn_cny - cheapest[2]:.2f}元呢！"
+            msg = (
+                f"{display_name}\n"
+                f"史低: {fmt(cn_lowest, cn_currency)} {shidi_percent}\n"
+                f"\n"
+                f"多区价格（从低到高）:\n"
+                f"{table}\n"
+                f"\n"
+                f"{price_diff}\n"
+            )
         else:
             msg = (
                 f"{display_name}\n"
                 f"国区价格: {cn_price_str}\n"
                 f"史低: {fmt(cn_lowest, cn_currency)} {shidi_percent}\n"
                 f"\n"
-                f"{self.compare_region}区价格: {compare_price_str}\n"
+                f"{region_prices[0][0]}区价格: {compare_price_str}\n"
                 f"\n"
                 f"{price_diff}\n"
             )
@@ -438,24 +854,24 @@ class SteamPricePlugin(Star):
             msg += f"好评率: {steam_review}"
         if appid:
             msg += f"\nsteam商店链接：https://store.steampowered.com/app/{appid}"
+        if note:
+            msg += f"\n{note}"
         chain.append(Comp.Plain(msg))
-        yield event.chain_result(chain)
+        if chart:
+            chain.append(Comp.Image.fromBase64(base64.b64encode(chart).decode("utf-8")))
+        return [chain]
 
     @filter.command("搜索游戏")
     async def search_game(self, event: AstrMessageEvent, name: str):
         '''查找Steam游戏，格式：/查找游戏 <中文游戏名>，会展示多个结果的封面和原名'''
+        async for result in self._admitted(event, self._search_game(event, name)):
+            yield result
+
+    async def _search_game(self, event, name):
         try:
-            # 1. LLM翻译
-            prompt = f"请将以下游戏名翻译为steam页面的英文官方名称，仅输出英文名，不要输出其他内容：{name}"
-            logger.info(f"[LLM][查找游戏] 输入prompt: {prompt}")
-            llm_response = await self.context.get_using_provider().text_chat(
-                prompt=prompt,
-                contexts=[],
-                image_urls=[],
-                func_tool=None,
-                system_prompt=""
-            )
-            game_en_name = llm_response.completion_text.strip()
+            # 1. LLM翻译（命中翻译缓存时不调用大模型）
+            logger.info(f"[LLM][查找游戏] 输入: {name}")
+            game_en_name = await self.translator.translate(name)
             logger.info(f"[LLM][查找游戏] 输出: {game_en_name}")
             # 修改提示，带上英文名
             yield event.plain_result(f"正在为主人查找游戏《{game_en_name}》，请稍等...")
@@ -464,126 +880,390 @@ class SteamPricePlugin(Star):
             yield event.plain_result("游戏名翻译失败，请重试。")
             return
 
+        # 同一游戏名的并发搜索只执行一次，所有请求者共享结果
+        with metrics.time("query_seconds", kind="search"):
+            replies = await self.singleflight.do(
+                ("search_game", normalize_title(game_en_name)),
+                lambda: self._search_game_replies(name, game_en_name)
+            )
+        for reply in replies:
+            yield self._to_result(event, reply)
+
+    async def _search_game_replies(self, name, game_en_name):
+        '''搜索游戏并组装回复列表（与具体消息事件无关，可被并发请求共享）'''
         # 2. ITAD搜索
         try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                resp = await client.get(
-                    f"{ITAD_API_BASE}/games/search/v1",
-                    params={"key": self.itad_api_key, "title": game_en_name, "limit": 8}
-                )
-                data = resp.json()
-                logger.info(f"[ITAD][search_game] 返回: {data}")
-                if not data or not isinstance(data, list):
-                    yield event.plain_result("未找到相关游戏。")
-                    return
-                # 3. 组装消息链
-                chain = []
-                from PIL import Image as PILImage
-                import io
-                import httpx as _httpx
-                for game in data[:10]:
-                    title = game.get("title", "未知")
-                    # 优先用 boxart 或 banner145
-                    img_url = ""
-                    assets = game.get("assets", {})
-                    # 优先选小图（宽高不超过100）
-                    if assets.get("banner145"):
-                        img_url = assets["banner145"]
-                    elif assets.get("boxart"):
-                        img_url = assets["boxart"]
-                    elif assets.get("banner300"):
-                        img_url = assets["banner300"]
-                    elif assets.get("banner400"):
-                        img_url = assets["banner400"]
-                    elif assets.get("banner600"):
-                        img_url = assets["banner600"]
-                    # 获取价格（需进一步查info接口）
-                    price_str = ""
-                    try:
-                        async with httpx.AsyncClient(timeout=8) as client2:
-                            resp2 = await client2.get(
-                                f"{ITAD_API_BASE}/games/info/v2",
-                                params={"key": self.itad_api_key, "id": game.get("id")}
-                            )
-                            info2 = resp2.json()
-                            # 取国区价格
-                            price = None
-                            currency = None
-                            if "prices" in info2 and isinstance(info2["prices"], dict):
-                                cn_price = info2["prices"].get("CN")
-                                if cn_price and "price" in cn_price:
-                                    price = cn_price["price"].get("amount")
-                                    currency = cn_price["price"].get("currency")
-                            if price is not None and currency:
-                                price_str = f"￥{price:.2f}" if currency == "CNY" else f"{currency} {price:.2f}"
-                    except Exception as e:
-                        logger.error(f"查找游戏价格失败: {e}")
-                    # 拼装消息
-                    if img_url:
-                        # 下载图片并压缩到100x100以内
-                        try:
-                            async with _httpx.AsyncClient(timeout=8) as img_client:
-                                img_resp = await img_client.get(img_url)
-                                img_resp.raise_for_status()
-                                img_bytes = img_resp.content
-                                with io.BytesIO(img_bytes) as f:
-                                    with PILImage.open(f) as pil_img:
-                                        pil_img = pil_img.convert("RGB")
-                                        pil_img.thumbnail((200, 200))
-                                        buf = io.BytesIO()
-                                        pil_img.save(buf, format="JPEG")
-                                        buf.seek(0)
-                                        img_b64 = buf.read()
-                                        import base64
-                                        img_b64_str = base64.b64encode(img_b64).decode("utf-8")
-                                        chain.append(Comp.Image.fromBase64(img_b64_str))
-                        except Exception as e:
-                            logger.error(f"图片压缩失败: {e}")
-                    chain.append(Comp.Plain(f"{title}" + (f"  {price_str}" if price_str else "")))
-                if not chain:
-                    yield event.plain_result("未找到相关游戏。")
-                    return
-                # 不再追加“或许你要找的游戏是这些？”
-                yield event.chain_result(chain)
+            data = await self._itad_search(game_en_name, 8)
+            logger.info(f"[ITAD][search_game] 返回{len(data) if isinstance(data, list) else 0}个结果")
+            log_payload("[ITAD][search_game] 返回:", data)
+            if not data or not isinstance(data, list):
+                self.translator.report(name, False)
+                return ["未找到相关游戏。"]
+            self.translator.report(name, True)
+            games = data[:10]
+
+            async def fetch_cover(game):
+                # 优先用 boxart 或 banner145
+                img_url = ""
+                assets = game.get("assets", {})
+                # 优先选小图（宽高不超过100）
+                if assets.get("banner145"):
+                    img_url = assets["banner145"]
+                elif assets.get("boxart"):
+                    img_url = assets["boxart"]
+                elif assets.get("banner300"):
+                    img_url = assets["banner300"]
+                elif assets.get("banner400"):
+                    img_url = assets["banner400"]
+                elif assets.get("banner600"):
+                    img_url = assets["banner600"]
+                if not img_url:
+                    return None
+                # 下载图片并压缩到200x200以内（在工作线程中处理，结果有缓存）
+                return await self.images.thumbnail(img_url, (200, 200))
+
+            # 价格一次批量请求取全，封面按并发上限同时下载；单个封面超时或失败时只显示文字
+            prices, covers = await asyncio.gather(
+                fetch_prices(
+                    self.http, self.itad_api_key, [g.get("id") for g in games], "CN",
+                    cache=self.cache, ttl=self._ttl("prices")
+                ),
+                bounded_map(fetch_cover, games, limit=self.search_concurrency, timeout=self.search_item_timeout),
+            )
+            # 3. 组装消息链（保持搜索结果的排序）
+            chain = []
+            if self.search_contact_sheet:
+                # 总览图模式：所有封面拼成一张图，下面按序号列出名称和价格
+                if any(covers):
+                    sheet = await self.images.contact_sheet(covers)
+                    chain.append(Comp.Image.fromBase64(base64.b64encode(sheet).decode("utf-8")))
+            for index, (game, cover) in enumerate(zip(games, covers), 1):
+                title = game.get("title", "未知")
+                # 国区价格（来自上面的批量请求）
+                price_str = ""
+                p = prices.get(game.get("id"))
+                if p and p["price"] is not None and p["currency"]:
+                    price_str = fmt_price(p["price"], p["currency"])
+                    if p["lowest"] is not None:
+                        price_str += f"（史低{fmt_price(p['lowest'], p['currency'])}）"
+                # 拼装消息
+                if self.search_contact_sheet:
+                    chain.append(Comp.Plain(f"{index}. {title}" + (f"  {price_str}" if price_str else "") + "\n"))
+                    continue
+                if cover:
+                    chain.append(Comp.Image.fromBase64(base64.b64encode(cover).decode("utf-8")))
+                chain.append(Comp.Plain(f"{title}" + (f"  {price_str}" if price_str else "")))
+            if not chain:
+                return ["未找到相关游戏。"]
+            # 不再追加“或许你要找的游戏是这些？”
+            return [chain]
         except Exception as e:
             logger.error(f"ITAD查找游戏失败: {e}\n{traceback.format_exc()}")
-            yield event.plain_result("查找游戏失败，请重试。")
+            return ["查找游戏失败，请重试。"]
+
+    async def _itad_search(self, title, limit):
+        '''ITAD 游戏搜索，同一标题的并发请求合并为一次；上游出错时抛出异常或返回过期缓存，不当作“未找到”'''
+        def fetch():
+            return self._cached_json(
+                f"itad:search:{normalize_title(title)}:{limit}", "search",
+                f"{ITAD_API_BASE}/games/search/v1",
+                params={"key": self.itad_api_key, "title": title, "limit": limit}
+            )
+        return await self.singleflight.do(("itad_search", normalize_title(title), limit), fetch)
+
+    @staticmethod
+    def _split_batch(param_str):
+        '''拆分批量查询参数：只按换行和中文逗号、顿号拆分，单段内的多个商店链接再分别拆开'''
+        items = []
+        for part in re.split(r"[，、\n]+", param_str):
+            part = part.strip()
+            links = re.findall(r"https?://store\.steampowered\.com/app/\d+[^\s,|;]*", part)
+            if len(links) > 1:
+                items.extend(links)
+            elif part:
+                items.append(part)
+        return items
+
+    async def _resolve_batch_item(self, item):
+        '''把批量查询中的单项（链接或游戏名）解析为 (appid, 显示名)，解析失败时 appid 为 None'''
+        m = re.match(r"https?://store\.steampowered\.com/app/(\d+)", item)
+        if m:
+            return m.group(1), None
+        appid = self.alias_index.resolve(item)
+        if appid:
+            return str(appid), None
+        title = item
+        if re.search(r'[\u4e00-\u9fff]', item):
+            try:
+                title = await self.translator.translate(item)
+            except Exception as e:
+                logger.error(f"[批量查询] 翻译游戏名失败: {item}: {e}")
+                return None, item
+        local_appid = self.app_index.resolve(title) if self.app_index.ready else None
+        if local_appid:
+            return str(local_appid), None
+        try:
+            data = await self._itad_search(title, 1)
+            game = data[0] if isinstance(data, list) and data else None
+            appid = await self._itad_game_appid(game) if game else None
+        except Exception as e:
+            logger.error(f"[批量查询] ITAD搜索失败: {title}: {e}")
+            return None, item
+        self.translator.report(item, bool(appid))
+        if appid:
+            return appid, game.get("title")
+        return None, item
+
+    async def _itad_game_appid(self, game):
+        '''
+        ITAD 搜索结果对应的 Steam appid：结果带商店链接时直接解析，
+        否则（games/search/v1 的结果不带链接）按 gid 查 games/info/v2（带缓存），找不到时返回 None
+        '''
+        for url_item in game.get("urls", []):
+            m = re.match(r"https?://store\.steampowered\.com/app/(\d+)", url_item)
+            if m:
+                return m.group(1)
+        if not game.get("id"):
+            return None
+        info = await self._cached_json(
+            f"itad:info:{game['id']}", "info",
+            f"{ITAD_API_BASE}/games/info/v2",
+            params={"key": self.itad_api_key, "id": game["id"]}
+        )
+        appid = (info or {}).get("appid")
+        return str(appid) if appid else None
+
+    async def _batch_replies(self, items):
+        '''
+        批量查询多个游戏：ITAD gid 与价格各一次批量请求，Steam 各区价格各一次多 appid 请求，
+        请求次数与游戏数量基本无关。返回回复列表。
+        '''
+        items = items[:self.batch_max_games]
+        resolved = await asyncio.gather(*(self._resolve_batch_item(item) for item in items))
+        appids = list(dict.fromkeys(appid for appid, _ in resolved if appid))
+        if not appids:
+            return ["没有找到可以查询的游戏喵，请检查链接或游戏名。"]
+        gids, cn_overviews, *region_overviews = await asyncio.gather(
+            lookup_gids(self.http, self.itad_api_key, appids, cache=self.cache, ttl=self._ttl("lookup")),
+            fetch_price_overviews(self.http, appids, "cn", cache=self.cache, ttl=self._ttl("appdetails")),
+            *(fetch_price_overviews(self.http, appids, region, cache=self.cache, ttl=self._ttl("appdetails"))
+              for region in self.compare_regions)
+        )
+        prices, titles = await asyncio.gather(
+            fetch_prices(
+                self.http, self.itad_api_key, [g for g in gids.values() if g], "CN",
+                cache=self.cache, ttl=self._ttl("prices")
+            ),
+            self._batch_titles(appids, gids, resolved)
+        )
+        # 先收集所有金额，再一次换算成人民币：每个游戏依次为 国区现价、史低、各对比区价格
+        rows = []
+        amounts, currencies = [], []
+        for appid in appids:
+            p = prices.get(gids.get(appid)) or {}
+            price, currency, discount = cn_overviews.get(appid, (None, None, 0))
+            if p.get("price") is not None:
+                price, currency = p["price"], p["currency"]
+            rows.append((appid, p, price, currency, discount))
+            amounts += [price, p.get("lowest")]
+            currencies += [currency, p.get("currency")]
+            for overviews in region_overviews:
+                r_price, r_currency, _ = overviews.get(appid, (None, None, 0))
+                amounts.append(r_price)
+                currencies.append(r_currency)
+        converted = self.rates.convert_many(amounts, currencies, "CNY")
+        step = 2 + len(self.compare_regions)
+        lines = []
+        total_now = total_low = 0.0
+        for index, (appid, p, price, currency, discount) in enumerate(rows, 1):
+            now_cny, low_cny, *region_cny = converted[(index - 1) * step:index * step]
+            line = f"{index}. {titles.get(appid) or f'App {appid}'}  " + (fmt_price(price, currency) if price is not None else "未知")
+            if discount:
+                line += f" -{discount}%"
+            if p.get("lowest") is not None:
+                line += f" | 史低{fmt_price(p['lowest'], p['currency'])}"
+                total_low += low_cny or 0
+            if price is not None:
+                total_now += now_cny or 0
+            compare = [
+                f"{region}￥{r_cny:.2f}"
+                for region, r_cny in zip(self.compare_regions, region_cny) if r_cny is not None
+            ]
+            if compare:
+                line += " | " + " ".join(compare)
+            lines.append(line)
+        failed = [item for (appid, _), item in zip(resolved, items) if not appid]
+        msg = "\n".join(lines)
+        msg += f"\n\n国区合计: ￥{total_now:.2f}，史低合计: ￥{total_low:.2f}"
+        if failed:
+            msg += "\n未找到: " + "、".join(failed)
+        return [msg]
+
+    async def _batch_titles(self, appids, gids, resolved):
+        '''
+        批量查询各游戏的显示名：依次取别名索引、解析时得到的名称、缓存中的 appdetails 和 ITAD 游戏信息；
+        仍没有名称的（通常是直接发链接的游戏）再按 gid 请求 ITAD 游戏信息。返回 {appid: 显示名}
+        '''
+        titles = {}
+        missing = []
+        for appid in appids:
+            names = self.alias_index.names(appid)
+            app_data = self.cache.get_stale(appdetails_cache_key(appid, "cn", "schinese", BASIC_FILTERS)) or {}
+            info = self.cache.get_stale(f"itad:info:{gids.get(appid)}") if gids.get(appid) else None
+            title = (
+                names.get("zh") or names.get("en")
+                or next((t for a, t in resolved if a == appid and t), None)
+                or app_data.get("name") or (info or {}).get("title")
+            )
+            if title:
+                titles[appid] = title
+            elif gids.get(appid):
+                missing.append(appid)
+
+        async def fetch_title(appid):
+            info = await self._cached_json(
+                f"itad:info:{gids[appid]}", "info",
+                f"{ITAD_API_BASE}/games/info/v2",
+                params={"key": self.itad_api_key, "id": gids[appid]}
+            )
+            if info.get("title"):
+                titles[appid] = info["title"]
+                self.alias_index.record(appid, info["title"], "en")
+
+        await bounded_map(fetch_title, missing, limit=4)
+        return titles
 
     async def _get_price_and_lowest(self, gid, country):
-        # 用/games/prices/v3 POST获取指定区价格和史低
+        # 用/games/prices/v3 POST获取指定区价格和史低（与批量接口共用缓存）
         try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                resp = await client.post(
-                    f"{ITAD_API_BASE}/games/prices/v3",
-                    params={"key": self.itad_api_key, "country": country, "shops": 61},  # 61=Steam
-                    json=[gid]
-                )
-                data = resp.json()
-                # 只输出关键信息
-                logger.info(f"[ITAD][prices][{country}] 成功获取价格和史低信息")
-                logger.debug(f"[ITAD][prices][{country}] historyLow调试: {data[0].get('historyLow', {})}")
-                if not data or not isinstance(data, list) or not data[0].get("deals"):
-                    return None, None, None, None
-                deals = data[0]["deals"]
-                # 取Steam的当前价和原价
-                price = None
-                currency = None
-                regular = None
-                for d in deals:
-                    if d.get("shop", {}).get("name", "").lower() == "steam":
-                        price = d.get("price", {}).get("amount")
-                        currency = d.get("price", {}).get("currency")
-                        if d.get("regular") and "amount" in d["regular"]:
-                            regular = d["regular"]["amount"]
-                        break
-                # 取史低价
-                lowest = None
-                history_low = data[0].get("historyLow", {})
-                for k in ["m3", "y1", "all"]:
-                    if history_low.get(k) and "amount" in history_low[k]:
-                        lowest = history_low[k]["amount"]
-                        break
-                return price, lowest, currency, regular
+            prices = await fetch_prices(
+                self.http, self.itad_api_key, [gid], country, cache=self.cache, ttl=self._ttl("prices")
+            )
+            p = prices.get(gid)
+            if not p or p["price"] is None:
+                return None, None, None, None
+            return p["price"], p["lowest"], p["currency"], p["regular"]
         except Exception as e:
             logger.error(f"_get_price_and_lowest error: {e}\n{traceback.format_exc()}")
             return None, None, None, None
+
+    async def _send_watch_notice(self, umo, lines):
+        '''向订阅所在会话推送降价提醒'''
+        text = "主人订阅的游戏降价啦喵~\n" + "\n".join(lines)
+        await self.context.send_message(umo, MessageChain().message(text))
+
+    @filter.command("订阅史低")
+    async def watch_add(self, event: AstrMessageEvent, args: str = ""):
+        '''订阅降价提醒，格式：/订阅史低 <appid/steam商店链接/游戏名> [￥目标价]，出现新史低或达到目标价时在本会话提醒'''
+        param_str = re.sub(r"^[\.／/]*订阅史低\s*", "", event.message_str, count=1).strip()
+        if not param_str:
+            yield event.plain_result("用法：/订阅史低 <appid/steam商店链接/游戏名> [￥目标价]")
+            return
+        # 末尾的 ￥数字 为目标价；appid/链接后面也可以直接跟数字
+        target = None
+        m = re.match(r"^(.*?)\s+([￥¥]?)(\d+(?:\.\d+)?)$", param_str)
+        if m and (m.group(2) or re.match(r"^(\d+|https?://\S+)$", m.group(1))):
+            param_str, target = m.group(1).strip(), float(m.group(3))
+        umo = event.unified_msg_origin
+        if self.watch_max_per_group and self.watch_store.count(umo) >= self.watch_max_per_group:
+            yield event.plain_result(f"本会话的订阅已达上限（{self.watch_max_per_group}个），请先取消一些订阅喵。")
+            return
+        if re.fullmatch(r"\d+", param_str):
+            appid, title = param_str, None
+        else:
+            appid, title = await self._resolve_batch_item(param_str)
+        if not appid:
+            yield event.plain_result("没有找到这个游戏喵，请检查appid、链接或游戏名。")
+            return
+        gids = await lookup_gids(self.http, self.itad_api_key, [appid], cache=self.cache, ttl=self._ttl("lookup"))
+        gid = gids.get(appid)
+        if not gid:
+            yield event.plain_result("未找到该游戏的 isthereanydeal id，暂时无法订阅喵。")
+            return
+        names = self.alias_index.names(appid)
+        name = names.get("zh") or names.get("en") or title or f"App {appid}"
+        self.watch_store.add(umo, appid, gid, name, target)
+        # 订阅时记录一次价格作为比较基准（已有快照时沿用，避免打断其他会话的提醒）
+        prices = await fetch_prices(self.http, self.itad_api_key, [gid], "CN", cache=self.cache, ttl=self._ttl("prices"))
+        p = prices.get(gid)
+        msg = f"已订阅《{name}》的降价提醒喵~"
+        if p and p["price"] is not None:
+            if self.watch_store.snapshot(gid) is None:
+                self.watch_store.save_snapshots({gid: make_snapshot(p)})
+            msg += f"\n当前价格: {fmt_price(p['price'], p['currency'])}"
+            if p["history_low"] is not None:
+                msg += f"，史低: {fmt_price(p['history_low'], p['currency'])}"
+            if target is not None and p["price"] <= target:
+                msg += "\n现在已经低于目标价了喵！"
+        if target is not None:
+            msg += f"\n目标价: ￥{target:.2f}"
+        yield event.plain_result(msg)
+
+    @filter.command("取消订阅史低")
+    async def watch_remove(self, event: AstrMessageEvent, appid: str = ""):
+        '''取消降价提醒，格式：/取消订阅史低 <appid/steam商店链接>'''
+        m = re.search(r"(?:/app/)?(\d+)", appid or "")
+        if not m:
+            yield event.plain_result("用法：/取消订阅史低 <appid/steam商店链接>，可用 /订阅列表 查看已订阅的游戏")
+            return
+        if self.watch_store.remove(event.unified_msg_origin, m.group(1)):
+            yield event.plain_result(f"已取消订阅 {m.group(1)} 喵~")
+        else:
+            yield event.plain_result("本会话没有订阅这个游戏喵。")
+
+    @filter.command("订阅列表")
+    async def watch_list(self, event: AstrMessageEvent):
+        '''查看本会话订阅的降价提醒'''
+        rows = self.watch_store.list(event.unified_msg_origin)
+        if not rows:
+            yield event.plain_result("本会话还没有订阅任何游戏喵，用 /订阅史低 <appid> 添加。")
+            return
+        lines = [
+            f"{appid} {name or ''}" + (f"（目标 ￥{target:.2f}）" if target is not None else "")
+            for appid, _, name, target in rows
+        ]
+        yield event.plain_result("本会话的订阅：\n" + "\n".join(lines))
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("史低状态")
+    async def metrics_status(self, event: AstrMessageEvent):
+        '''查看插件运行指标（管理员）：上游接口耗时与错误、查询阶段耗时、缓存命中率、大模型翻译耗时'''
+        def ms(h, q):
+            return f"{h.quantile(q) * 1000:.0f}ms"
+        lines = [f"已运行 {(time.time() - metrics.started) / 3600:.1f} 小时"]
+        errors = metrics.counters_by("upstream_errors_total", "endpoint")
+        upstream = metrics.histograms_by("upstream_request_seconds", "endpoint")
+        if upstream:
+            lines.append("上游接口（次数 p50/p95 错误）:")
+            for endpoint, h in sorted(upstream.items()):
+                lines.append(f"  {endpoint}: {h.count}次 {ms(h, 0.5)}/{ms(h, 0.95)} 错误{errors.get(endpoint, 0)}")
+        timeouts = metrics.counters_by("upstream_errors_total", "kind")
+        if timeouts:
+            lines.append("错误类型: " + "，".join(f"{k} {v}" for k, v in sorted(timeouts.items())))
+        queries = metrics.histograms_by("query_seconds", "kind")
+        if queries:
+            lines.append("查询（次数 p50/p95）: " + "，".join(
+                f"{k} {h.count}次 {ms(h, 0.5)}/{ms(h, 0.95)}" for k, h in sorted(queries.items())
+            ))
+        stages = metrics.histograms_by("stage_seconds", "stage")
+        if stages:
+            degraded = metrics.counters_by("stage_degraded_total", "stage")
+            lines.append("查询阶段（p50/p95 超时）: " + "，".join(
+                f"{k} {ms(h, 0.5)}/{ms(h, 0.95)} {degraded.get(k, 0)}" for k, h in sorted(stages.items())
+            ))
+        wait = metrics.histograms_by("queue_wait_seconds", "").get("")
+        lines.append(
+            f"查询排队: 执行中{self.scheduler.running}，排队{self.scheduler.queued}，已拒绝{self.scheduler.rejected}"
+            + (f"，等待 p95 {ms(wait, 0.95)}" if wait else "")
+        )
+        llm = metrics.histograms_by("llm_seconds", "")
+        for h in llm.values():
+            lines.append(f"大模型翻译: {h.count}次 {ms(h, 0.5)}/{ms(h, 0.95)}")
+        collected = metrics.collected()
+        lines.append("缓存命中率: " + "，".join(
+            f"{labels['cache']} {value:.0%}" for labels, value in collected.get("cache_hit_ratio", [])
+        ))
+        lines.append("上游状态: " + "，".join(
+            f"{name} {up.breaker.state} 排队{up.bucket.queued}" for name, up in self.http.upstreams.items()
+        ))
+        yield event.plain_result("\n".join(lines))
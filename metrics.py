@@ -0,0 +1,162 @@
+# 运行指标
+# 进程内的计数器和延迟直方图（上游请求、查询阶段、大模型翻译等），供 /史低状态 和 Prometheus 文本导出使用
+# 用法: from .metrics import metrics
+#       metrics.inc("upstream_errors_total", endpoint="itad:/games/info/v2", kind="timeout")
+#       with metrics.time("llm_seconds"):
+#           ...
+#       text = metrics.render_prometheus()
+import json
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from astrbot.api import logger
+
+PREFIX = "steam_price_"
+# 延迟直方图的桶上限（秒）
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """按桶线性插值估算分位数（秒），没有数据时返回 0"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1] * 2
+                return lo + (hi - lo) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        # 导出时才计算的指标：name -> callable，返回 [(labels, value)]
+        self.collectors = {}
+
+    def inc(self, name, n=1, **labels):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(seconds)
+
+    @contextmanager
+    def time(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def register_collector(self, name, collect):
+        """注册导出时计算的指标（如缓存命中率），collect() 返回 [(labels字典, 数值)]"""
+        self.collectors[name] = collect
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, _label_key(labels)), 0)
+
+    def counters_by(self, name, label):
+        """按某个标签汇总计数器 {标签值: 次数}"""
+        result = {}
+        for (n, key), v in self.counters.items():
+            if n == name:
+                value = dict(key).get(label, "")
+                result[value] = result.get(value, 0) + v
+        return result
+
+    def histograms_by(self, name, label):
+        """{标签值: Histogram}"""
+        return {dict(key).get(label, ""): h for (n, key), h in self.histograms.items() if n == name}
+
+    def collected(self):
+        result = {}
+        for name, collect in self.collectors.items():
+            try:
+                result[name] = collect()
+            except Exception as e:
+                logger.error(f"[指标] 计算 {name} 失败: {e}")
+        return result
+
+    def render_prometheus(self):
+        """输出 Prometheus 文本格式"""
+        lines = [f"# TYPE {PREFIX}uptime_seconds gauge", f"{PREFIX}uptime_seconds {time.time() - self.started:.0f}"]
+        for name in sorted({n for n, _ in self.counters}):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for (n, key), v in sorted(self.counters.items()):
+                if n == name:
+                    lines.append(f"{PREFIX}{name}{_format_labels(key)} {v}")
+        for name in sorted({n for n, _ in self.histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (n, key), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f"{PREFIX}{name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(key)} {h.sum:.6f}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(key)} {h.count}")
+        for name, samples in sorted(self.collected().items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{PREFIX}{name}{_format_labels(_label_key(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+# 调试用的完整响应日志采样率，0 表示不输出（也不做任何格式化）
+_payload_sample_rate = 0.0
+
+
+def set_payload_sample_rate(rate):
+    global _payload_sample_rate
+    _payload_sample_rate = max(0.0, min(1.0, float(rate or 0)))
+
+
+def log_payload(tag, payload, limit=2000):
+    """按采样率输出上游响应内容；未被采样时不序列化 payload"""
+    if _payload_sample_rate <= 0 or random.random() >= _payload_sample_rate:
+        return
+    try:
+        text = json.dumps(payload, ensure_ascii=False)
+    except (TypeError, ValueError):
+        text = repr(payload)
+    if len(text) > limit:
+        text = text[:limit] + f"...（共{len(text)}字符）"
+    logger.info(f"{tag} {text}")
@@ -1,8 +1,16 @@
 # 价格转换工具
-# 支持自定义维护汇率，直接修改 rates 字典即可
+# 汇率来源可替换：内置 rates 字典 / 本地 JSON 文件 / HTTP 接口，按 TTL 定期刷新，刷新失败时沿用上一份
 # 用法: from .price_convert import to_cny
 #       cny_price = to_cny(price, currency)
+#       service = RateService(JsonFileRateProvider(path), ttl=43200)
+#       await service.refresh()
+#       cny_prices = service.convert_many([price1, price2], ["USD", "UAH"], "CNY")
+import json
+import time
 
+from astrbot.api import logger
+
+# 内置汇率：1 单位外币 = 多少人民币（参考值，可自行修改，或改用汇率文件/接口）
 rates = {
     "CNY": 1.0,      # 人民币
     "UAH": 0.17,   # 乌克兰格里夫纳
@@ -11,7 +19,15 @@ rates = {
     "KRW": 0.0053,   # 韩元
     "EUR": 8.38,      # 欧元
     "RUB": 0.085,    # 俄罗斯卢布
-    "TR": 0.17,     # 土耳其里拉
+    "TRY": 0.17,     # 土耳其里拉（Steam 返回的货币代码为 TRY）
+    "GBP": 9.6,      # 英镑
+    "HKD": 0.91,     # 港币
+    "TWD": 0.22,     # 新台币
+    "INR": 0.083,    # 印度卢比
+    "BRL": 1.29,     # 巴西雷亚尔
+    "KZT": 0.014,    # 哈萨克斯坦坚戈
+    "ARS": 0.006,    # 阿根廷比索
+    "PLN": 1.85,     # 波兰兹罗提
 }
 
 def to_cny(price, currency, custom_rates=None):
@@ -28,3 +44,120 @@ def to_cny(price, currency, custom_rates=None):
     if rate:
         return round(price * rate, 2)
     return None
+
+
+class RateSnapshot:
+    """一份汇率快照：values 为 1 单位各货币折合多少 base 货币"""
+
+    def __init__(self, values, base="CNY", source="builtin", fetched_at=None):
+        self.base = base.upper()
+        self.values = {k.upper(): float(v) for k, v in values.items() if v}
+        self.values.setdefault(self.base, 1.0)
+        self.source = source
+        self.fetched_at = fetched_at or time.time()
+
+    def factor(self, currency, target):
+        """1 单位 currency 折合多少 target，任一货币未知时返回 None"""
+        src = self.values.get(currency.upper()) if currency else None
+        dst = self.values.get(target.upper()) if target else None
+        if not src or not dst:
+            return None
+        return src / dst
+
+
+def parse_rates_json(data, source):
+    """
+    解析汇率 JSON，支持两种格式：
+    - {"base": "CNY", "rates": {"USD": 7.11}} 或直接 {"USD": 7.11}：1 单位外币折合多少 base（与内置 rates 相同）
+    - {"base_code": "CNY", "rates": {"USD": 0.14}, "per_base": true}：1 单位 base 折合多少外币（常见汇率接口格式）
+    """
+    if not isinstance(data, dict):
+        raise ValueError("汇率数据格式错误")
+    base = data.get("base") or data.get("base_code") or "CNY"
+    values = data.get("rates") if isinstance(data.get("rates"), dict) else {
+        k: v for k, v in data.items() if isinstance(v, (int, float))
+    }
+    # 汇率接口通常返回“1 base = 多少外币”，取倒数统一为“1 外币 = 多少 base”
+    if data.get("per_base") or "base_code" in data:
+        values = {k: 1 / v for k, v in values.items() if v}
+    return RateSnapshot(values, base=base, source=source)
+
+
+class StaticRateProvider:
+    def __init__(self, values=None):
+        self.values = values or rates
+
+    async def load(self):
+        return RateSnapshot(self.values, source="builtin")
+
+
+class JsonFileRateProvider:
+    def __init__(self, path):
+        self.path = path
+
+    async def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return parse_rates_json(json.load(f), source=f"file:{self.path}")
+
+
+class HttpRateProvider:
+    def __init__(self, http, url):
+        """url 返回的 JSON 格式见 parse_rates_json；测试时可以换成本地模拟服务"""
+        self.http = http
+        self.url = url
+
+    async def load(self):
+        resp = await self.http.get(self.url, priority=10)
+        resp.raise_for_status()
+        return parse_rates_json(resp.json(), source=self.url)
+
+
+class RateService:
+    def __init__(self, provider=None, ttl=12 * 3600, fallback=None):
+        """
+        provider: 汇率来源（需实现 async load() -> RateSnapshot），为空时使用内置汇率
+        ttl: 快照有效期（秒），过期后由 refresh() 重新加载
+        fallback: 来源不可用时使用的快照，默认为内置汇率
+        """
+        self.provider = provider or StaticRateProvider()
+        self.ttl = ttl
+        self.snapshot = fallback or RateSnapshot(rates, source="builtin")
+        self.refreshed = False
+
+    @property
+    def expired(self):
+        return not self.refreshed or time.time() - self.snapshot.fetched_at > self.ttl
+
+    async def refresh(self, force=False):
+        """快照过期时从来源重新加载，失败时保留当前快照"""
+        if not force and not self.expired:
+            return self.snapshot
+        try:
+            snapshot = await self.provider.load()
+            # 新来源缺少的货币沿用旧快照（同一 base 时）
+            if snapshot.base == self.snapshot.base:
+                for k, v in self.snapshot.values.items():
+                    snapshot.values.setdefault(k, v)
+            self.snapshot = snapshot
+            self.refreshed = True
+            logger.info(f"[汇率] 已加载 {len(snapshot.values)} 种货币（{snapshot.source}）")
+        except Exception as e:
+            logger.error(f"[汇率] 加载失败，沿用 {self.snapshot.source} 的汇率: {e}")
+        return self.snapshot
+
+    def convert(self, amount, currency, target="CNY"):
+        return self.convert_many([amount], [currency], target)[0]
+
+    def convert_many(self, amounts, currencies, target="CNY"):
+        """
+        批量换算：每种货币只查一次汇率。
+        返回与 amounts 等长的列表，金额或货币未知的项为 None，结果保留两位小数。
+        """
+        snapshot = self.snapshot
+        factors = {}
+        for c in set(currencies):
+            factors[c] = snapshot.factor(c, target) if c else None
+        return [
+            round(a * factors[c], 2) if a is not None and factors[c] is not None else None
+            for a, c in zip(amounts, currencies)
+        ]
@@ -0,0 +1,243 @@
+# 价格走势图
+# - 价格历史来自 ITAD games/history/v2：每个 (gid, 区服) 首次完整拉取一次，之后只请求上次之后的新记录
+# - 历史按 (gid, 区服) 以两个 array('d')（时间戳、价格）保存到 SQLite，读写都是整块二进制
+# - 走势图在工作线程中用 Pillow 绘制，PNG 按 (gid, 区服, 日期) 缓存在磁盘，同一天重复查看不再绘制
+# 用法: history = PriceHistory(HistoryStore(path), http, api_key, chart_dir)
+#       png = await history.chart(gid, "CN")   # 没有历史数据时为 None
+#       png = await asyncio.to_thread(history.cached_chart, gid, "CN")  # 只读当天已绘制的图，不请求上游
+import asyncio
+import datetime
+import io
+import os
+import sqlite3
+import time
+from array import array
+
+from astrbot.api import logger
+
+from .concurrency import SingleFlight
+from .itad_api import ITAD_API_BASE, STEAM_SHOP_ID
+
+
+class PriceSeries:
+    """一个 (gid, 区服) 的价格历史，按时间升序"""
+
+    def __init__(self, timestamps=None, amounts=None, currency=None, fetched=0.0):
+        self.timestamps = timestamps if timestamps is not None else array("d")
+        self.amounts = amounts if amounts is not None else array("d")
+        self.currency = currency
+        self.fetched = fetched
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def extend(self, points):
+        """追加 [(时间戳, 价格, 货币)]，只保留比现有最后一条更新的记录"""
+        last = self.timestamps[-1] if self.timestamps else float("-inf")
+        for ts, amount, currency in sorted(points):
+            if ts <= last:
+                continue
+            self.timestamps.append(ts)
+            self.amounts.append(amount)
+            self.currency = currency or self.currency
+            last = ts
+
+    def window(self, since):
+        """since 之后的记录（带上 since 之前的最后一条作为起始价格），返回 (timestamps, amounts)"""
+        start = 0
+        while start + 1 < len(self.timestamps) and self.timestamps[start + 1] <= since:
+            start += 1
+        return self.timestamps[start:], self.amounts[start:]
+
+
+class HistoryStore:
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "gid TEXT NOT NULL, region TEXT NOT NULL, timestamps BLOB NOT NULL, amounts BLOB NOT NULL, "
+            "currency TEXT, fetched REAL NOT NULL, PRIMARY KEY (gid, region))"
+        )
+
+    def load(self, gid, region):
+        row = self._db.execute(
+            "SELECT timestamps, amounts, currency, fetched FROM history WHERE gid = ? AND region = ?",
+            (gid, region.upper())
+        ).fetchone()
+        if not row:
+            return None
+        timestamps, amounts = array("d"), array("d")
+        timestamps.frombytes(row[0])
+        amounts.frombytes(row[1])
+        return PriceSeries(timestamps, amounts, row[2], row[3])
+
+    def save(self, gid, region, series):
+        self._db.execute(
+            "INSERT OR REPLACE INTO history (gid, region, timestamps, amounts, currency, fetched) VALUES (?, ?, ?, ?, ?, ?)",
+            (gid, region.upper(), series.timestamps.tobytes(), series.amounts.tobytes(), series.currency, series.fetched)
+        )
+
+    def close(self):
+        try:
+            self._db.close()
+        except Exception:
+            pass
+
+
+def parse_history(data):
+    """解析 history/v2 的返回，得到 [(时间戳, 价格, 货币)]"""
+    points = []
+    for item in data or []:
+        price = (item.get("deal") or {}).get("price") or {}
+        if price.get("amount") is None or not item.get("timestamp"):
+            continue
+        try:
+            ts = datetime.datetime.fromisoformat(item["timestamp"]).timestamp()
+        except ValueError:
+            continue
+        points.append((ts, float(price["amount"]), price.get("currency")))
+    return points
+
+
+def render_chart(timestamps, amounts, currency, now=None, size=(480, 200)):
+    """绘制阶梯状价格走势图，返回 PNG 字节（在工作线程中执行）"""
+    from PIL import Image as PILImage, ImageDraw, ImageFont
+    now = now or time.time()
+    width, height = size
+    left, right, top, bottom = 48, 12, 22, 22
+    img = PILImage.new("RGB", size, (27, 40, 56))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+    t0, t1 = timestamps[0], max(now, timestamps[-1])
+    lo, hi = min(amounts), max(amounts)
+    if hi - lo < 0.01:
+        lo, hi = lo * 0.9, hi * 1.1 + 0.01
+    span_t = max(t1 - t0, 1.0)
+
+    def x(t):
+        return left + (t - t0) / span_t * (width - left - right)
+
+    def y(a):
+        return top + (hi - a) / (hi - lo) * (height - top - bottom)
+
+    # 坐标轴与价格刻度（最高、最低）
+    for value in (hi, lo):
+        draw.line((left, y(value), width - right, y(value)), fill=(60, 78, 98))
+        draw.text((4, y(value) - 6), f"{value:.0f}", fill=(160, 175, 190), font=font)
+    # 阶梯线：价格保持到下一次变动，最后一段延伸到当前时间
+    points = []
+    for i, (t, a) in enumerate(zip(timestamps, amounts)):
+        next_t = timestamps[i + 1] if i + 1 < len(timestamps) else t1
+        points += [(x(t), y(a)), (x(next_t), y(a))]
+    draw.line(points, fill=(102, 192, 244), width=2)
+    # 标出最低价的位置
+    low_index = min(range(len(amounts)), key=lambda i: (amounts[i], -timestamps[i]))
+    lx, ly = x(timestamps[low_index]), y(amounts[low_index])
+    draw.ellipse((lx - 3, ly - 3, lx + 3, ly + 3), fill=(164, 208, 7))
+    draw.text(
+        (left, 4), f"{currency or ''}  low {min(amounts):.2f}  now {amounts[-1]:.2f}",
+        fill=(220, 230, 240), font=font
+    )
+    for t, anchor in ((t0, left), (t1, width - right - 60)):
+        draw.text((anchor, height - 16), datetime.date.fromtimestamp(t).isoformat(), fill=(160, 175, 190), font=font)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+class PriceHistory:
+    def __init__(self, store, http, api_key, chart_dir, days=365, refresh_interval=12 * 3600, priority=0):
+        """
+        store: HistoryStore
+        chart_dir: 走势图 PNG 缓存目录
+        days: 走势图显示的天数，也是首次拉取历史的范围
+        refresh_interval: 距上次拉取超过这段时间（秒）才增量请求新记录
+        """
+        self.store = store
+        self.http = http
+        self.api_key = api_key
+        self.chart_dir = chart_dir
+        self.days = days
+        self.refresh_interval = refresh_interval
+        self.priority = priority
+        self._singleflight = SingleFlight()
+        os.makedirs(chart_dir, exist_ok=True)
+
+    def _chart_path(self, gid, region, day=None):
+        day = day or datetime.date.today().isoformat()
+        return os.path.join(self.chart_dir, f"{gid}_{region.upper()}_{day}.png")
+
+    def cached_chart(self, gid, region):
+        """当天已绘制的走势图，没有时返回 None"""
+        try:
+            with open(self._chart_path(gid, region), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    async def _request(self, gid, region, since):
+        resp = await self.http.get(
+            f"{ITAD_API_BASE}/games/history/v2",
+            params={
+                "key": self.api_key, "id": gid, "country": region.upper(), "shops": STEAM_SHOP_ID,
+                "since": datetime.datetime.fromtimestamp(since, datetime.timezone.utc).isoformat(timespec="seconds"),
+            },
+            priority=self.priority
+        )
+        resp.raise_for_status()
+        return parse_history(resp.json())
+
+    async def series(self, gid, region):
+        """取价格历史：本地没有时拉取 days 天内的全部记录，过期时只拉取最后一条之后的新记录"""
+        return await self._singleflight.do((gid, region.upper()), lambda: self._series(gid, region))
+
+    async def _series(self, gid, region):
+        series = await asyncio.to_thread(self.store.load, gid, region)
+        now = time.time()
+        if series is not None and now - series.fetched < self.refresh_interval:
+            return series
+        if series is None or not len(series):
+            series = PriceSeries()
+            since = now - self.days * 86400
+        else:
+            since = series.timestamps[-1] + 1
+        try:
+            points = await self._request(gid, region, since)
+        except Exception as e:
+            logger.error(f"[价格走势] 获取 {gid} 的价格历史失败: {e}")
+            return series
+        series.extend(points)
+        series.fetched = now
+        await asyncio.to_thread(self.store.save, gid, region, series)
+        logger.info(f"[价格走势] {gid}/{region.upper()} 新增{len(points)}条记录，共{len(series)}条")
+        return series
+
+    async def chart(self, gid, region):
+        """当天的走势图 PNG；已绘制过时直接读取缓存，没有历史数据时返回 None"""
+        data = await asyncio.to_thread(self.cached_chart, gid, region)
+        if data is not None:
+            return data
+        series = await self.series(gid, region)
+        if not len(series):
+            return None
+        timestamps, amounts = series.window(time.time() - self.days * 86400)
+        data = await asyncio.to_thread(render_chart, list(timestamps), list(amounts), series.currency)
+        await asyncio.to_thread(self._save_chart, gid, region, data)
+        return data
+
+    def _save_chart(self, gid, region, data):
+        path = self._chart_path(gid, region)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        # 缓存键含日期，前几天的图不会再被读取，直接删除
+        suffix = f"_{datetime.date.today().isoformat()}.png"
+        for name in os.listdir(self.chart_dir):
+            if name.endswith(".png") and not name.endswith(suffix):
+                try:
+                    os.remove(os.path.join(self.chart_dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,189 @@
+# 本地价格快照
+# 大促期间查询量暴增、上游又最慢，热门游戏的价格由后台任务定期批量刷新到本地 SQLite，
+# /史低 命中新鲜快照时直接回复，不请求任何上游
+# - PriceSnapshotStore: 按 (appid, 区服, 时间戳) 保存价格，另存名称/头图/好评率等不常变化的信息
+# - SnapshotIngestor: 批量刷新一组 appid 的国区价格、史低和各对比区价格
+# 用法: ingestor = SnapshotIngestor(store, http, api_key, ["UA", "US"])
+#       await ingestor.ingest(["1245620", "730"])
+#       snap = store.latest("1245620", ["CN", "UA", "US"])
+import asyncio
+import sqlite3
+import time
+
+from astrbot.api import logger
+
+from .concurrency import bounded_map
+from .itad_api import ITAD_API_BASE, fetch_prices, lookup_gids
+from .steam_api import BASIC_FILTERS, AppDetailsResolver, fetch_price_overviews
+
+# 后台刷新在限流队列中的优先级，用户查询优先
+INGEST_PRIORITY = 5
+# 名称、头图、好评率的刷新周期（秒）
+META_TTL = 7 * 86400
+
+PRICE_FIELDS = ("price", "currency", "discount", "regular", "lowest", "ts")
+META_FIELDS = ("gid", "name", "image", "review", "updated")
+
+
+class PriceSnapshotStore:
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS prices ("
+            "appid TEXT NOT NULL, region TEXT NOT NULL, ts REAL NOT NULL, "
+            "price REAL, currency TEXT, discount INTEGER, regular REAL, lowest REAL, "
+            "PRIMARY KEY (appid, region, ts))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            "appid TEXT PRIMARY KEY, gid TEXT, name TEXT, image TEXT, review TEXT, updated REAL NOT NULL)"
+        )
+
+    def put_prices(self, rows, ts=None):
+        """写入一批价格 [(appid, 区服, price, currency, discount, regular, lowest)]，同一批共用一个时间戳"""
+        ts = ts or time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO prices (appid, region, ts, price, currency, discount, regular, lowest) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(str(appid), region.upper(), ts, *values) for appid, region, *values in rows]
+        )
+
+    def put_meta(self, appid, gid, name, image, review):
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (appid, gid, name, image, review, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (str(appid), gid, name, image, review, time.time())
+        )
+
+    def meta(self, appid):
+        row = self._db.execute(
+            "SELECT gid, name, image, review, updated FROM meta WHERE appid = ?", (str(appid),)
+        ).fetchone()
+        return dict(zip(META_FIELDS, row)) if row else None
+
+    def stale_meta(self, appids, max_age=META_TTL):
+        """返回没有元信息或元信息已过期的 appid"""
+        fresh = {
+            row[0] for row in self._db.execute(
+                "SELECT appid FROM meta WHERE updated > ?", (time.time() - max_age,)
+            )
+        }
+        return [a for a in appids if str(a) not in fresh]
+
+    def latest(self, appid, regions):
+        """
+        取 appid 在各区服的最新快照。
+        返回 {"meta": {...}, "regions": {区服: {...}}, "ts": 各区中最旧的时间戳}；任一区服或元信息缺失时返回 None
+        """
+        meta = self.meta(appid)
+        if not meta:
+            return None
+        result = {}
+        for region in regions:
+            row = self._db.execute(
+                "SELECT price, currency, discount, regular, lowest, ts FROM prices "
+                "WHERE appid = ? AND region = ? ORDER BY ts DESC LIMIT 1",
+                (str(appid), region.upper())
+            ).fetchone()
+            if not row:
+                return None
+            result[region.upper()] = dict(zip(PRICE_FIELDS, row))
+        return {"meta": meta, "regions": result, "ts": min(r["ts"] for r in result.values())}
+
+    def prune(self, keep_seconds):
+        """删除超过保留期的历史快照（每个 appid/区服至少保留最新一条）"""
+        self._db.execute(
+            "DELETE FROM prices WHERE ts < ? AND ts < (SELECT MAX(ts) FROM prices p "
+            "WHERE p.appid = prices.appid AND p.region = prices.region)",
+            (time.time() - keep_seconds,)
+        )
+
+    def close(self):
+        try:
+            self._db.close()
+        except Exception:
+            pass
+
+
+class SnapshotIngestor:
+    def __init__(self, store, http, api_key, regions, cache=None, lookup_ttl=0, on_details=None, assets=None):
+        """
+        regions: 对比区列表（国区总会刷新）
+        cache / lookup_ttl: appid→gid 映射与实时查询共用缓存
+        on_details: 透传给 AppDetailsResolver，用于记录官方中英文名
+        assets: AssetResolver，用于选择封面地址（与实时查询共用），为空时直接使用 header_image
+        """
+        self.store = store
+        self.http = http
+        self.api_key = api_key
+        self.regions = [r.upper() for r in regions]
+        self.cache = cache
+        self.lookup_ttl = lookup_ttl
+        self.on_details = on_details
+        self.assets = assets
+        self.runs = 0
+
+    async def ingest(self, appids):
+        """刷新一组 appid 的快照，返回成功写入价格的 appid 数"""
+        appids = list(dict.fromkeys(str(a) for a in appids if a))
+        if not appids:
+            return 0
+        started = time.perf_counter()
+        gids = await lookup_gids(
+            self.http, self.api_key, appids, cache=self.cache, ttl=self.lookup_ttl, priority=INGEST_PRIORITY
+        )
+        # 价格不读缓存，保证快照是最新的；国区与各对比区各一次批量请求
+        itad, cn, *regions = await asyncio.gather(
+            fetch_prices(self.http, self.api_key, [g for g in gids.values() if g], "CN", priority=INGEST_PRIORITY),
+            fetch_price_overviews(self.http, appids, "cn", priority=INGEST_PRIORITY),
+            *(fetch_price_overviews(self.http, appids, r.lower(), priority=INGEST_PRIORITY) for r in self.regions)
+        )
+        rows = []
+        for appid in appids:
+            p = itad.get(gids.get(appid)) or {}
+            price, currency, discount = cn.get(appid, (None, None, 0))
+            # 与实时查询一致：当前价优先用 ITAD，折扣取 Steam 国区
+            if p.get("price") is not None:
+                price, currency = p["price"], p["currency"]
+            if price is None and p.get("lowest") is None:
+                continue
+            rows.append((appid, "CN", price, currency, discount, p.get("regular"), p.get("lowest")))
+            for region, overviews in zip(self.regions, regions):
+                r_price, r_currency, r_discount = overviews.get(appid, (None, None, 0))
+                rows.append((appid, region, r_price, r_currency, r_discount, None, None))
+        await asyncio.to_thread(self.store.put_prices, rows)
+        refreshed = {row[0] for row in rows}
+        stale = [a for a in self.store.stale_meta(refreshed) if gids.get(a)]
+        await bounded_map(lambda a: self._ingest_meta(a, gids[a]), stale, limit=2)
+        self.runs += 1
+        logger.info(
+            f"[价格快照] 刷新{len(refreshed)}/{len(appids)}个游戏，元信息{len(stale)}个，"
+            f"耗时{(time.perf_counter() - started):.1f}s"
+        )
+        return len(refreshed)
+
+    async def _ingest_meta(self, appid, gid):
+        """刷新名称、头图、好评率（很少变化，按 META_TTL 刷新）"""
+        details = AppDetailsResolver(self.http, on_details=self.on_details, priority=INGEST_PRIORITY)
+        app_data = await details.get(appid, "cn", "schinese", BASIC_FILTERS) or {}
+        image = app_data.get("header_image")
+        if image and self.assets is not None:
+            image = await self.assets.resolve(appid, image, priority=INGEST_PRIORITY)
+        title = review = ""
+        try:
+            resp = await self.http.get(
+                f"{ITAD_API_BASE}/games/info/v2", params={"key": self.api_key, "id": gid}, priority=INGEST_PRIORITY
+            )
+            resp.raise_for_status()
+            info = resp.json() or {}
+            title = info.get("title", "")
+            for r in info.get("reviews", []):
+                if r.get("source") == "Steam":
+                    review = f"{r.get('score', '')}%"
+                    break
+        except Exception as e:
+            logger.error(f"[价格快照] 获取ITAD游戏信息失败({appid}): {e}")
+        name = app_data.get("name") or title
+        if name:
+            await asyncio.to_thread(self.store.put_meta, appid, gid, name, image, review)
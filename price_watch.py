@@ -0,0 +1,223 @@
+# 降价订阅（/订阅史低）
+# - WatchStore: 订阅与价格快照的 SQLite 持久化，插件重启后继续生效
+# - PriceWatcher: 后台轮询调度器。所有订阅按 gid 去重后分批用 prices/v3 POST 查询，
+#   各批均匀分布在轮询周期内，不会对 ITAD 产生突发请求；与上次快照比较后推送提醒
+# 用法: watcher = PriceWatcher(store, http, api_key, interval=3600, notify=send)
+#       task = asyncio.create_task(watcher.run())
+import asyncio
+import sqlite3
+import time
+
+from astrbot.api import logger
+
+from .itad_api import PRICES_CHUNK, fetch_prices
+
+# 后台轮询在限流队列中的优先级（数值越大越靠后），用户查询优先
+WATCH_PRIORITY = 10
+
+
+class WatchStore:
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS watches ("
+            "umo TEXT NOT NULL, appid TEXT NOT NULL, gid TEXT NOT NULL, name TEXT, target REAL, created REAL NOT NULL, "
+            "PRIMARY KEY (umo, appid))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS watches_gid ON watches (gid)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "gid TEXT PRIMARY KEY, price REAL, regular REAL, currency TEXT, history_low REAL, updated REAL NOT NULL)"
+        )
+
+    def add(self, umo, appid, gid, name=None, target=None):
+        """添加或更新订阅（同一会话同一 appid 只保留一条）"""
+        self._db.execute(
+            "INSERT OR REPLACE INTO watches (umo, appid, gid, name, target, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (umo, str(appid), gid, name, target, time.time())
+        )
+
+    def remove(self, umo, appid):
+        """取消订阅，返回是否存在该订阅"""
+        cur = self._db.execute("DELETE FROM watches WHERE umo = ? AND appid = ?", (umo, str(appid)))
+        return cur.rowcount > 0
+
+    def list(self, umo):
+        """某个会话的全部订阅 [(appid, gid, name, target)]"""
+        return self._db.execute(
+            "SELECT appid, gid, name, target FROM watches WHERE umo = ? ORDER BY created", (umo,)
+        ).fetchall()
+
+    def count(self, umo):
+        return self._db.execute("SELECT COUNT(*) FROM watches WHERE umo = ?", (umo,)).fetchone()[0]
+
+    def gids(self):
+        """所有被订阅的 gid（去重）"""
+        return [row[0] for row in self._db.execute("SELECT DISTINCT gid FROM watches ORDER BY gid")]
+
+    def watchers(self, gids):
+        """{gid: [(umo, appid, name, target)]}"""
+        result = {}
+        gids = list(gids)
+        # SQLite 单条语句的参数个数有限，分段查询
+        for i in range(0, len(gids), 500):
+            chunk = gids[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT gid, umo, appid, name, target FROM watches WHERE gid IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for gid, umo, appid, name, target in rows:
+                result.setdefault(gid, []).append((umo, appid, name, target))
+        return result
+
+    def snapshot(self, gid):
+        """上次轮询记录的价格 {"price", "regular", "currency", "history_low"}，没有时为 None"""
+        return self.snapshots([gid]).get(gid)
+
+    def snapshots(self, gids):
+        """批量读取快照 {gid: {"price", "regular", "currency", "history_low"}}"""
+        result = {}
+        gids = list(gids)
+        for i in range(0, len(gids), 500):
+            chunk = gids[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT gid, price, regular, currency, history_low FROM snapshots WHERE gid IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for gid, *values in rows:
+                result[gid] = dict(zip(("price", "regular", "currency", "history_low"), values))
+        return result
+
+    def save_snapshots(self, snapshots):
+        """批量写入快照 {gid: {"price", "regular", "currency", "history_low"}}"""
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO snapshots (gid, price, regular, currency, history_low, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            [(gid, s["price"], s["regular"], s["currency"], s["history_low"], now) for gid, s in snapshots.items()]
+        )
+
+    def prune_snapshots(self):
+        """删除已无人订阅的快照"""
+        self._db.execute("DELETE FROM snapshots WHERE gid NOT IN (SELECT DISTINCT gid FROM watches)")
+
+    def close(self):
+        try:
+            self._db.close()
+        except Exception:
+            pass
+
+
+def make_snapshot(price):
+    """由 parse_price_entry 的结果生成快照；史低取 ITAD 全部时间史低与当前价中较低者"""
+    lows = [v for v in (price.get("history_low"), price.get("price")) if v is not None]
+    return {
+        "price": price.get("price"),
+        "regular": price.get("regular"),
+        "currency": price.get("currency"),
+        "history_low": min(lows) if lows else None,
+    }
+
+
+def check_watch(prev, cur, target=None):
+    """
+    比较上次快照和当前价格，返回提醒原因（"新史低" / "达到目标价"）或 None。
+    没有上次快照时只检查目标价；已提醒过的状态不会重复提醒。
+    """
+    price = cur.get("price")
+    if price is None:
+        return None
+    if prev and prev.get("history_low") is not None and price < prev["history_low"] - 0.005:
+        return "新史低"
+    if target is not None and price <= target:
+        if not prev or prev.get("price") is None or prev["price"] > target:
+            return "达到目标价"
+    return None
+
+
+class PriceWatcher:
+    def __init__(self, store, http, api_key, interval=3600, batch_size=PRICES_CHUNK, country="CN", notify=None):
+        """
+        store: WatchStore
+        interval: 轮询周期（秒），一个周期内把所有订阅查询一遍
+        batch_size: 单次 prices/v3 请求的 gid 数
+        notify: async notify(umo, lines)，向会话推送提醒
+        """
+        self.store = store
+        self.http = http
+        self.api_key = api_key
+        self.interval = max(60, interval)
+        self.batch_size = max(1, min(batch_size, PRICES_CHUNK))
+        self.country = country
+        self.notify = notify
+        self.polls = 0
+        self.notified = 0
+
+    async def run(self):
+        """轮询主循环：每个周期开始时取一次订阅列表，分批均匀分布在周期内"""
+        while True:
+            started = time.monotonic()
+            try:
+                gids = await asyncio.to_thread(self.store.gids)
+            except Exception as e:
+                logger.error(f"[订阅] 读取订阅列表失败: {e}")
+                gids = []
+            batches = [gids[i:i + self.batch_size] for i in range(0, len(gids), self.batch_size)]
+            spacing = self.interval / max(1, len(batches))
+            for index, batch in enumerate(batches):
+                try:
+                    await self.poll(batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[订阅] 第{index + 1}/{len(batches)}批轮询失败: {e}")
+                await asyncio.sleep(max(0.0, started + (index + 1) * spacing - time.monotonic()))
+            if not batches:
+                await asyncio.sleep(self.interval)
+            else:
+                logger.info(f"[订阅] 本轮轮询完成：{len(gids)}个游戏，{len(batches)}次请求")
+            try:
+                await asyncio.to_thread(self.store.prune_snapshots)
+            except Exception as e:
+                logger.error(f"[订阅] 清理快照失败: {e}")
+
+    async def poll(self, gids):
+        """查询一批 gid 的当前价格，与快照比较并推送提醒，返回触发的提醒数"""
+        # 订阅需要最新价格，不读缓存
+        prices = await fetch_prices(self.http, self.api_key, gids, self.country, priority=WATCH_PRIORITY)
+        self.polls += 1
+        if not prices:
+            return 0
+        watchers = await asyncio.to_thread(self.store.watchers, prices)
+        prevs = await asyncio.to_thread(self.store.snapshots, prices)
+        notices = {}
+        snapshots = {}
+        for gid, cur in prices.items():
+            if cur.get("price") is None:
+                continue
+            prev = prevs.get(gid)
+            for umo, appid, name, target in watchers.get(gid, []):
+                reason = check_watch(prev, cur, target)
+                if reason:
+                    notices.setdefault(umo, []).append(self._format(reason, appid, name, cur, target))
+            snapshots[gid] = make_snapshot(cur)
+        await asyncio.to_thread(self.store.save_snapshots, snapshots)
+        for umo, lines in notices.items():
+            try:
+                await self.notify(umo, lines)
+                self.notified += len(lines)
+            except Exception as e:
+                logger.error(f"[订阅] 推送提醒失败: {umo}: {e}")
+        return sum(len(lines) for lines in notices.values())
+
+    @staticmethod
+    def _format(reason, appid, name, cur, target):
+        currency = cur.get("currency") or ""
+        symbol = "￥" if currency == "CNY" else currency + " "
+        line = f"【{reason}】{name or f'App {appid}'} 现价 {symbol}{cur['price']:.2f}"
+        if cur.get("cut"):
+            line += f" -{cur['cut']}%"
+        if reason == "达到目标价" and target is not None:
+            line += f"（目标 {symbol}{target:.2f}）"
+        return line + f"\nhttps://store.steampowered.com/app/{appid}"
@@ -0,0 +1,182 @@
+# 上游限流与熔断
+# - TokenBucket: 令牌桶限速，等待者按优先级出队（数值越小越优先，用户查询优先于后台任务）
+# - CircuitBreaker: 连续失败达到阈值后熔断，冷却期内直接失败，冷却结束后放行一次试探请求
+# - Upstream: 一个上游（Steam 商店 / ITAD / 图片CDN）的限流器、熔断器、请求统计和近期耗时
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """上游处于熔断状态，请求未发出"""
+
+    def __init__(self, upstream, retry_in):
+        super().__init__(f"上游 {upstream} 暂时不可用（熔断中，{retry_in:.0f}s 后重试）")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        """
+        rate: 每秒补充的令牌数，<=0 表示不限速
+        capacity: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.clock = clock
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority=0):
+        if self.rate <= 0:
+            return
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._schedule()
+        await fut
+
+    def try_acquire(self):
+        """有空闲令牌且无人排队时立即取走并返回 True，否则返回 False（不等待）"""
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _schedule(self):
+        if self._timer is not None or not self._waiters:
+            return
+        delay = max(0.0, (1 - self.tokens) / self.rate)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self.tokens >= 1:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self.tokens -= 1
+            fut.set_result(None)
+        # 清掉已取消的等待者，避免空转
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        self._schedule()
+
+    @property
+    def queued(self):
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30, probe_timeout=10, clock=time.monotonic):
+        """probe_timeout: 半开状态下试探请求的超时（秒），超时按失败处理"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    @property
+    def probing(self):
+        """是否有试探请求正在进行"""
+        return self._probing
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            # 冷却结束，放行一个试探请求
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def cancel_probe(self):
+        """试探请求未完成就被取消（调用方超时等）：不计结果，下一个请求重新试探"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+        self._probing = False
+
+
+class Upstream:
+    def __init__(self, name, rate=0, burst=10, failure_threshold=5, reset_timeout=30, empty_is_error=False,
+                 probe_timeout=10):
+        """
+        name: 上游名称（日志与统计用）
+        rate / burst: 令牌桶速率（次/秒）与突发容量
+        failure_threshold / reset_timeout: 熔断阈值与冷却时间（秒）
+        probe_timeout: 冷却结束后试探请求的超时（秒）
+        empty_is_error: 200 但响应体为空/null 时视为限流（Steam 商店被限流时的表现）
+        """
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, probe_timeout)
+        self.empty_is_error = empty_is_error
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.hedged = 0
+        # 最近成功请求的耗时（秒），用于计算对冲请求的等待时间
+        self.latencies = deque(maxlen=200)
+
+    def hedge_delay(self, percentile=95, min_samples=20):
+        """近期耗时的指定百分位（秒），样本不足时返回 None（不发对冲请求）"""
+        if len(self.latencies) < min_samples:
+            return None
+        samples = sorted(self.latencies)
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "hedged": self.hedged,
+            "state": self.breaker.state,
+            "queued": self.bucket.queued,
+        }
@@ -0,0 +1,102 @@
+# 查询准入调度
+# 限制同时执行的 /史低、/搜索游戏 查询数，超出的查询按会话（群/私聊）排队，
+# 各会话之间轮流放行，某个群刷屏时只会排长自己的队，不会挤占其他群；
+# 队列（总数或单个会话）已满时立即拒绝，由调用方回复“繁忙”，不再堆积任务
+# 用法: scheduler = AdmissionScheduler(max_concurrent=6, max_queue=30, max_queue_per_group=5)
+#       try:
+#           await scheduler.acquire(event.unified_msg_origin)
+#       except SchedulerBusy:
+#           ...
+#       try:
+#           ...
+#       finally:
+#           scheduler.release()
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from .metrics import metrics
+
+
+class SchedulerBusy(Exception):
+    """排队已满，查询被拒绝"""
+
+
+class AdmissionScheduler:
+    def __init__(self, max_concurrent=6, max_queue=30, max_queue_per_group=5):
+        """
+        max_concurrent: 同时执行的查询数上限，0 表示不限制（不排队）
+        max_queue: 所有会话排队数之和的上限
+        max_queue_per_group: 单个会话的排队数上限
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_group = max_queue_per_group
+        self.running = 0
+        # 会话 -> 等待中的 Future 队列；OrderedDict 的顺序即轮转顺序
+        self._queues = OrderedDict()
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queued(self):
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, group):
+        """取得执行名额，需要排队时等待轮到本会话；队列已满时抛出 SchedulerBusy"""
+        if self.max_concurrent <= 0 or (self.running < self.max_concurrent and not self._queues):
+            self.running += 1
+            self.admitted += 1
+            metrics.observe("queue_wait_seconds", 0.0)
+            return
+        queue = self._queues.get(group)
+        if self.queued >= self.max_queue or (queue is not None and len(queue) >= self.max_queue_per_group):
+            self.rejected += 1
+            metrics.inc("admission_rejected_total")
+            raise SchedulerBusy()
+        if queue is None:
+            queue = self._queues[group] = deque()
+        fut = asyncio.get_running_loop().create_future()
+        queue.append(fut)
+        started = time.perf_counter()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 已经分到名额但调用方被取消，把名额让给下一个
+                self.release()
+            else:
+                self._discard(group, fut)
+            raise
+        self.admitted += 1
+        metrics.observe("queue_wait_seconds", time.perf_counter() - started)
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _discard(self, group, fut):
+        queue = self._queues.get(group)
+        if queue is None:
+            return
+        try:
+            queue.remove(fut)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[group]
+
+    def _dispatch(self):
+        """按会话轮转放行排队中的查询，直到占满并发名额"""
+        while self._queues and (self.max_concurrent <= 0 or self.running < self.max_concurrent):
+            group, queue = next(iter(self._queues.items()))
+            fut = queue.popleft()
+            if queue:
+                # 本会话还有排队的查询，移到队尾，先轮到其他会话
+                self._queues.move_to_end(group)
+            else:
+                del self._queues[group]
+            if fut.cancelled():
+                continue
+            self.running += 1
+            fut.set_result(None)
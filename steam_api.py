@@ -0,0 +1,147 @@
+# Steam 商店 appdetails 接口封装
+# 单次查询内同一 (appid, cc, 语言) 只请求一次，所有使用方共享解析后的结果
+import asyncio
+
+from astrbot.api import logger
+
+STEAM_APPDETAILS = "https://store.steampowered.com/api/appdetails"
+
+# 只需要价格时使用的过滤器，返回体只有 price_overview，体积很小
+PRICE_FILTERS = ("price_overview",)
+# 名称、头图 + 价格，国区查询一次拿全
+BASIC_FILTERS = ("basic", "price_overview")
+
+
+def parse_price_overview(app_data):
+    """
+    从 appdetails 的 data 中取价格。
+    返回 (price, currency, discount_percent)，取不到时为 (None, None, 0)
+    """
+    if not app_data:
+        return None, None, 0
+    price_overview = app_data.get("price_overview")
+    if price_overview and "final" in price_overview and "currency" in price_overview:
+        return price_overview["final"] / 100, price_overview["currency"], price_overview.get("discount_percent", 0)
+    return None, None, 0
+
+
+class AppDetailsResolver:
+    """单次查询内的 appdetails 请求合并器"""
+
+    def __init__(self, http, cache=None, ttl=0, on_details=None, priority=0):
+        """
+        on_details: 可选回调 on_details(appid, lang, data)，每次拿到 appdetails 数据后调用，
+                    用于收集官方中英文名等附带信息
+        priority: 限流排队优先级，后台任务传入较大的值
+        """
+        self.http = http
+        self.priority = priority
+        self.cache = cache
+        self.ttl = ttl
+        self.on_details = on_details
+        # (appid, cc, lang) -> (filters, asyncio.Task)
+        self._tasks = {}
+
+    def _find(self, appid, cc, lang, filters):
+        wanted = set(filters or ())
+        entry = self._tasks.get((appid, cc, lang))
+        if entry and (entry[0] is None or wanted and wanted <= entry[0]):
+            return entry[1]
+        # 价格与语言无关，只要价格时可以复用同一区服任意语言的请求
+        if wanted and wanted <= set(PRICE_FILTERS):
+            for (a, c, _), (f, task) in self._tasks.items():
+                if a == appid and c == cc and (f is None or wanted <= f):
+                    return task
+        return None
+
+    def get(self, appid, cc, lang="english", filters=None):
+        """
+        返回一个可 await 的对象，结果为 appdetails 中该 appid 的 data 字典（失败/无数据时为 None）
+        filters: 需要的字段过滤器，None 表示取全量
+        """
+        appid = str(appid)
+        cc = cc.lower()
+        task = self._find(appid, cc, lang, filters)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(appid, cc, lang, filters))
+            self._tasks[(appid, cc, lang)] = (set(filters) if filters else None, task)
+        return task
+
+    async def _fetch(self, appid, cc, lang, filters):
+        cache_key = appdetails_cache_key(appid, cc, lang, filters)
+        try:
+            if self.cache is not None and self.ttl > 0:
+                data = await self.cache.get_or_fetch(cache_key, self.ttl, lambda: self._request(appid, cc, lang, filters))
+            else:
+                data = await self._request(appid, cc, lang, filters)
+        except Exception as e:
+            logger.error(f"获取Steam appdetails失败({appid}, {cc}): {e}")
+            return None
+        if data and self.on_details is not None:
+            try:
+                self.on_details(appid, lang, data)
+            except Exception as e:
+                logger.error(f"appdetails 回调处理失败({appid}): {e}")
+        return data
+
+    async def _request(self, appid, cc, lang, filters):
+        """请求 appdetails；网络错误/限流时抛出异常（以便使用过期缓存兜底），游戏无数据时返回 None"""
+        params = {"appids": appid, "cc": cc, "l": lang}
+        if filters:
+            params["filters"] = ",".join(filters)
+        resp = await self.http.get(STEAM_APPDETAILS, params=params, priority=self.priority)
+        resp.raise_for_status()
+        data = resp.json()
+        app = (data or {}).get(appid, {})
+        # 免费游戏在带 filters 时 data 会返回空列表
+        if app.get("success") and isinstance(app.get("data"), dict):
+            return app["data"]
+        logger.info(f"[STEAM][{cc.upper()}] appdetails 无数据: {appid}")
+        return None
+
+
+def appdetails_cache_key(appid, cc, lang, filters):
+    return f"steam:appdetails:{appid}:{cc.lower()}:{lang}:{','.join(filters or ())}"
+
+
+async def fetch_price_overviews(http, appids, cc, lang="english", cache=None, ttl=0, chunk_size=50, priority=0):
+    """
+    批量获取多个 appid 在某区的价格（appdetails 仅在 filters=price_overview 时支持多个 appid）。
+    与 AppDetailsResolver 的纯价格请求共用缓存。priority 为限流排队优先级。
+    返回 {appid: (price, currency, discount_percent)}
+    """
+    appids = list(dict.fromkeys(str(a) for a in appids if a))
+    datas = {}
+    missing = []
+    for appid in appids:
+        key = appdetails_cache_key(appid, cc, lang, PRICE_FILTERS)
+        cached = cache.get(key) if cache is not None and ttl > 0 else None
+        if cached is not None:
+            datas[appid] = cached
+        else:
+            missing.append(appid)
+    for i in range(0, len(missing), chunk_size):
+        chunk = missing[i:i + chunk_size]
+        try:
+            resp = await http.get(
+                STEAM_APPDETAILS,
+                params={"appids": ",".join(chunk), "cc": cc.lower(), "l": lang, "filters": ",".join(PRICE_FILTERS)},
+                priority=priority
+            )
+            resp.raise_for_status()
+            data = resp.json() or {}
+        except Exception as e:
+            logger.error(f"[STEAM][{cc.upper()}] 批量获取价格失败: {e}")
+            if cache is not None:
+                for appid in chunk:
+                    stale = cache.get_stale(appdetails_cache_key(appid, cc, lang, PRICE_FILTERS))
+                    if stale is not None:
+                        datas[appid] = stale
+            continue
+        for appid in chunk:
+            app = data.get(appid) or {}
+            if app.get("success") and isinstance(app.get("data"), dict):
+                datas[appid] = app["data"]
+                if cache is not None and ttl > 0:
+                    cache.set(appdetails_cache_key(appid, cc, lang, PRICE_FILTERS), app["data"], ttl)
+    return {appid: parse_price_overview(datas.get(appid)) for appid in appids}
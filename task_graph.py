@@ -0,0 +1,123 @@
+# 查询流程的依赖图调度
+# 每个阶段在其依赖全部完成后立即启动，整体耗时等于关键路径而非所有请求之和。
+# 同时记录每个阶段的开始/结束时间，便于找出拖慢查询的上游。
+# 可设置整体截止时间：到时仍未完成的阶段改用 fallback 的结果（如过期缓存），原任务继续在后台运行。
+# 用法: graph = TaskGraph("史低")
+#       graph.add("lookup", fetch_lookup)
+#       graph.add("info", fetch_info, "lookup")   # fetch_info(gid) 在 lookup 完成后启动
+#       results = await graph.run()
+#       results = await graph.run(deadline=8)   # 8 秒后未完成的阶段使用 fallback
+import asyncio
+import time
+
+from astrbot.api import logger
+
+
+class TaskGraph:
+    def __init__(self, name=""):
+        self.name = name
+        self._start = time.perf_counter()
+        self._tasks = {}
+        self._deps = {}
+        self._fallbacks = {}
+        # 截止时间到达时未完成、改用 fallback 的阶段
+        self.degraded = []
+        # 截止时间到达时仍在运行的任务，由调用方决定是否继续跟踪
+        self.pending = []
+        # 阶段名 -> (依赖就绪时间, 完成时间)，单位毫秒，相对图创建时间
+        self.timings = {}
+
+    def _now(self):
+        return (time.perf_counter() - self._start) * 1000
+
+    def add(self, name, func, *deps, fallback=None):
+        """
+        添加阶段并立即调度。func 为协程函数，参数依次为各依赖阶段的结果。
+        依赖必须先于本阶段添加。
+        fallback: 截止时间到达时本阶段的替代结果，普通函数，参数与 func 相同，未设置时为 None
+        """
+        for d in deps:
+            if d not in self._tasks:
+                raise KeyError(f"阶段 {name} 依赖的 {d} 尚未添加")
+        self._deps[name] = deps
+        if fallback is not None:
+            self._fallbacks[name] = fallback
+        self._tasks[name] = asyncio.ensure_future(self._run_stage(name, func, deps))
+        return self._tasks[name]
+
+    async def _run_stage(self, name, func, deps):
+        args = [await self._tasks[d] for d in deps]
+        ready = self._now()
+        try:
+            return await func(*args)
+        finally:
+            self.timings[name] = (ready, self._now())
+
+    async def get(self, name):
+        return await self._tasks[name]
+
+    async def run(self, deadline=None):
+        """
+        等待全部阶段完成，返回 {阶段名: 结果}；任一阶段抛出异常时向上抛出。
+        deadline: 最长等待秒数，到时未完成的阶段使用 fallback 结果（记入 degraded），
+                  原任务不取消，放在 pending 中继续运行（例如把结果写入缓存供下次查询使用）
+        """
+        names = list(self._tasks)
+        if not deadline:
+            try:
+                values = await asyncio.gather(*(self._tasks[n] for n in names))
+            except BaseException:
+                for task in self._tasks.values():
+                    task.cancel()
+                raise
+            return dict(zip(names, values))
+        await asyncio.wait(list(self._tasks.values()), timeout=deadline)
+        results = {}
+        try:
+            # 阶段按添加顺序处理，依赖总是先于本阶段得到结果
+            for n in names:
+                task = self._tasks[n]
+                if task.done():
+                    results[n] = task.result()
+                    continue
+                fallback = self._fallbacks.get(n)
+                results[n] = fallback(*(results[d] for d in self._deps[n])) if fallback else None
+                self.degraded.append(n)
+        except BaseException:
+            for task in self._tasks.values():
+                task.cancel()
+            raise
+        self.pending = [t for t in self._tasks.values() if not t.done()]
+        for task in self.pending:
+            task.add_done_callback(self._log_background_error)
+        return results
+
+    def _log_background_error(self, task):
+        # 截止时间后继续运行的任务，异常只记录，不再向上抛出
+        if not task.cancelled() and task.exception() is not None:
+            logger.info(f"[{self.name}] 后台阶段失败: {task.exception()}")
+
+    def critical_path(self):
+        """从最后完成的阶段开始，沿最晚完成的依赖回溯得到关键路径"""
+        if not self.timings:
+            return []
+        node = max(self.timings, key=lambda n: self.timings[n][1])
+        path = [node]
+        while self._deps.get(node):
+            node = max(self._deps[node], key=lambda n: self.timings.get(n, (0, 0))[1])
+            path.append(node)
+        return list(reversed(path))
+
+    def summary(self):
+        stages = ", ".join(
+            f"{n}={end - ready:.0f}ms"
+            for n, (ready, end) in sorted(self.timings.items(), key=lambda kv: kv[1][0])
+        )
+        path = " -> ".join(self.critical_path())
+        summary = f"[{self.name}] 总耗时{self._now():.0f}ms，关键路径: {path}；各阶段: {stages}"
+        if self.degraded:
+            summary += f"；超时改用缓存: {', '.join(self.degraded)}"
+        return summary
+
+    def log(self):
+        logger.info(self.summary())
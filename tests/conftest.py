@@ -0,0 +1,54 @@
+# 测试公共设置
+# 插件内使用相对导入，测试时以包的形式导入插件目录（与 bench/run_bench.py 相同），需要装有 AstrBot 的环境
+import importlib
+import json
+import os
+import sys
+import types
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_PACKAGE = "astrbot_plugins_steam_shop_price"
+
+
+def load_module(name):
+    if PLUGIN_PACKAGE not in sys.modules:
+        pkg = types.ModuleType(PLUGIN_PACKAGE)
+        pkg.__path__ = [PLUGIN_DIR]
+        sys.modules[PLUGIN_PACKAGE] = pkg
+    return importlib.import_module(f"{PLUGIN_PACKAGE}.{name}")
+
+
+def make_plugin(data_dir, config=None):
+    """
+    在模拟上游（bench/fake_upstream.py，无延迟、不经网络）和模拟大模型上创建插件实例，
+    插件数据写到 data_dir；需要在事件循环中调用。返回 (plugin, upstream, provider)
+    """
+    import httpx
+
+    sys.path.insert(0, os.path.join(PLUGIN_DIR, "bench"))
+    from fake_upstream import FakeUpstream
+    from run_bench import StubContext, StubProvider
+
+    with open(os.path.join(PLUGIN_DIR, "bench", "fixtures.json"), "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    upstream = FakeUpstream(fixtures, latency={"itad": 0, "steam": 0, "cdn": 0}, jitter=0)
+
+    async def handler(request):
+        status, payload, ctype = await upstream._dispatch(
+            request.method, request.url.raw_path.decode(), {"x-upstream-host": request.url.host}, request.content
+        )
+        return httpx.Response(status, content=payload, headers={"content-type": ctype})
+
+    main = load_module("main")
+    main.plugin_data_path = lambda *parts: os.path.join(data_dir, *parts) if parts else data_dir
+    os.makedirs(os.path.join(data_dir, "thumbs"), exist_ok=True)
+    provider = StubProvider(fixtures["games"], latency=0)
+    plugin = main.SteamPricePlugin(StubContext(provider), {
+        "ITAD_API_KEY": "test", "STEAM_COMPARE_REGIONS": ["US"], "WATCH_ENABLED": False, **(config or {}),
+    })
+    plugin.http.transport_factory = lambda: httpx.MockTransport(handler)
+    return plugin, upstream, provider
+
+
+async def collect(gen):
+    return [reply async for reply in gen]
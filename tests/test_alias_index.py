@@ -0,0 +1,44 @@
+# 中英文别名索引：规范化匹配和延迟写文件
+import asyncio
+import json
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+alias_index = load_module("alias_index")
+
+
+def test_lookup_ignores_trademarks():
+    index = alias_index.AliasIndex()
+    index.record(374320, "DARK SOULS™ III", "english")
+    index.record(374320, "黑暗之魂 III", "schinese")
+    assert index.lookup("Dark Souls III") == "374320"
+    assert index.names(374320) == {"en": "DARK SOULS™ III", "zh": "黑暗之魂 III"}
+
+
+def test_records_are_saved_once_after_delay(tmp_path):
+    path = tmp_path / "aliases.json"
+
+    async def run():
+        index = alias_index.AliasIndex(str(path), save_delay=0.05)
+        for appid, name in ((1245620, "ELDEN RING"), (413150, "Stardew Valley"), (367520, "Hollow Knight")):
+            index.record(appid, name, "en")
+        written_early = path.exists()
+        await asyncio.sleep(0.2)
+        return written_early
+    assert asyncio.run(run()) is False
+    assert set(json.loads(path.read_text(encoding="utf-8"))) == {"1245620", "413150", "367520"}
+    assert alias_index.AliasIndex(str(path)).lookup("elden ring") == "1245620"
+
+
+def test_save_flushes_pending_records(tmp_path):
+    path = tmp_path / "aliases.json"
+
+    async def run():
+        index = alias_index.AliasIndex(str(path), save_delay=60)
+        index.record(413150, "星露谷物语", "schinese")
+        index.save()
+    asyncio.run(run())
+    assert json.loads(path.read_text(encoding="utf-8")) == {"413150": {"zh": "星露谷物语"}}
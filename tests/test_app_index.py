@@ -0,0 +1,60 @@
+# 本地应用名索引：规范化、精确/前缀/模糊查找
+import json
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+app_index = load_module("app_index")
+
+APPS = [
+    (374320, "DARK SOULS™ III"),
+    (570940, "DARK SOULS™: REMASTERED"),
+    (1245620, "ELDEN RING"),
+    (413150, "Stardew Valley"),
+    (367520, "Hollow Knight"),
+    (1030300, "Hollow Knight: Silksong"),
+    (292030, "The Witcher® 3: Wild Hunt"),
+]
+
+
+def make_index(tmp_path, apps=APPS):
+    path = tmp_path / "applist.json"
+    path.write_text(json.dumps({"applist": {"apps": [{"appid": a, "name": n} for a, n in apps]}}), encoding="utf-8")
+    index = app_index.SteamAppIndex(str(path))
+    index._load_file()
+    index.ready = True
+    return index
+
+
+def test_normalize_strips_trademarks():
+    assert app_index.normalize_title("DARK SOULS™ III") == "darksoulsiii"
+    assert app_index.normalize_title("The Witcher® 3: Wild Hunt") == "thewitcher3wildhunt"
+    assert app_index.normalize_title("ＥＬＤＥＮ　ＲＩＮＧ") == "eldenring"
+
+
+def test_resolve_exact(tmp_path):
+    index = make_index(tmp_path)
+    assert index.resolve("elden ring") == 1245620
+    assert index.resolve("Dark Souls III") == 374320
+    assert index.resolve("the witcher 3 wild hunt") == 292030
+
+
+def test_resolve_prefix_and_fuzzy(tmp_path):
+    index = make_index(tmp_path)
+    # 前缀命中时短名称（本体）排在前面
+    assert [appid for appid, _, _ in index.search("hollow knight", limit=2)] == [367520, 1030300]
+    assert index.resolve("Stardew Valle") == 413150
+    # 拼写错误只能模糊命中，默认阈值下不自动选用
+    assert index.search("Stardew Valey", limit=1)[0][0] == 413150
+    assert index.resolve("Stardew Valey") is None
+    assert index.resolve("Stardew Valey", min_score=0.6) == 413150
+    assert index.resolve("Dark Soul 3", min_score=0.4) == 374320
+    assert index.resolve("completely different") is None
+
+
+def test_resolve_sees_delta(tmp_path):
+    index = make_index(tmp_path)
+    index.merge([(2358720, "Black Myth: Wukong™")])
+    assert index.resolve("black myth wukong") == 2358720
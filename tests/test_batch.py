@@ -0,0 +1,59 @@
+# /史低 批量查询：参数拆分和游戏名解析，上游为 bench/fake_upstream.py
+import asyncio
+
+import pytest
+
+from conftest import collect, load_module, make_plugin
+
+pytest.importorskip("astrbot")
+main = load_module("main")
+
+
+def test_batch_names_missing_local_indexes(tmp_path):
+    # 本地应用索引和别名索引都没有数据，游戏名经翻译后走 ITAD 搜索，appid 由 games/info/v2 补全
+    async def run():
+        plugin, upstream, _ = make_plugin(str(tmp_path))
+        from run_bench import BenchEvent
+        message = "/史低 艾尔登法环，星露谷物语"
+        replies = await collect(plugin.shidi(BenchEvent(message), message.split(" ", 1)[1]))
+        await plugin.terminate()
+        return replies, upstream
+    replies, upstream = asyncio.run(run())
+    text = replies[-1][1]
+    assert "ELDEN RING" in text and "Stardew Valley" in text
+    assert "未找到" not in text
+    assert upstream.counts[("itad", "/games/info/v2")] >= 1
+
+
+def test_batch_name_with_colon(tmp_path):
+    # 游戏名本身含有全角冒号时，模拟大模型也要按完整名称翻译
+    async def run():
+        plugin, _, provider = make_plugin(str(tmp_path))
+        from run_bench import BenchEvent
+        message = "/史低 黑神话：悟空、空洞骑士"
+        replies = await collect(plugin.shidi(BenchEvent(message), message.split(" ", 1)[1]))
+        await plugin.terminate()
+        return replies, provider
+    replies, provider = asyncio.run(run())
+    text = replies[-1][1]
+    assert "Black Myth: Wukong" in text and "Hollow Knight" in text
+    assert provider.calls == 2
+
+
+@pytest.mark.parametrize("param, items", [
+    ("Papers, Please", ["Papers, Please"]),
+    ("Warhammer 40,000: Space Marine 2", ["Warhammer 40,000: Space Marine 2"]),
+    ("艾尔登法环，只狼、空洞骑士", ["艾尔登法环", "只狼", "空洞骑士"]),
+    ("艾尔登法环\n 空洞骑士 \n", ["艾尔登法环", "空洞骑士"]),
+    (
+        "https://store.steampowered.com/app/1245620/ELDEN_RING/,https://store.steampowered.com/app/413150",
+        ["https://store.steampowered.com/app/1245620/ELDEN_RING/", "https://store.steampowered.com/app/413150"],
+    ),
+    (
+        "https://store.steampowered.com/app/1245620 https://store.steampowered.com/app/413150",
+        ["https://store.steampowered.com/app/1245620", "https://store.steampowered.com/app/413150"],
+    ),
+    ("https://store.steampowered.com/app/1245620", ["https://store.steampowered.com/app/1245620"]),
+])
+def test_split_batch(param, items):
+    assert main.SteamPricePlugin._split_batch(param) == items
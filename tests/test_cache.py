@@ -0,0 +1,77 @@
+# ResponseCache 的 get_or_fetch：并发未命中合并、上游出错时返回过期数据
+import asyncio
+import time
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+cache_mod = load_module("cache")
+
+
+def test_concurrent_misses_fetch_once():
+    async def run():
+        cache = cache_mod.ResponseCache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"appid": 730}
+        results = await asyncio.gather(*(cache.get_or_fetch("itad:info:g1", 60, fetch) for _ in range(5)))
+        return results, calls, cache
+    results, calls, cache = asyncio.run(run())
+    assert results == [{"appid": 730}] * 5
+    assert len(calls) == 1
+    assert cache.get("itad:info:g1") == {"appid": 730}
+
+
+def put_expired(cache, key, value, age=60):
+    cache._mem_put(key, value, time.time() - age, 10)
+
+
+async def failing_fetch():
+    raise RuntimeError("upstream 503")
+
+
+def test_upstream_error_returns_stale_value():
+    cache = cache_mod.ResponseCache()
+    put_expired(cache, "itad:info:g1", {"title": "old"})
+    value = asyncio.run(cache.get_or_fetch("itad:info:g1", 60, failing_fetch))
+    assert value == {"title": "old"}
+    assert cache.stale_served == 1
+
+
+def test_upstream_error_without_stale_value_raises():
+    cache = cache_mod.ResponseCache()
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_fetch("itad:info:g1", 60, failing_fetch))
+    put_expired(cache, "itad:info:g1", {"title": "old"})
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_fetch("itad:info:g1", 60, failing_fetch, stale_on_error=False))
+
+
+def test_stale_while_revalidate_refreshes_in_background():
+    async def run():
+        cache = cache_mod.ResponseCache(stale_while_revalidate=300)
+        put_expired(cache, "itad:info:g1", {"title": "old"})
+
+        async def fetch():
+            return {"title": "new"}
+        first = await cache.get_or_fetch("itad:info:g1", 60, fetch)
+        await asyncio.sleep(0.01)
+        second = await cache.get_or_fetch("itad:info:g1", 60, fetch)
+        return first, second
+    assert asyncio.run(run()) == ({"title": "old"}, {"title": "new"})
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = cache_mod.ResponseCache(sqlite_path=path)
+    cache.set("itad:lookup:730", {"found": True}, 60)
+    cache.close()
+    reopened = cache_mod.ResponseCache(sqlite_path=path)
+    assert reopened.get("itad:lookup:730") == {"found": True}
+    assert reopened.db_hits == 1
+    reopened.close()
@@ -0,0 +1,74 @@
+# SingleFlight 请求合并和 bounded_map 并发上限
+import asyncio
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+concurrency = load_module("concurrency")
+
+
+def test_singleflight_shares_result_and_reruns_after_completion():
+    async def run():
+        flight = concurrency.SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+        first = await asyncio.gather(*(flight.do("k", work) for _ in range(4)))
+        second = await flight.do("k", work)
+        return first, second, flight
+    first, second, flight = asyncio.run(run())
+    assert first == [1, 1, 1, 1]
+    assert second == 2
+    assert (flight.executed, flight.shared) == (2, 3)
+
+
+def test_singleflight_shares_exceptions():
+    async def run():
+        flight = concurrency.SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(3)), return_exceptions=True)
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_singleflight_cancelled_caller_does_not_cancel_others():
+    async def run():
+        flight = concurrency.SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+    assert asyncio.run(run()) == ("done", True)
+
+
+def test_bounded_map_limits_concurrency_and_skips_failures():
+    async def run():
+        running = peak = 0
+
+        async def work(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05 if item == "slow" else 0.01)
+            running -= 1
+            if item == "bad":
+                raise ValueError(item)
+            return item
+        results = await concurrency.bounded_map(work, ["a", "bad", "slow", "b", "c"], limit=2, timeout=0.03)
+        return results, peak
+    results, peak = asyncio.run(run())
+    assert results == ["a", None, None, "b", "c"]
+    assert peak == 2
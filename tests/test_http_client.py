@@ -0,0 +1,176 @@
+# HttpClientManager 的重试、熔断和令牌桶行为，上游用 httpx.MockTransport 模拟
+import asyncio
+
+import httpx
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+http_client = load_module("http_client")
+rate_limit = load_module("rate_limit")
+
+ITAD_URL = "https://api.isthereanydeal.com/games/info/v2"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_manager(handler, max_retries=2, failure_threshold=5, probe_timeout=10):
+    up = rate_limit.Upstream("itad", rate=0, failure_threshold=failure_threshold, reset_timeout=30,
+                             probe_timeout=probe_timeout)
+    clock = FakeClock()
+    up.breaker.clock = clock
+    manager = http_client.HttpClientManager(
+        upstreams={"itad": up}, max_retries=max_retries, backoff_base=0.001, backoff_max=0.001,
+        transport_factory=lambda: httpx.MockTransport(handler),
+    )
+    return manager, up, clock
+
+
+def sequence_handler(statuses, calls):
+    """按顺序返回 statuses 中的状态码，用完后一直返回最后一个"""
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1], json={})
+    return handler
+
+
+def test_retries_until_success():
+    async def run():
+        calls = []
+        manager, up, _ = make_manager(sequence_handler([503, 429, 200], calls))
+        resp = await manager.get(ITAD_URL)
+        await manager.aclose()
+        return resp, calls, up
+    resp, calls, up = asyncio.run(run())
+    assert resp.status_code == 200
+    assert len(calls) == 3
+    assert up.retries == 2
+    assert up.breaker.state == "closed"
+
+
+def test_retries_exhausted_returns_last_response():
+    async def run():
+        calls = []
+        manager, up, _ = make_manager(sequence_handler([503], calls), max_retries=1)
+        resp = await manager.get(ITAD_URL)
+        await manager.aclose()
+        return resp, calls
+    resp, calls = asyncio.run(run())
+    assert resp.status_code == 503
+    assert len(calls) == 2
+
+
+def test_breaker_opens_half_opens_and_closes():
+    async def run():
+        calls = []
+        statuses = [503, 503, 200]
+        manager, up, clock = make_manager(sequence_handler(statuses, calls), max_retries=0, failure_threshold=2)
+        for _ in range(2):
+            assert (await manager.get(ITAD_URL)).status_code == 503
+        assert up.breaker.state == "open"
+        with pytest.raises(rate_limit.CircuitOpenError):
+            await manager.get(ITAD_URL)
+        assert len(calls) == 2
+        clock.now += 31
+        assert up.breaker.state == "half-open"
+        resp = await manager.get(ITAD_URL)
+        await manager.aclose()
+        return resp, calls, up
+    resp, calls, up = asyncio.run(run())
+    assert resp.status_code == 200
+    assert len(calls) == 3
+    assert up.breaker.state == "closed"
+
+
+def test_failed_probe_reopens_breaker():
+    async def run():
+        calls = []
+        manager, up, clock = make_manager(sequence_handler([503], calls), max_retries=2, failure_threshold=1)
+        await manager.get(ITAD_URL)
+        assert up.breaker.state == "open"
+        clock.now += 31
+        resp = await manager.get(ITAD_URL)
+        await manager.aclose()
+        return resp, calls, up
+    resp, calls, up = asyncio.run(run())
+    assert resp.status_code == 503
+    # 试探失败后立即重新熔断，不再重试
+    assert len(calls) == 2
+    assert up.breaker.state == "open"
+
+
+def test_cancelled_probe_releases_breaker():
+    async def run():
+        calls = []
+        slow = asyncio.Event()
+
+        async def handler(request):
+            calls.append(request.url.path)
+            if len(calls) == 1:
+                return httpx.Response(503, json={})
+            if len(calls) == 2:
+                await slow.wait()
+            return httpx.Response(200, json={})
+
+        manager, up, clock = make_manager(handler, max_retries=0, failure_threshold=1)
+        await manager.get(ITAD_URL)
+        clock.now += 31
+        # 调用方超时取消了试探请求
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(manager.get(ITAD_URL), 0.05)
+        assert not up.breaker.probing
+        resp = await manager.get(ITAD_URL)
+        await manager.aclose()
+        return resp, up
+    resp, up = asyncio.run(run())
+    assert resp.status_code == 200
+    assert up.breaker.state == "closed"
+
+
+def test_probe_timeout_counts_as_failure():
+    async def run():
+        calls = []
+
+        async def handler(request):
+            calls.append(request.url.path)
+            if len(calls) == 1:
+                return httpx.Response(503, json={})
+            await asyncio.sleep(5)
+            return httpx.Response(200, json={})
+
+        manager, up, clock = make_manager(handler, max_retries=0, failure_threshold=1, probe_timeout=0.05)
+        await manager.get(ITAD_URL)
+        clock.now += 31
+        with pytest.raises(httpx.TimeoutException):
+            await manager.get(ITAD_URL)
+        await manager.aclose()
+        return up
+    up = asyncio.run(run())
+    assert up.breaker.state == "open"
+    assert not up.breaker.probing
+
+
+def test_token_bucket_serves_higher_priority_first():
+    async def run():
+        bucket = rate_limit.TokenBucket(rate=50, capacity=1)
+        await bucket.acquire()
+        order = []
+
+        async def waiter(priority):
+            await bucket.acquire(priority)
+            order.append(priority)
+
+        tasks = []
+        for priority in (10, 5, 0):
+            tasks.append(asyncio.ensure_future(waiter(priority)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+    assert asyncio.run(run()) == [0, 5, 10]
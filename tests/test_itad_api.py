@@ -0,0 +1,46 @@
+# ITAD 批量接口：缓存命中、上游出错时的过期缓存兜底
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+itad_api = load_module("itad_api")
+cache_mod = load_module("cache")
+
+
+class FailingHttp:
+    def __init__(self, status=503):
+        self.status = status
+        self.calls = 0
+
+    async def post(self, url, **kwargs):
+        self.calls += 1
+        request = httpx.Request("POST", url)
+        return httpx.Response(self.status, json={}, request=request)
+
+
+def put_expired(cache, key, value):
+    cache._mem_put(key, value, time.time() - 60, 10)
+
+
+def test_lookup_gids_falls_back_to_stale_cache():
+    cache = cache_mod.ResponseCache()
+    put_expired(cache, "itad:lookup:1245620", {"found": True, "game": {"id": "gid-elden"}})
+    put_expired(cache, "itad:lookup:999", {"found": False, "game": None})
+    http = FailingHttp()
+    gids = asyncio.run(itad_api.lookup_gids(http, "key", ["1245620", "999", "413150"], cache=cache, ttl=60))
+    assert http.calls == 1
+    assert gids == {"1245620": "gid-elden", "999": None}
+
+
+def test_fetch_prices_falls_back_to_stale_cache():
+    cache = cache_mod.ResponseCache()
+    entry = {"id": "gid-elden", "deals": [], "historyLow": {"all": {"amount": 178.8, "currency": "CNY"}}}
+    put_expired(cache, "itad:price:CN:gid-elden", entry)
+    prices = asyncio.run(itad_api.fetch_prices(FailingHttp(), "key", ["gid-elden", "gid-x"], "CN", cache=cache, ttl=60))
+    assert list(prices) == ["gid-elden"]
+    assert prices["gid-elden"]["history_low"] == 178.8
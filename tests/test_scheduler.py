@@ -0,0 +1,70 @@
+# AdmissionScheduler：并发上限、按会话轮转放行、队列满时拒绝
+import asyncio
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+scheduler_mod = load_module("scheduler")
+
+
+def test_groups_take_turns():
+    async def run():
+        scheduler = scheduler_mod.AdmissionScheduler(max_concurrent=1, max_queue=10, max_queue_per_group=5)
+        order = []
+        await scheduler.acquire("holder")
+
+        async def query(group, n):
+            await scheduler.acquire(group)
+            order.append(f"{group}{n}")
+            await asyncio.sleep(0)
+            scheduler.release()
+        # 群 a 先排了三个查询，群 b 后排的查询不必等 a 全部执行完
+        tasks = [asyncio.ensure_future(query("a", n)) for n in range(3)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(query("b", n)) for n in range(2)]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order, scheduler
+    order, scheduler = asyncio.run(run())
+    assert order == ["a0", "b0", "a1", "b1", "a2"]
+    assert scheduler.running == 0 and scheduler.queued == 0
+
+
+def test_rejects_when_group_or_total_queue_is_full():
+    async def run():
+        scheduler = scheduler_mod.AdmissionScheduler(max_concurrent=1, max_queue=3, max_queue_per_group=2)
+        await scheduler.acquire("a")
+        waiters = [asyncio.ensure_future(scheduler.acquire("a")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(scheduler_mod.SchedulerBusy):
+            await scheduler.acquire("a")
+        waiters.append(asyncio.ensure_future(scheduler.acquire("b")))
+        await asyncio.sleep(0)
+        with pytest.raises(scheduler_mod.SchedulerBusy):
+            await scheduler.acquire("c")
+        for w in waiters:
+            w.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return scheduler
+    scheduler = asyncio.run(run())
+    assert scheduler.rejected == 2
+    assert scheduler.queued == 0 and scheduler.running == 1
+
+
+def test_cancelled_waiter_gives_slot_to_next():
+    async def run():
+        scheduler = scheduler_mod.AdmissionScheduler(max_concurrent=1, max_queue=10, max_queue_per_group=5)
+        await scheduler.acquire("a")
+        first = asyncio.ensure_future(scheduler.acquire("b"))
+        second = asyncio.ensure_future(scheduler.acquire("c"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.wait_for(second, 1)
+        return scheduler
+    scheduler = asyncio.run(run())
+    assert scheduler.running == 1 and scheduler.queued == 0
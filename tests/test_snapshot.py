@@ -0,0 +1,48 @@
+# 价格快照：/史低 命中新鲜快照时直接回复，不请求上游
+import asyncio
+
+import pytest
+
+from conftest import collect, make_plugin
+
+pytest.importorskip("astrbot")
+
+
+def test_fresh_snapshot_answers_without_upstream(tmp_path):
+    async def run():
+        plugin, upstream, _ = make_plugin(str(tmp_path), {"PRICE_SNAPSHOT_ENABLED": True})
+        from run_bench import BenchEvent
+        store = plugin.price_store
+        store.put_meta("413150", "gid-413150", "星露谷物语", None, "98%")
+        store.put_prices([
+            ("413150", "CN", 48.0, "CNY", 0, 48.0, 24.0),
+            ("413150", "US", 14.99, "USD", 0, 14.99, None),
+        ])
+        message = "/史低 https://store.steampowered.com/app/413150"
+        replies = await collect(plugin.shidi(BenchEvent(message), message.split(" ", 1)[1]))
+        await plugin.terminate()
+        return replies, upstream
+    replies, upstream = asyncio.run(run())
+    assert replies
+    assert "价格数据刚刚更新" in str(replies[-1])
+    assert sum(upstream.counts.values()) == 0
+
+
+def test_snapshot_attaches_todays_cached_chart(tmp_path):
+    async def run():
+        plugin, upstream, _ = make_plugin(str(tmp_path), {"PRICE_SNAPSHOT_ENABLED": True, "PRICE_CHART_ENABLED": True})
+        from run_bench import BenchEvent
+        store = plugin.price_store
+        store.put_meta("413150", "gid-413150", "星露谷物语", None, "98%")
+        store.put_prices([
+            ("413150", "CN", 48.0, "CNY", 0, 48.0, 24.0),
+            ("413150", "US", 14.99, "USD", 0, 14.99, None),
+        ])
+        plugin.history._save_chart("gid-413150", "CN", b"\x89PNG chart")
+        message = "/史低 https://store.steampowered.com/app/413150"
+        replies = await collect(plugin.shidi(BenchEvent(message), message.split(" ", 1)[1]))
+        await plugin.terminate()
+        return replies, upstream
+    replies, upstream = asyncio.run(run())
+    assert "Image" in str(replies[-1])
+    assert sum(upstream.counts.values()) == 0
@@ -0,0 +1,70 @@
+# TaskGraph：依赖调度、截止时间与 fallback
+import asyncio
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+task_graph = load_module("task_graph")
+
+
+async def value_after(delay, value):
+    await asyncio.sleep(delay)
+    return value
+
+
+def test_stages_run_after_dependencies_and_in_parallel():
+    async def run():
+        graph = task_graph.TaskGraph("test")
+        graph.add("lookup", lambda: value_after(0.02, "gid"))
+        graph.add("steam", lambda: value_after(0.02, "steam"))
+        graph.add("info", lambda gid: value_after(0.02, f"info:{gid}"), "lookup")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await graph.run()
+        return results, loop.time() - started, graph
+    results, elapsed, graph = asyncio.run(run())
+    assert results == {"lookup": "gid", "steam": "steam", "info": "info:gid"}
+    # 关键路径为 lookup -> info，steam 与之并行
+    assert elapsed < 0.055
+    assert graph.critical_path() == ["lookup", "info"]
+
+
+def test_unknown_dependency_is_rejected():
+    async def run():
+        graph = task_graph.TaskGraph("test")
+        with pytest.raises(KeyError):
+            graph.add("info", lambda gid: value_after(0, gid), "lookup")
+    asyncio.run(run())
+
+
+def test_deadline_uses_fallbacks_and_keeps_tasks_running():
+    async def run():
+        graph = task_graph.TaskGraph("test")
+        graph.add("lookup", lambda: value_after(0, "gid"))
+        graph.add("info", lambda gid: value_after(0.2, "fresh"), "lookup", fallback=lambda gid: f"stale:{gid}")
+        graph.add("chart", lambda gid: value_after(0.2, "png"), "lookup")
+        results = await graph.run(deadline=0.05)
+        pending = list(graph.pending)
+        await asyncio.gather(*pending)
+        return results, graph, pending
+    results, graph, pending = asyncio.run(run())
+    assert results == {"lookup": "gid", "info": "stale:gid", "chart": None}
+    assert graph.degraded == ["info", "chart"]
+    assert len(pending) == 2 and all(t.result() in ("fresh", "png") for t in pending)
+
+
+def test_stage_error_propagates_and_cancels_other_stages():
+    async def run():
+        graph = task_graph.TaskGraph("test")
+
+        async def fail():
+            raise ValueError("boom")
+        slow = graph.add("slow", lambda: value_after(1, "late"))
+        graph.add("bad", fail)
+        with pytest.raises(ValueError):
+            await graph.run()
+        await asyncio.sleep(0)
+        return slow
+    assert asyncio.run(run()).cancelled()
@@ -0,0 +1,74 @@
+# 游戏名翻译：缓存、翻译结果反馈的延迟写入和卸载时的清理
+import asyncio
+import json
+
+import pytest
+
+from conftest import load_module
+
+pytest.importorskip("astrbot")
+translate = load_module("translate")
+
+
+class Response:
+    def __init__(self, text):
+        self.completion_text = text
+
+
+class Provider:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.prompts = []
+
+    async def text_chat(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.latency)
+        return Response("Stardew Valley")
+
+
+class Context:
+    def __init__(self, provider):
+        self.provider = provider
+
+    def get_using_provider(self):
+        return self.provider
+
+
+def test_reports_are_written_once_after_delay(tmp_path):
+    path = tmp_path / "translations.json"
+
+    async def run():
+        provider = Provider()
+        translator = translate.GameNameTranslator(Context(provider), str(path), save_delay=0.05)
+        assert await translator.translate("星露谷物语") == "Stardew Valley"
+        assert await translator.translate("《星露谷物语》") == "Stardew Valley"
+        for _ in range(3):
+            translator.report("星露谷物语", True)
+        written_early = path.exists()
+        await asyncio.sleep(0.2)
+        return provider, written_early
+    provider, written_early = asyncio.run(run())
+    assert len(provider.prompts) == 1
+    assert written_early is False
+    assert json.loads(path.read_text(encoding="utf-8"))["星露谷物语"]["ok"] == 3
+
+
+def test_close_cancels_pending_batch_and_saves(tmp_path):
+    path = tmp_path / "translations.json"
+
+    async def run():
+        translator = translate.GameNameTranslator(
+            Context(Provider(latency=10)), str(path), batch_window=10, save_delay=60
+        )
+        translator._entries["空洞骑士"] = {"en": "Hollow Knight", "ok": 0, "fail": 0, "ts": 0}
+        translator.report("空洞骑士", True)
+        pending = asyncio.ensure_future(translator.translate("星露谷物语"))
+        await asyncio.sleep(0)
+        translator.close()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        await asyncio.sleep(0)
+        return translator
+    translator = asyncio.run(run())
+    assert not translator._tasks
+    assert json.loads(path.read_text(encoding="utf-8"))["空洞骑士"]["ok"] == 1
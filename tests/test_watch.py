@@ -0,0 +1,34 @@
+# /订阅史低：按 appid、链接或游戏名订阅，上游为 bench/fake_upstream.py
+import asyncio
+
+import pytest
+
+from conftest import collect, make_plugin
+
+pytest.importorskip("astrbot")
+
+
+def subscribe(tmp_path, *messages):
+    async def run():
+        plugin, _, _ = make_plugin(str(tmp_path))
+        from run_bench import BenchEvent
+        replies = []
+        for message in messages:
+            replies += await collect(plugin.watch_add(BenchEvent(message), ""))
+        watches = plugin.watch_store.list("bench:GroupMessage:bench")
+        await plugin.terminate()
+        return replies, watches
+    return asyncio.run(run())
+
+
+def test_subscribe_by_chinese_name(tmp_path):
+    replies, watches = subscribe(tmp_path, "/订阅史低 星露谷物语")
+    assert "已订阅《Stardew Valley》" in replies[-1][1]
+    assert [str(w[0]) for w in watches] == ["413150"]
+
+
+def test_subscribe_by_english_name_with_target(tmp_path):
+    replies, watches = subscribe(tmp_path, "/订阅史低 Stardew Valley ￥20")
+    assert "已订阅《Stardew Valley》" in replies[-1][1]
+    assert "目标价: ￥20.00" in replies[-1][1]
+    assert len(watches) == 1
@@ -0,0 +1,201 @@
+# 游戏名翻译（中文 → Steam 英文官方名）
+# - 结果按规范化后的中文输入持久化缓存，重复查询同一游戏不再调用大模型
+# - 记录每条翻译后续在 ITAD 上是否查到，查不到的翻译会被淘汰
+# - 可选微批处理：短时间窗口内的多个翻译请求合并为一次大模型调用
+import asyncio
+import json
+import os
+import re
+import time
+import unicodedata
+
+from astrbot.api import logger
+
+from .data_path import DebouncedJsonFile
+from .metrics import metrics
+
+SINGLE_PROMPT = "请将以下游戏名翻译为steam页面的英文官方名称，仅输出英文名，不要输出其他内容：{name}"
+BATCH_PROMPT = (
+    "请将以下每一行的游戏名分别翻译为steam页面的英文官方名称。"
+    "按原顺序每行输出一个英文名，格式为“序号. 英文名”，不要输出其他内容：\n{lines}"
+)
+
+
+def normalize_name(name):
+    """规范化中文输入：全半角统一、去空白与书名号等标点、转小写"""
+    s = unicodedata.normalize("NFKC", name or "").lower()
+    return re.sub(r"[\s《》<>「」『』\"'“”‘’·・:：,，.。!！?？\-_—]+", "", s)
+
+
+class GameNameTranslator:
+    def __init__(self, context, store_path=None, batch_window=0.0, max_batch=8, save_delay=10.0):
+        """
+        context: 插件 Context，用于获取当前大模型提供商
+        store_path: 翻译缓存 JSON 文件路径，为空时只缓存在内存
+        batch_window: 微批处理等待窗口（秒），0 表示不合并
+        max_batch: 单次合并的最大条数
+        save_delay: 翻译缓存修改后延迟多久（秒）写文件，期间的多次修改合并为一次写入
+        """
+        self.context = context
+        self.store_path = store_path
+        self.batch_window = batch_window
+        self.max_batch = max(1, max_batch)
+        # 规范化中文 -> {"en": 英文名, "ok": 查到次数, "fail": 查不到次数, "ts": 写入时间}
+        self._entries = {}
+        # 规范化中文 -> Future，相同输入同时只翻译一次
+        self._inflight = {}
+        self._queue = []
+        self._flush_task = None
+        # 正在执行的翻译任务，保留引用以免被回收
+        self._tasks = set()
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self._file = DebouncedJsonFile(store_path, lambda: self._entries, delay=save_delay, label="翻译缓存")
+        self._load()
+
+    def _load(self):
+        if not self.store_path or not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            logger.error(f"[翻译缓存] 读取失败，将重新建立: {e}")
+            self._entries = {}
+
+    def save(self):
+        """立即写入未保存的翻译缓存（插件卸载时调用）"""
+        self._file.flush()
+
+    def close(self):
+        """取消待执行的微批处理和翻译任务，并写入未保存的翻译缓存"""
+        for task in list(self._tasks):
+            task.cancel()
+        # 等待中的调用方不会再拿到结果，直接取消
+        for fut in self._inflight.values():
+            fut.cancel()
+        self._inflight.clear()
+        self._flush_task = None
+        self._queue = []
+        self.save()
+
+    def lookup(self, name):
+        """只查缓存，不调用大模型"""
+        entry = self._entries.get(normalize_name(name))
+        return entry["en"] if entry else None
+
+    async def translate(self, name):
+        """翻译游戏名，优先使用缓存；翻译失败时抛出异常"""
+        key = normalize_name(name)
+        entry = self._entries.get(key)
+        if entry:
+            self.cache_hits += 1
+            logger.info(f"[LLM][翻译缓存命中] {name} -> {entry['en']}")
+            return entry["en"]
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._inflight[key] = fut
+            if self.batch_window > 0:
+                self._queue.append((key, name, fut))
+                if len(self._queue) >= self.max_batch:
+                    self._start_flush(0)
+                elif self._flush_task is None:
+                    self._start_flush(self.batch_window)
+            else:
+                self._spawn(self._run_batch([(key, name, fut)]))
+        return await asyncio.shield(fut)
+
+    def report(self, name, resolved):
+        """
+        记录翻译结果在 ITAD 上是否查到。
+        查不到的次数超过查到的次数时丢弃该条翻译，下次重新调用大模型。
+        """
+        key = normalize_name(name)
+        entry = self._entries.get(key)
+        if not entry:
+            return
+        if resolved:
+            entry["ok"] = entry.get("ok", 0) + 1
+        else:
+            entry["fail"] = entry.get("fail", 0) + 1
+            if entry["fail"] > entry.get("ok", 0):
+                logger.info(f"[翻译缓存] 丢弃查不到的翻译: {name} -> {entry['en']}")
+                del self._entries[key]
+        self._file.mark_dirty()
+
+    def _start_flush(self, delay):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._flush_task = self._spawn(self._flush_after(delay))
+
+    async def _flush_after(self, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._flush_task = None
+        while self._queue:
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            self._spawn(self._run_batch(batch))
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"[翻译] 翻译任务异常退出: {task.exception()}")
+
+    async def _run_batch(self, batch):
+        try:
+            if len(batch) == 1:
+                results = [await self._chat(SINGLE_PROMPT.format(name=batch[0][1]))]
+            else:
+                results = await self._translate_many([name for _, name, _ in batch])
+            changed = False
+            for (key, name, fut), en in zip(batch, results):
+                en = (en or "").strip()
+                if not en:
+                    raise ValueError(f"大模型未返回《{name}》的英文名")
+                self._entries[key] = {"en": en, "ok": 0, "fail": 0, "ts": int(time.time())}
+                changed = True
+                if not fut.done():
+                    fut.set_result(en)
+            if changed:
+                self._file.mark_dirty()
+        except Exception as e:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+        finally:
+            for key, _, _ in batch:
+                self._inflight.pop(key, None)
+
+    async def _translate_many(self, names):
+        lines = "\n".join(f"{i}. {n}" for i, n in enumerate(names, 1))
+        text = await self._chat(BATCH_PROMPT.format(lines=lines))
+        parsed = {}
+        for line in text.splitlines():
+            m = re.match(r"^\s*(\d+)\s*[.、:：)]\s*(.+?)\s*$", line)
+            if m:
+                parsed[int(m.group(1))] = m.group(2)
+        if all(i in parsed for i in range(1, len(names) + 1)):
+            logger.info(f"[LLM][批量翻译] 合并翻译{len(names)}个游戏名")
+            return [parsed[i] for i in range(1, len(names) + 1)]
+        # 输出格式不符合预期时逐个翻译
+        logger.info("[LLM][批量翻译] 返回格式异常，改为逐个翻译")
+        return await asyncio.gather(*(self._chat(SINGLE_PROMPT.format(name=n)) for n in names))
+
+    async def _chat(self, prompt):
+        self.llm_calls += 1
+        with metrics.time("llm_seconds"):
+            llm_response = await self.context.get_using_provider().text_chat(
+                prompt=prompt,
+                contexts=[],
+                image_urls=[],
+                func_tool=None,
+                system_prompt=""
+            )
+        return llm_response.completion_text.strip()
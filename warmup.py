@@ -0,0 +1,148 @@
+# 启动预热
+# 插件重启后内存缓存是空的，大促期间第一波查询每个游戏都要完整请求一遍上游。
+# - QueryStats: 记录各 appid 被查询的次数（持久化），用于选出最常查询的游戏
+# - CacheWarmer: 后台分批预取 gid 映射、ITAD 游戏信息、国区/对比区价格和封面地址，写入与实时查询相同的缓存键；
+#   以较低的限流优先级排队，用户查询始终优先
+# 用法: warmer = CacheWarmer(http, api_key, cache, ttls, ["UA", "US"], assets=assets)
+#       await warmer.warm(["1245620", "730"] + stats.top(50))
+import asyncio
+import json
+import os
+import time
+
+from astrbot.api import logger
+
+from .concurrency import bounded_map
+from .itad_api import ITAD_API_BASE, fetch_prices, lookup_gids
+from .steam_api import BASIC_FILTERS, AppDetailsResolver, fetch_price_overviews
+
+# 预热在限流队列中的优先级：排在用户查询和价格快照之后、订阅轮询之前
+WARMUP_PRIORITY = 8
+# 每批预热的游戏数（与 Steam 多 appid 价格请求的分段大小一致）
+WARMUP_BATCH = 50
+
+
+class QueryStats:
+    def __init__(self, path=None, save_every=20, max_age=30 * 86400):
+        """
+        path: 持久化 JSON 文件路径，为空时只保存在内存
+        save_every: 每记录多少次查询写一次文件（插件卸载时也会写入）
+        max_age: 超过这段时间（秒）没有被查询的游戏不再参与排名
+        """
+        self.path = path
+        self.save_every = save_every
+        self.max_age = max_age
+        # appid -> [查询次数, 最后查询时间]
+        self._apps = {}
+        self._dirty = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._apps = json.load(f)
+        except Exception as e:
+            logger.error(f"[预热] 读取查询统计失败，将重新统计: {e}")
+            self._apps = {}
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._apps, f)
+            os.replace(tmp, self.path)
+            self._dirty = 0
+        except Exception as e:
+            logger.error(f"[预热] 保存查询统计失败: {e}")
+
+    def record(self, appid):
+        entry = self._apps.setdefault(str(appid), [0, 0])
+        entry[0] += 1
+        entry[1] = time.time()
+        self._dirty += 1
+        if self._dirty >= self.save_every:
+            self.save()
+
+    def top(self, n):
+        """最近 max_age 内被查询次数最多的 n 个 appid"""
+        if n <= 0:
+            return []
+        cutoff = time.time() - self.max_age
+        ranked = sorted(
+            ((appid, count) for appid, (count, last) in self._apps.items() if last >= cutoff),
+            key=lambda kv: -kv[1]
+        )
+        return [appid for appid, _ in ranked[:n]]
+
+
+class CacheWarmer:
+    def __init__(self, http, api_key, cache, ttls, regions, assets=None, on_details=None, batch_size=WARMUP_BATCH):
+        """
+        ttls: {接口类型: 缓存时间}，与实时查询使用的 TTL 相同（lookup / info / prices / appdetails）
+        regions: 对比区列表
+        assets: AssetResolver，为空时不预取封面
+        on_details: 透传给 AppDetailsResolver，用于记录官方中英文名
+        """
+        self.http = http
+        self.api_key = api_key
+        self.cache = cache
+        self.ttls = ttls
+        self.regions = [r.upper() for r in regions]
+        self.assets = assets
+        self.on_details = on_details
+        self.batch_size = max(1, batch_size)
+
+    async def warm(self, appids):
+        """分批预热一组 appid，返回找到 ITAD gid 的游戏数；单批失败不影响后续批次"""
+        appids = list(dict.fromkeys(str(a) for a in appids if a))
+        started = time.perf_counter()
+        warmed = 0
+        for i in range(0, len(appids), self.batch_size):
+            try:
+                warmed += await self._warm_batch(appids[i:i + self.batch_size])
+            except Exception as e:
+                logger.error(f"[预热] 第{i // self.batch_size + 1}批失败: {e}")
+        logger.info(f"[预热] 完成{warmed}/{len(appids)}个游戏，耗时{(time.perf_counter() - started):.1f}s")
+        return warmed
+
+    async def _warm_batch(self, appids):
+        # gid 映射、国区价格、对比区价格都是批量请求；基本信息和封面每个游戏一次，低并发执行
+        gids = await lookup_gids(
+            self.http, self.api_key, appids, cache=self.cache, ttl=self.ttls["lookup"], priority=WARMUP_PRIORITY
+        )
+        found = [g for g in gids.values() if g]
+        details = AppDetailsResolver(
+            self.http, self.cache, self.ttls["appdetails"], on_details=self.on_details, priority=WARMUP_PRIORITY
+        )
+        await asyncio.gather(
+            fetch_prices(
+                self.http, self.api_key, found, "CN", cache=self.cache, ttl=self.ttls["prices"], priority=WARMUP_PRIORITY
+            ),
+            *(
+                fetch_price_overviews(
+                    self.http, appids, r.lower(), cache=self.cache, ttl=self.ttls["appdetails"], priority=WARMUP_PRIORITY
+                )
+                for r in self.regions
+            ),
+            bounded_map(self._warm_info, found, limit=2),
+            bounded_map(lambda appid: self._warm_app(details, appid), appids, limit=2),
+        )
+        return len(found)
+
+    async def _warm_info(self, gid):
+        async def fetch():
+            resp = await self.http.get(
+                f"{ITAD_API_BASE}/games/info/v2", params={"key": self.api_key, "id": gid}, priority=WARMUP_PRIORITY
+            )
+            resp.raise_for_status()
+            return resp.json()
+        await self.cache.get_or_fetch(f"itad:info:{gid}", self.ttls["info"], fetch)
+
+    async def _warm_app(self, details, appid):
+        app_data = await details.get(appid, "cn", "schinese", BASIC_FILTERS) or {}
+        if self.assets is not None and app_data.get("header_image"):
+            await self.assets.resolve(appid, app_data["header_image"], priority=WARMUP_PRIORITY)